@@ -1,10 +1,18 @@
 import os
+import json
 import base64
-from dotenv import load_dotenv
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 from pydantic import BaseModel, Field
-from langchain_google_genai import ChatGoogleGenerativeAI, HarmCategory, HarmBlockThreshold
-from langchain_core.messages import HumanMessage
+from map_cache import ResponseCache, make_cache_key
+from page_store import compute_file_hash
+from payload_builder import (build_reduced_pdf, build_page_range_pdf, count_pdf_pages, split_pdf_windows,
+                             translate_to_physical_pages)
+from window_mapper import (MAX_REQUEST_PAGES, WINDOW_PAGES, WINDOW_OVERLAP, WINDOW_CONCURRENCY, CONTINUATION_TITLE,
+                           plan_windows, offset_window_units, merge_window_units)
+from telemetry import telemetry, record_llm_usage
+from llm_client import get_llm_client
 
 # --- 1. Define the Pydantic Schema ---
 
@@ -27,22 +35,58 @@ class BookStructure(BaseModel):
 
 
 # --- 2. Setup the LLM and Bind it to the Pydantic Schema ---
-load_dotenv()
+MAPPER_MODEL = "gemini-2.5-pro"
+# Mapper calls upload a whole PDF, so they get a long timeout, a low rate and no hedging.
+MAPPER_REQUESTS_PER_MINUTE = 10
+MAPPER_TIMEOUT_S = 300.0
+MAPPER_MAX_ATTEMPTS = 4
 
-safety_settings = {
-    HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-    HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-}
+# The Gemini client (and the langchain stack behind it) is imported and built on first use, so
+# paths that never call the Mapper Agent start quickly and need no API key.
+llm = None
+structured_llm = None
+unit_structured_llm = None
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-pro",
-    temperature=0,
-    safety_settings=safety_settings
-)
+mapper_client = get_llm_client("google", MAPPER_MODEL, requests_per_minute=MAPPER_REQUESTS_PER_MINUTE, burst=1,
+                               timeout_s=MAPPER_TIMEOUT_S, max_attempts=MAPPER_MAX_ATTEMPTS)
 
-structured_llm = llm.with_structured_output(BookStructure)
+def get_llm():
+    """The Gemini chat model, built on first use."""
+    global llm
+    if llm is None:
+        from dotenv import load_dotenv
+        from langchain_google_genai import ChatGoogleGenerativeAI, HarmCategory, HarmBlockThreshold
+        load_dotenv()
+
+        safety_settings = {
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        }
+        llm = ChatGoogleGenerativeAI(
+            model=MAPPER_MODEL,
+            temperature=0,
+            safety_settings=safety_settings,
+            # Retries and timeouts are handled by `mapper_client`.
+            max_retries=0,
+            timeout=MAPPER_TIMEOUT_S,
+        )
+    return llm
+
+def get_structured_llm():
+    """The Mapper Agent bound to the BookStructure schema."""
+    global structured_llm
+    if structured_llm is None:
+        structured_llm = get_llm().with_structured_output(BookStructure)
+    return structured_llm
+
+def get_unit_structured_llm():
+    """The Mapper Agent bound to the Unit schema, for re-mapping a single unit."""
+    global unit_structured_llm
+    if unit_structured_llm is None:
+        unit_structured_llm = get_llm().with_structured_output(Unit)
+    return unit_structured_llm
 
 MAPPER_PROMPT = """
 You are a highly accurate document analysis agent specializing in academic books. Your task is to analyze the provided PDF file and create a complete structural map based on its layout and table of contents.
@@ -56,31 +100,151 @@ Page numbers in your response MUST be integers corresponding to the **physical p
 - Be meticulous. The accuracy of the physical page numbers is critical for the success of the entire process.
 """
 
-def generate_structure_map_from_pdf(pdf_path: str) -> list[dict] | None:
+# Appended to MAPPER_PROMPT when only the TOC and heading pages are sent.
+EXCERPT_PROMPT = """
+**NOTE ON THIS FILE:**
+The attached PDF is an excerpt: it contains only the table-of-contents pages and the pages where units, lessons or closing sections begin.
+Report every page number as the page number **within this excerpt** (starting from 1). A unit's or lesson's end page is the last excerpt page that belongs to it.
+"""
+
+# Appended to the prompt for each window when a long payload is mapped in overlapping windows.
+WINDOW_PROMPT = """
+**NOTE ON THIS WINDOW:**
+The attached PDF is one window (pages {first_page} to {last_page} of {page_count}) of a longer file; the other windows are mapped separately and merged.
+- Report every page number as the page number **within this window** (starting from 1).
+- Map every unit and lesson whose heading appears in this window. A unit or lesson that continues past the end of this window ends on its last page.
+- If the window begins partway through a unit whose heading is not in this window, list the lessons that begin in this window under a unit titled exactly `{continuation_title}`, starting on page 1.
+"""
+
+# Used by map validation to re-map a single unit whose ranges could not be repaired from the page text.
+UNIT_REMAP_PROMPT = """
+You are a highly accurate document analysis agent specializing in academic books. The attached PDF is an excerpt of a book, covering physical pages {first_page} to {last_page}.
+
+Map ONLY the unit titled `{unit_title}` and the lessons it contains, as found in this excerpt.
+
+**CRITICAL INSTRUCTION FOR PAGE NUMBER ACCURACY:**
+Report every page number as the page number **within this excerpt** (starting from 1), not the number printed on the page. A unit or lesson starts on the page where its heading appears, and each lesson ends on the page before the next lesson begins.
+"""
+
+# When True, the Mapper Agent receives a reduced PDF of candidate pages instead of the whole book.
+SLIM_MAPPER_PAYLOAD = True
+
+# --- 3. Response Cache ---
+# Validated maps are cached by the PDF, prompt, model and schema, so an unchanged book skips the call.
+MAPPER_CACHE_DIR = Path("output/mapper_cache")
+mapper_cache = ResponseCache(MAPPER_CACHE_DIR)
+
+def mapper_cache_key(pdf_path: str, slim_payload: bool = SLIM_MAPPER_PAYLOAD) -> str:
+    """Content address of a Mapper Agent request for the given PDF."""
+    schema = json.dumps(BookStructure.schema(), sort_keys=True)
+    prompt = MAPPER_PROMPT + EXCERPT_PROMPT if slim_payload else MAPPER_PROMPT
+    return make_cache_key(compute_file_hash(pdf_path), prompt, MAPPER_MODEL, schema)
+
+def build_mapper_payload(pdf_path: str, slim_payload: bool = SLIM_MAPPER_PAYLOAD) -> tuple[str, bytes, tuple[list[int], int] | None]:
+    """
+    Returns the prompt and PDF bytes to send. With `slim_payload`, the PDF is reduced to its candidate
+    pages and the page mapping (excerpt-to-physical table and full page count) is returned as well.
+    """
+    if slim_payload:
+        reduced = build_reduced_pdf(pdf_path)
+        if reduced is not None:
+            reduced_bytes, page_map, page_count = reduced
+            print(f"-> Sending a {len(page_map)}-page excerpt of the {page_count}-page PDF to the Mapper Agent.")
+            return MAPPER_PROMPT + EXCERPT_PROMPT, reduced_bytes, (page_map, page_count)
+        print("-> No useful page excerpt could be built; sending the full PDF.")
+    with open(pdf_path, "rb") as pdf_file:
+        return MAPPER_PROMPT, pdf_file.read(), None
+
+def invoke_mapper(runnable, prompt: str, pdf_bytes: bytes, span_name: str = "llm.mapper"):
+    """Sends one prompt and PDF to the Mapper Agent through the shared client and returns its parsed answer."""
+    from langchain_core.messages import HumanMessage
+    from langchain_core.callbacks import UsageMetadataCallbackHandler
+
+    encoded_pdf = base64.b64encode(pdf_bytes).decode('utf-8')
+    message = HumanMessage(
+        content=[
+            {"type": "text", "text": prompt},
+            {
+                "type": "file",
+                "source_type": "base64",
+                "mime_type": "application/pdf",
+                "data": encoded_pdf,
+            }
+        ]
+    )
+
+    usage = UsageMetadataCallbackHandler()
+    telemetry.incr("llm_calls")
+    telemetry.incr("llm_bytes_uploaded", len(encoded_pdf))
+    with telemetry.span(span_name, model=MAPPER_MODEL, upload_bytes=len(encoded_pdf)):
+        response_pydantic = mapper_client.invoke(runnable, [message], config={"callbacks": [usage]})
+    record_llm_usage(usage.usage_metadata)
+    return response_pydantic
+
+def map_pdf_in_windows(prompt: str, pdf_bytes: bytes, page_count: int) -> list[dict]:
+    """
+    Maps a payload too long for one request: it is cut into overlapping page windows, which are
+    mapped concurrently, and the partial maps are merged in the payload's page numbering. Any
+    failed window fails the whole map, since a partial map would silently drop units.
+    """
+    windows = plan_windows(page_count, WINDOW_PAGES, WINDOW_OVERLAP)
+    print(f"-> The {page_count}-page payload exceeds {MAX_REQUEST_PAGES} pages; mapping it in {len(windows)} overlapping windows.")
+    window_pdfs = split_pdf_windows(pdf_bytes, windows)
+    # Built here, before the worker threads start, so they share a single client.
+    runnable = get_structured_llm()
+
+    def map_window(window_idx: int) -> list[dict]:
+        first_page, last_page = windows[window_idx]
+        window_prompt = prompt + WINDOW_PROMPT.format(first_page=first_page, last_page=last_page, page_count=page_count,
+                                                      continuation_title=CONTINUATION_TITLE)
+        response_pydantic = invoke_mapper(runnable, window_prompt, window_pdfs[window_idx], "llm.mapper_window")
+        return offset_window_units(response_pydantic.dict().get("units", []), first_page, last_page)
+
+    with telemetry.span("mapper.windows", windows=len(windows)):
+        with ThreadPoolExecutor(max_workers=WINDOW_CONCURRENCY, thread_name_prefix="mapper-window") as pool:
+            window_units = list(pool.map(map_window, range(len(windows))))
+    return merge_window_units(window_units, page_count)
+
+def generate_structure_map_from_pdf(pdf_path: str, bypass_cache: bool = False,
+                                    slim_payload: bool = SLIM_MAPPER_PAYLOAD) -> list[dict] | None:
     """
     Uses the Gemini 1.5 Mapper Agent with Pydantic to generate a validated structural map directly from a PDF file.
+    Cached maps are reused unless `bypass_cache` is set, in which case a fresh map is fetched and re-cached.
     """
+    try:
+        cache_key = mapper_cache_key(pdf_path, slim_payload)
+    except FileNotFoundError:
+        print(f"❌ Error: PDF file not found at path: {pdf_path}")
+        return None
+
+    cached = None if bypass_cache else mapper_cache.get(cache_key)
+    if cached is not None:
+        try:
+            units_list = BookStructure.parse_obj(cached).dict().get("units", [])
+            telemetry.incr("mapper_cache_hits")
+            print(f"✅ Loaded cached Mapper Agent map with {len(units_list)} units (skipping LLM call).")
+            return units_list
+        except Exception as e:
+            print(f"⚠️ Ignoring invalid Mapper Agent cache entry: {e}")
+    telemetry.incr("mapper_cache_misses")
+
     print("-> Running Mapper Agent (PDF Input, Pydantic Output) to generate structure map...")
     
     try:
-        with open(pdf_path, "rb") as pdf_file:
-            encoded_pdf = base64.b64encode(pdf_file.read()).decode('utf-8')
-
-        message = HumanMessage(
-            content=[
-                {"type": "text", "text": MAPPER_PROMPT},
-                {
-                    "type": "file",
-                    "source_type": "base64",
-                    "mime_type": "application/pdf",
-                    "data": encoded_pdf,
-                }
-            ]
-        )
+        with telemetry.span("mapper.payload", slim=slim_payload) as span:
+            prompt, pdf_bytes, page_mapping = build_mapper_payload(pdf_path, slim_payload)
+            payload_pages = count_pdf_pages(pdf_bytes)
+            span["pdf_bytes"] = len(pdf_bytes)
 
-        response_pydantic = structured_llm.invoke([message])
-        
-        structure_map = response_pydantic.dict()
+        if payload_pages > MAX_REQUEST_PAGES:
+            structure_map = {"units": map_pdf_in_windows(prompt, pdf_bytes, payload_pages)}
+        else:
+            structure_map = invoke_mapper(get_structured_llm(), prompt, pdf_bytes).dict()
+        if page_mapping is not None:
+            page_map, page_count = page_mapping
+            physical_units = translate_to_physical_pages(structure_map.get("units", []), page_map, page_count)
+            structure_map = BookStructure.parse_obj({"units": physical_units}).dict()
+        mapper_cache.put(cache_key, structure_map)
         
         units_list = structure_map.get("units", [])
         
@@ -91,5 +255,33 @@ def generate_structure_map_from_pdf(pdf_path: str) -> list[dict] | None:
         print(f"❌ Error: PDF file not found at path: {pdf_path}")
         return None
     except Exception as e:
+        telemetry.incr("llm_errors")
         print(f"❌ An unexpected error occurred during the Mapper Agent call: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def remap_unit_from_pdf(pdf_path: str, unit: dict, first_page: int, last_page: int) -> dict | None:
+    """
+    Asks the Mapper Agent to map one unit from an excerpt of physical pages `first_page`..`last_page`
+    and returns it in physical page numbers, or None if the call fails.
+    """
+    print(f"-> Re-mapping unit '{unit.get('unit_title')}' from pages {first_page}-{last_page} with the Mapper Agent...")
+    try:
+        pdf_bytes = build_page_range_pdf(pdf_path, first_page, last_page)
+        prompt = UNIT_REMAP_PROMPT.format(first_page=first_page, last_page=last_page, unit_title=unit.get("unit_title"))
+        response_pydantic = invoke_mapper(get_unit_structured_llm(), prompt, pdf_bytes, "llm.mapper_unit")
+    except Exception as e:
+        telemetry.incr("llm_errors")
+        print(f"❌ An unexpected error occurred while re-mapping the unit: {e}")
+        return None
+
+    # Excerpt page k is physical page k + offset; answers are clamped to the excerpt.
+    offset = first_page - 1
+    to_physical = lambda page: min(max(page + offset, first_page), last_page)
+    remapped = response_pydantic.dict()
+    remapped["unit_title"] = unit.get("unit_title")
+    remapped["unit_start_page"] = to_physical(remapped["unit_start_page"])
+    remapped["unit_end_page"] = to_physical(remapped["unit_end_page"])
+    for lesson in remapped["lessons"]:
+        lesson["lesson_start_page"] = to_physical(lesson["lesson_start_page"])
+        lesson["lesson_end_page"] = to_physical(lesson["lesson_end_page"])
+    return remapped
@@ -0,0 +1,33 @@
+# arabic_text.py
+
+import re
+
+# Harakat, tanween, shadda, sukun, superscript alef and Quranic annotation marks.
+DIACRITICS_PATTERN = re.compile(r"[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]")
+TATWEEL = "\u0640"
+ALEF_VARIANTS_PATTERN = re.compile(r"[\u0622\u0623\u0625\u0671]")  # آ أ إ ٱ
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s]|_")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# The single-glyph honorific is often spelled out in titles typed by hand.
+HONORIFIC_LIGATURES = {"\uFDFA": "صلى الله عليه وسلم", "\uFDFB": "جل جلاله"}
+ARABIC_INDIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩۰۱۲۳۴۵۶۷۸۹", "01234567890123456789")
+
+def normalize_arabic(text: str) -> str:
+    """
+    Normalizes Arabic text into a matching key: expands honorific ligatures (ﷺ), strips
+    diacritics and tatweel, unifies alef, yaa and taa marbuta variants, maps Arabic-Indic
+    digits to ASCII and drops punctuation.
+
+    PDF extraction often emits the lam-alef ligature as 'ال' instead of 'لا' (e.g. 'األولى' for
+    'الأولى', 'الدالئل' for 'الدلائل'). Every 'لا' is rewritten as 'ال' so that both spellings
+    produce the same key; the result is for comparison only, not for display.
+    """
+    for ligature, expansion in HONORIFIC_LIGATURES.items():
+        text = text.replace(ligature, expansion)
+    text = DIACRITICS_PATTERN.sub("", text).replace(TATWEEL, "")
+    text = ALEF_VARIANTS_PATTERN.sub("ا", text)
+    text = text.replace("ى", "ي").replace("ة", "ه")
+    text = text.replace("لا", "ال")
+    text = text.translate(ARABIC_INDIC_DIGITS)
+    text = PUNCTUATION_PATTERN.sub(" ", text)
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
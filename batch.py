@@ -0,0 +1,156 @@
+# batch.py
+
+import json
+import time
+import argparse
+import multiprocessing
+from pathlib import Path
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from main import INPUT_DIR, OUTPUT_DIR, BUILD_SEARCH_INDEX, SUMMARY_RATES, process_book, build_output_search_index
+from telemetry import telemetry
+
+# --- Configuration ---
+DEFAULT_WORKERS = 4
+DEFAULT_LLM_CONCURRENCY = 2
+AGENT_MAP_SUFFIX = "_agent_map_pydantic.json"
+FINAL_JSON_SUFFIX = "_structured_pydantic.json"
+# Joins the folders of a PDF below the input directory into its output name (see `output_name_for`).
+OUTPUT_NAME_SEPARATOR = "__"
+BATCH_SUMMARY_FILENAME = "batch_summary.json"
+TELEMETRY_LOG_FILENAME = "telemetry.jsonl"
+METRICS_TEXTFILE_NAME = "metrics/datachunk.prom"
+
+# Set in each worker process by `_init_worker`; shared across the whole pool.
+_llm_semaphore = None
+
+def _init_worker(llm_semaphore, telemetry_log_path):
+    global _llm_semaphore
+    _llm_semaphore = llm_semaphore
+    telemetry.configure(telemetry_log_path)
+
+def _run_book(pdf_path: Path, output_dir: Path, book: str, output_name: str) -> dict:
+    """Worker entry point: processes one book and reports its outcome instead of raising."""
+    started = time.perf_counter()
+    result = {"book": book, "status": "failed", "wall_time_s": 0.0, "error": None}
+    # Each book reports its own metrics; the parent process merges them.
+    telemetry.reset()
+    try:
+        with telemetry.span("book", book=book):
+            ok = process_book(
+                pdf_path,
+                output_dir / f"{output_name}{AGENT_MAP_SUFFIX}",
+                output_dir / f"{output_name}{FINAL_JSON_SUFFIX}",
+                llm_semaphore=_llm_semaphore,
+                # Books are already spread across processes; don't shard pages within them.
+                extraction_workers=1,
+            )
+        if ok:
+            result["status"] = "ok"
+        else:
+            result["error"] = "Pipeline halted (see log above)."
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["wall_time_s"] = round(time.perf_counter() - started, 3)
+    result["metrics"] = telemetry.snapshot()
+    return result
+
+def find_pdfs(input_dir: Path) -> list[Path]:
+    """Returns every PDF under the input directory, sorted for a stable processing order."""
+    return sorted(p for p in input_dir.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf")
+
+def output_name_for(pdf_path: Path, input_dir: Path) -> str:
+    """
+    The prefix of a book's output files: its path below the input directory, with the folders joined
+    by OUTPUT_NAME_SEPARATOR, so same-named PDFs in different folders do not overwrite each other.
+    """
+    return OUTPUT_NAME_SEPARATOR.join(pdf_path.relative_to(input_dir).with_suffix("").parts)
+
+def run_batch(input_dir: Path, output_dir: Path, workers: int = DEFAULT_WORKERS,
+              llm_concurrency: int = DEFAULT_LLM_CONCURRENCY) -> list[dict]:
+    """Processes every PDF in `input_dir` across a process pool and returns per-book results."""
+    pdf_paths = find_pdfs(input_dir)
+    if not pdf_paths:
+        print(f"❌ Error: No PDF files found under '{input_dir}'")
+        return []
+
+    books = {pdf_path: pdf_path.relative_to(input_dir).as_posix() for pdf_path in pdf_paths}
+    output_names = {pdf_path: output_name_for(pdf_path, input_dir) for pdf_path in pdf_paths}
+    clashes = sorted(name for name, count in Counter(output_names.values()).items() if count > 1)
+    if clashes:
+        for name in clashes:
+            sharing = ", ".join(books[p] for p in pdf_paths if output_names[p] == name)
+            print(f"❌ Error: {sharing} would all be written as '{name}{FINAL_JSON_SUFFIX}'; rename one of them.")
+        return []
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    print(f"Starting batch run for {len(pdf_paths)} books ({workers} workers, LLM concurrency {llm_concurrency})")
+
+    llm_semaphore = multiprocessing.BoundedSemaphore(llm_concurrency)
+    results = []
+    telemetry_log_path = output_dir / TELEMETRY_LOG_FILENAME
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(llm_semaphore, telemetry_log_path)) as pool:
+        futures = {pool.submit(_run_book, pdf_path, output_dir, books[pdf_path], output_names[pdf_path]): pdf_path
+                   for pdf_path in pdf_paths}
+        for future in as_completed(futures):
+            pdf_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. a crash inside MuPDF).
+                result = {"book": books[pdf_path], "status": "failed", "wall_time_s": None, "error": f"{type(e).__name__}: {e}"}
+            results.append(result)
+            marker = "✅" if result["status"] == "ok" else "❌"
+            print(f"{marker} Finished '{result['book']}' ({result['status']})")
+
+    results.sort(key=lambda r: r["book"])
+    return results
+
+def print_summary(results: list[dict], total_wall_time: float):
+    print("\n--- BATCH SUMMARY ---")
+    for r in results:
+        wall = f"{r['wall_time_s']:.1f}s" if r["wall_time_s"] is not None else "n/a"
+        line = f"  - {r['book']}: {r['status'].upper()} in {wall}"
+        if r["error"]:
+            line += f" | {r['error']}"
+        print(line)
+    failed = sum(1 for r in results if r["status"] != "ok")
+    print(f"\n  Books: {len(results)} | Succeeded: {len(results) - failed} | Failed: {failed}")
+    print(f"  Total wall time: {total_wall_time:.1f}s")
+    print("--- END OF SUMMARY ---")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the PDF processing pipeline for every PDF in an input directory.")
+    parser.add_argument("--input-dir", type=Path, default=INPUT_DIR, help="Directory to search for PDF files.")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR, help="Directory for per-book output files.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of worker processes.")
+    parser.add_argument("--llm-concurrency", type=int, default=DEFAULT_LLM_CONCURRENCY, help="Maximum simultaneous Mapper Agent calls.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    results = run_batch(args.input_dir, args.output_dir, args.workers, args.llm_concurrency)
+    total_wall_time = time.perf_counter() - started
+    if not results:
+        return
+
+    print_summary(results, total_wall_time)
+    summary_path = args.output_dir / BATCH_SUMMARY_FILENAME
+    with open(summary_path, 'w', encoding='utf-8') as f:
+        json.dump({"total_wall_time_s": round(total_wall_time, 3), "books": results}, f, ensure_ascii=False, indent=2)
+    print(f"✅ Batch summary saved to: '{summary_path}'")
+
+    # Index once after all workers finish, rather than racing rebuilds from each book.
+    if BUILD_SEARCH_INDEX and any(r["status"] == "ok" for r in results):
+        build_output_search_index(args.output_dir, args.output_dir / "search_index")
+
+    telemetry.reset()
+    for r in results:
+        telemetry.merge(r.get("metrics", {}))
+    metrics_path = args.output_dir / METRICS_TEXTFILE_NAME
+    telemetry.write_prometheus(metrics_path)
+    telemetry.print_summary(SUMMARY_RATES)
+    print(f"✅ Metrics snapshot saved to: '{metrics_path}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# bench_chunking.py
+#
+# Measures chunking throughput (chunks/sec and input characters/sec) over structured book outputs,
+# for each chunk size and sizing unit requested.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_chunking streamlit/data/*_structured_pydantic.json --sizes 500 1200 --unit chars tokens
+
+import time
+import argparse
+from pathlib import Path
+
+from chunker import DEFAULT_CHUNK_OVERLAP, SIZE_UNITS, iter_chunks, iter_output_units
+
+def run_once(json_paths: list[Path], chunk_size: int, chunk_overlap: int, size_unit: str) -> tuple[float, int, int]:
+    """Chunks every book once; returns (elapsed seconds, chunk count, input characters)."""
+    chunk_count, input_chars = 0, 0
+    started = time.perf_counter()
+    for json_path in json_paths:
+        for chunk in iter_chunks(json_path.stem, iter_output_units(json_path), None, chunk_size, chunk_overlap, size_unit):
+            chunk_count += 1
+            input_chars += chunk["char_end"] - chunk["char_start"]
+    return time.perf_counter() - started, chunk_count, input_chars
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunking throughput over structured book outputs.")
+    parser.add_argument("json_paths", type=Path, nargs="+", help="Structured book JSON/NDJSON files.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1200, 2500], help="Chunk sizes to benchmark.")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_CHUNK_OVERLAP, help="Overlap between consecutive chunks.")
+    parser.add_argument("--unit", choices=SIZE_UNITS, nargs="+", default=["chars"], help="Sizing units to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration; the best time is reported.")
+    args = parser.parse_args()
+
+    print(f"Benchmarking chunking of {len(args.json_paths)} books (best of {args.repeat})\n")
+    print(f"  {'unit':<8}{'size':>6}{'chunks':>8}{'time (s)':>10}{'chunks/sec':>12}{'Mchars/sec':>12}")
+    for size_unit in args.unit:
+        for chunk_size in args.sizes:
+            best = min((run_once(args.json_paths, chunk_size, args.overlap, size_unit) for _ in range(args.repeat)), key=lambda r: r[0])
+            elapsed, chunk_count, input_chars = best
+            # Overlapping text is counted once per chunk it appears in.
+            mega_chars = input_chars / 1_000_000
+            print(f"  {size_unit:<8}{chunk_size:>6}{chunk_count:>8}{elapsed:>10.3f}{chunk_count / elapsed:>12.1f}{mega_chars / elapsed:>12.2f}")
+
+if __name__ == "__main__":
+    main()
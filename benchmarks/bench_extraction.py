@@ -0,0 +1,53 @@
+# bench_extraction.py
+#
+# Compares Phase 2 page-text extraction throughput: the original serial loop over one
+# fitz.Document against sharded extraction across worker processes.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_extraction input/book2.pdf --workers 2 4 8
+
+import os
+import time
+import argparse
+import fitz
+from pathlib import Path
+
+from page_store import extract_page_texts
+
+def serial_extract(pdf_path: Path) -> list[str]:
+    """The pre-sharding Phase 2 path: one document handle, one page at a time."""
+    with fitz.open(pdf_path) as pdf_doc:
+        return [pdf_doc.load_page(i).get_text("text") for i in range(len(pdf_doc))]
+
+def time_it(fn, repeat: int) -> tuple[float, list[str]]:
+    """Returns the best wall time over `repeat` runs, plus the last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark serial vs. sharded PDF page text extraction.")
+    parser.add_argument("pdf_path", type=Path, help="Path to the PDF to extract.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 1], help="Worker counts to benchmark.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per configuration; the best time is reported.")
+    args = parser.parse_args()
+
+    serial_time, serial_texts = time_it(lambda: serial_extract(args.pdf_path), args.repeat)
+    page_count = len(serial_texts)
+    print(f"Benchmarking '{args.pdf_path}' ({page_count} pages, best of {args.repeat})\n")
+    print(f"  {'mode':<16}{'time (s)':>10}{'pages/sec':>12}{'speedup':>10}")
+    print(f"  {'serial':<16}{serial_time:>10.3f}{page_count / serial_time:>12.1f}{1.0:>9.2f}x")
+
+    for workers in sorted(set(args.workers)):
+        elapsed, texts = time_it(lambda: extract_page_texts(args.pdf_path, workers), args.repeat)
+        if texts != serial_texts:
+            print(f"❌ Sharded output with {workers} workers differs from the serial path!")
+            return
+        label = f"sharded x{workers}"
+        print(f"  {label:<16}{elapsed:>10.3f}{page_count / elapsed:>12.1f}{serial_time / elapsed:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
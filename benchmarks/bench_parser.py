@@ -0,0 +1,116 @@
+# bench_parser.py
+#
+# Compares the golden markdown parser's structure builder against its previous implementation
+# on a synthetic document (tokenization is shared and timed separately), and checks that
+# streaming the document in chunks gives the same result as a single parse.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_parser --headings 10000
+
+import time
+import argparse
+from markdown_it import MarkdownIt
+
+from parser import GoldenMarkdownStreamParser, _StructureBuilder
+
+def legacy_build(tokens) -> dict:
+    """The previous state machine: string `+=` part content and an equality scan over units on every save."""
+    result_json = {"units": []}
+    current_unit = current_lesson = current_part = None
+
+    def save_state():
+        if current_part and current_lesson:
+            current_lesson["parts"].append(current_part)
+        if current_lesson and current_unit:
+            current_unit["lessons"].append(current_lesson)
+        if current_unit and current_unit not in result_json["units"]:
+            result_json["units"].append(current_unit)
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.type == 'heading_open':
+            heading_text = tokens[i+1].content.strip()
+            if token.tag == 'h1':
+                save_state()
+                current_unit, current_lesson, current_part = {"title": heading_text, "lessons": [], "parts": []}, None, None
+            elif token.tag == 'h2':
+                if current_part:
+                    current_lesson["parts"].append(current_part)
+                current_lesson, current_part = {"title": heading_text, "parts": []}, None
+            elif token.tag == 'h3':
+                if current_part:
+                    if current_lesson:
+                        current_lesson["parts"].append(current_part)
+                    elif current_unit:
+                        current_unit["parts"].append(current_part)
+                current_part = {"title": heading_text, "content": ""}
+            i += 2
+            continue
+        if current_part and token.content:
+            content_to_add = f"{token.markup} {token.content}" if token.markup else token.content
+            current_part["content"] += content_to_add + "\n"
+        i += 1
+    save_state()
+    return result_json
+
+def linear_build(tokens) -> dict:
+    builder = _StructureBuilder()
+    builder.consume(tokens)
+    return builder.finish()
+
+def synthetic_markdown(heading_count: int, long_part_lines: int) -> str:
+    """
+    A golden-style document of `heading_count` headings: units with one lesson and one part each,
+    then a final part of `long_part_lines` paragraphs and a fenced block containing a '#' line.
+    """
+    sentence = "هذا نص تجريبي لقياس أداء المحلل على كتاب طويل جدا."
+    lines = []
+    for index in range(heading_count // 3):
+        lines += [f"# الوحدة {index + 1}", f"## الدرس {index + 1}", "### الجزء الأول", sentence]
+    lines += ["### الجزء الأخير"] + [sentence * 2] * long_part_lines + ["```\n# ليس عنوانا\n```"]
+    return "\n\n".join(lines) + "\n"
+
+def time_it(fn, repeat: int) -> tuple[float, dict]:
+    """Returns the best wall time over `repeat` runs, plus the last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def parse_streaming(text: str, chunk_size: int) -> dict:
+    stream_parser = GoldenMarkdownStreamParser()
+    for offset in range(0, len(text), chunk_size):
+        stream_parser.feed(text[offset:offset + chunk_size])
+    return stream_parser.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the golden markdown parser on a synthetic document.")
+    parser.add_argument("--headings", type=int, default=10000, help="Number of headings to generate.")
+    parser.add_argument("--long-part-lines", type=int, default=20000, help="Paragraphs in the final, long part.")
+    parser.add_argument("--chunk-size", type=int, default=4096, help="Characters per chunk for the streaming parser.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation; the best time is reported.")
+    args = parser.parse_args()
+
+    text = synthetic_markdown(args.headings, args.long_part_lines)
+    print(f"Benchmarking a synthetic document: {args.headings} headings, {len(text) / 1_000_000:.1f}M characters (best of {args.repeat})\n")
+
+    tokenize_time, tokens = time_it(lambda: MarkdownIt().parse(text), args.repeat)
+    legacy_time, _ = time_it(lambda: legacy_build(tokens), args.repeat)
+    linear_time, linear_result = time_it(lambda: linear_build(tokens), args.repeat)
+    stream_time, stream_result = time_it(lambda: parse_streaming(text, args.chunk_size), args.repeat)
+    if stream_result != linear_result:
+        print("❌ Streaming output differs from a single parse!")
+        return
+
+    print(f"  {'stage':<34}{'time (s)':>10}")
+    print(f"  {'markdown-it tokenization':<34}{tokenize_time:>10.3f}")
+    print(f"  {'legacy structure build':<34}{legacy_time:>10.3f}")
+    print(f"  {'linear structure build':<34}{linear_time:>10.3f}   ({legacy_time / linear_time:.1f}x faster)")
+    print(f"  {f'streaming parse, end to end ({args.chunk_size})':<34}{stream_time:>10.3f}")
+    print(f"\n  End to end: legacy {tokenize_time + legacy_time:.3f}s vs. linear {tokenize_time + linear_time:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# bench_startup.py
+#
+# Measures cold import time of the pipeline's entry modules in fresh interpreters, and whether
+# importing them loads the langchain stack. With --pdf and --map, also times a full extraction-only
+# run (Phase 1 skipped) without any API keys in the environment.
+#
+# Usage (from the repository root):
+#   python -m benchmarks.bench_startup
+#   python -m benchmarks.bench_startup --pdf input/book2.pdf --map output/agent_map_pydantic.json
+
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+DEFAULT_MODULES = ["main", "batch", "evaluate", "agents"]
+HEAVY_MODULES = ["langchain_core", "langchain_google_genai", "langchain_openai"]
+
+IMPORT_PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import {module}
+print(json.dumps({{"seconds": time.perf_counter() - started, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+EXTRACTION_PROBE = """
+import time, json, contextlib, io
+from pathlib import Path
+started = time.perf_counter()
+import main
+with contextlib.redirect_stdout(io.StringIO()):
+    ok = main.process_book(Path({pdf!r}), Path({out!r}) / "map.json", Path({out!r}) / "book_structured_pydantic.json",
+                           incremental=False, existing_map_path=Path({map!r}))
+print(json.dumps({{"seconds": time.perf_counter() - started, "ok": ok}}))
+"""
+
+def run_probe(code: str) -> dict:
+    """Runs `code` in a fresh interpreter without API keys and returns the JSON it prints."""
+    env = {k: v for k, v in os.environ.items() if k not in ("GOOGLE_API_KEY", "OPENAI_API_KEY")}
+    result = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True, env=env, cwd=Path.cwd())
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark cold-start import time of the pipeline modules.")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES, help="Modules to import.")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module; the best time is reported.")
+    parser.add_argument("--pdf", type=Path, help="A PDF for the extraction-only run.")
+    parser.add_argument("--map", type=Path, help="Its structure map JSON for the extraction-only run.")
+    args = parser.parse_args()
+
+    print(f"Cold import times (best of {args.repeat}, no API keys set)\n")
+    print(f"  {'module':<12}{'time (s)':>10}  heavy modules loaded")
+    for module in args.modules:
+        probes = [run_probe(IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)) for _ in range(args.repeat)]
+        best = min(probes, key=lambda p: p["seconds"])
+        print(f"  {module:<12}{best['seconds']:>10.3f}  {', '.join(best['heavy']) or '-'}")
+
+    if args.pdf and args.map:
+        with tempfile.TemporaryDirectory(prefix="bench_startup_") as out_dir:
+            probe = run_probe(EXTRACTION_PROBE.format(pdf=str(args.pdf.resolve()), out=out_dir, map=str(args.map.resolve())))
+        status = "ok" if probe["ok"] else "FAILED"
+        print(f"\n  Extraction-only run (import + Phase 2): {probe['seconds']:.3f}s ({status})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,548 @@
+# offline_suite.py
+#
+# End-to-end pipeline benchmark that needs no API quota: synthetic multi-unit Arabic PDFs are
+# generated with fitz, the Mapper Agent (`agents.structured_llm`, and `agents.unit_structured_llm`
+# for re-mapping a unit) and the evaluator chains (`evaluate.matcher_chain`,
+# `evaluate.batch_matcher_chain`) are replaced by local stubs with injectable latency and failures;
+# building a real client fails the run. Phase 1, map validation (on a deliberately perturbed map),
+# Phase 2 assembly, golden markdown parsing and evaluation are timed at each requested size.
+# Results are written as JSON; pass a previous results file as --baseline to flag regressions.
+# The synthetic PDFs use the FiraGO font from pymupdf-fonts (see requirements.txt).
+#
+# Usage (from the repository root):
+#   python -m benchmarks.offline_suite --pages 60 240 960 --llm-latency 0.2 --out output/benchmark_results.json
+#   python -m benchmarks.offline_suite --baseline output/benchmark_results.json
+#   python -m benchmarks.offline_suite --pages 240 --failure-rate 0.3 --slow-rate 0.1 --hedge-after 0.5
+
+import io
+import os
+import base64
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+from contextlib import redirect_stdout
+
+import fitz
+
+import main as pipeline
+import agents
+import evaluate
+from map_cache import ResponseCache
+from arabic_text import normalize_arabic
+from parser import parse_golden_markdown_to_json
+from map_validator import load_page_headings, repair_structure_map
+from evaluate_content import evaluate_content
+from checkpoint import load_units
+from telemetry import telemetry
+from stream_writer import OUTPUT_FORMATS
+from content_store import PACK_SUFFIX
+
+# --- Configuration ---
+RESULTS_VERSION = 1
+DEFAULT_PAGE_COUNTS = [60, 240, 960]
+DEFAULT_OUT_PATH = Path("output/benchmark_results.json")
+DEFAULT_TOLERANCE = 0.2
+# FiraGO, from pymupdf-fonts; none of the fonts built into PyMuPDF have Arabic glyphs.
+FONT_NAME = "figo"
+LINES_PER_PAGE = 24
+WORDS_PER_LINE = 9
+
+UNIT_ORDINALS = ["الأولى", "الثانية", "الثالثة", "الرابعة", "الخامسة", "السادسة", "السابعة", "الثامنة", "التاسعة", "العاشرة"]
+LESSON_ORDINALS = ["الأول", "الثاني", "الثالث", "الرابع", "الخامس", "السادس", "السابع", "الثامن", "التاسع", "العاشر"]
+TOPIC_WORDS = ["أحكام", "الطهارة", "الصلاة", "الزكاة", "الصيام", "الحج", "السيرة", "النبوية", "الأخلاق", "الآداب",
+               "العقيدة", "الإيمان", "الحديث", "الفقه", "الأسرة", "المعاملات", "العبادات", "الشمائل", "الخصائص", "الحقوق"]
+# Body vocabulary avoids the heading words (وحدة/درس) so only real heading pages look like headings.
+BODY_WORDS = ["قال", "العلماء", "في", "هذا", "الباب", "إن", "المسلم", "يحرص", "على", "العلم", "والعمل", "به",
+              "وقد", "ذكر", "أهل", "النظر", "أن", "الأصل", "فيه", "الاتباع", "مع", "بيان", "الحكمة", "من", "ذلك"]
+
+def _arabic_number(n: int) -> str:
+    return str(n).translate(str.maketrans("0123456789", "٠١٢٣٤٥٦٧٨٩"))
+
+def _ordinal(ordinals: list[str], n: int) -> str:
+    return ordinals[n - 1] if n <= len(ordinals) else _arabic_number(n)
+
+# --- Synthetic Books ---
+
+def build_synthetic_book(page_count: int, lessons_per_unit: int, pages_per_lesson: int, seed: int = 0) -> tuple[list[str], list[dict]]:
+    """
+    Lays out a book of `page_count` pages: a cover, a table of contents, units (a title page followed
+    by lessons of `pages_per_lesson` pages) and a closing page. Returns the page texts and the ground
+    truth structure map in the Mapper Agent's format.
+    """
+    rng = random.Random(seed)
+    unit_pages = 1 + lessons_per_unit * pages_per_lesson
+    unit_count = max(1, (page_count - 3) // unit_pages)
+    body = lambda: "\n".join(" ".join(rng.choices(BODY_WORDS, k=WORDS_PER_LINE)) for _ in range(LINES_PER_PAGE))
+
+    structure, page = [], 3
+    for u in range(1, unit_count + 1):
+        unit_title = f"الوحدة {_ordinal(UNIT_ORDINALS, u)}: {' '.join(rng.sample(TOPIC_WORDS, 3))}"
+        unit = {"unit_title": unit_title, "unit_start_page": page, "unit_end_page": page + unit_pages - 1, "lessons": []}
+        lesson_start = page + 1
+        for l in range(1, lessons_per_unit + 1):
+            lesson_title = f"الدرس {_ordinal(LESSON_ORDINALS, l)}: {' '.join(rng.sample(TOPIC_WORDS, 3))}"
+            unit["lessons"].append({"lesson_title": lesson_title, "lesson_start_page": lesson_start,
+                                    "lesson_end_page": lesson_start + pages_per_lesson - 1})
+            lesson_start += pages_per_lesson
+        structure.append(unit)
+        page += unit_pages
+    # Leftover pages extend the last lesson, so the closing page is always the final page.
+    structure[-1]["unit_end_page"] = page_count - 1
+    structure[-1]["lessons"][-1]["lesson_end_page"] = page_count - 1
+
+    pages = [body() for _ in range(page_count)]
+    pages[0] = "كتاب تجريبي لقياس الأداء\n" + body()
+    pages[1] = "المحتويات\n" + "\n".join(u["unit_title"] for u in structure)
+    for unit in structure:
+        pages[unit["unit_start_page"] - 1] = unit["unit_title"] + "\n" + body()
+        for lesson in unit["lessons"]:
+            pages[lesson["lesson_start_page"] - 1] = lesson["lesson_title"] + "\n" + body()
+    pages[-1] = "الخاتمة\n" + body()
+    return pages, structure
+
+def write_synthetic_pdf(pages: list[str], pdf_path: Path):
+    """
+    Writes the pages with an Arabic-capable font. fitz does not shape right-to-left text, so each line
+    is written reversed; text extraction then returns it in logical order.
+    """
+    try:
+        font_buffer = fitz.Font(FONT_NAME).buffer
+    except Exception as e:
+        # Without pymupdf-fonts, fitz only reports that it has no builtin font of that name.
+        raise RuntimeError(f"The '{FONT_NAME}' font is missing; install pymupdf-fonts (see requirements.txt).") from e
+    with fitz.open() as pdf_doc:
+        for text in pages:
+            page = pdf_doc.new_page()
+            page.insert_font(fontname=FONT_NAME, fontbuffer=font_buffer)
+            page.insert_text((40, 60), "\n".join(line[::-1] for line in text.split("\n")), fontname=FONT_NAME, fontsize=10)
+        pdf_doc.save(pdf_path, garbage=3, deflate=True)
+
+def golden_markdown(pages: list[str], structure: list[dict]) -> str:
+    """The book as golden-standard markdown: units, lessons and one part per page of lesson text."""
+    lines = []
+    for unit in structure:
+        lines.append(f"# {unit['unit_title']}")
+        for lesson in unit["lessons"]:
+            lines.append(f"## {lesson['lesson_title']}")
+            for page in range(lesson["lesson_start_page"], lesson["lesson_end_page"] + 1):
+                lines.append(f"### صفحة {_arabic_number(page)}")
+                lines.append(pages[page - 1])
+    return "\n\n".join(lines) + "\n"
+
+def paraphrase_ground_truth(structure: list[dict]) -> list[dict]:
+    """
+    Rewords every other lesson title (label dropped, last topic word replaced) so that the local fuzzy
+    tier cannot resolve it and the evaluation exercises the LLM tier.
+    """
+    paraphrased = json.loads(json.dumps(structure))
+    for unit in paraphrased:
+        for idx, lesson in enumerate(unit["lessons"]):
+            if idx % 2:
+                topic = lesson["lesson_title"].partition(":")[2].split()
+                lesson["lesson_title"] = " ".join(["باب"] + topic[:2])
+    return paraphrased
+
+def perturb_map(structure: list[dict]) -> list[dict]:
+    """
+    Introduces the Mapper Agent's typical range errors: every other lesson starts a page early
+    (overlapping the previous lesson) and every unit but the last runs a page into the next one.
+    """
+    perturbed = json.loads(json.dumps(structure))
+    for unit in perturbed[:-1]:
+        unit["unit_end_page"] += 1
+    for unit in perturbed:
+        for idx, lesson in enumerate(unit["lessons"]):
+            if idx % 2:
+                lesson["lesson_start_page"] -= 1
+    return perturbed
+
+# --- Stub LLMs ---
+
+class StubMapperLLM:
+    """
+    Stands in for `agents.structured_llm`: reads the PDF it is sent and maps every page whose first
+    line is a unit or lesson heading, answering in that PDF's own page numbering (so full, excerpt
+    and windowed payloads are handled), after sleeping for `latency` seconds. Lessons before the
+    first unit heading are reported under a CONTINUED unit, as a window's prompt asks.
+    """
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, messages, config=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        pdf_part = next(part for part in messages[0].content if isinstance(part, dict) and part.get("type") == "file")
+        with fitz.open(stream=base64.b64decode(pdf_part["data"]), filetype="pdf") as pdf_doc:
+            first_lines = [(page.get_text("text").strip().splitlines() or [""])[0] for page in pdf_doc]
+
+        headings = []
+        for page_number, line in enumerate(first_lines, start=1):
+            if line.startswith("الوحدة"):
+                headings.append(("unit", line, page_number))
+            elif line.startswith("الدرس"):
+                headings.append(("lesson", line, page_number))
+            elif line.startswith("الخاتمة"):
+                headings.append(("closing", line, page_number))
+        last_page = len(first_lines)
+
+        units = []
+        for idx, (kind, title, page_number) in enumerate(headings):
+            next_pages = [p for k, _, p in headings[idx + 1:] if k != "lesson"]
+            if kind == "unit":
+                units.append(agents.Unit(unit_title=title, unit_start_page=page_number,
+                                         unit_end_page=(next_pages[0] - 1) if next_pages else last_page, lessons=[]))
+            elif kind == "lesson":
+                if not units:
+                    next_units = [p for k, _, p in headings if k != "lesson"]
+                    units.append(agents.Unit(unit_title=agents.CONTINUATION_TITLE, unit_start_page=1,
+                                             unit_end_page=(next_units[0] - 1) if next_units else last_page, lessons=[]))
+                next_any = [p for _, _, p in headings[idx + 1:]]
+                end_page = min((next_any[0] - 1) if next_any else last_page, units[-1].unit_end_page)
+                units[-1].lessons.append(agents.Lesson(lesson_title=title, lesson_start_page=page_number, lesson_end_page=end_page))
+        return agents.BookStructure(units=units)
+
+class StubUnitMapperLLM(StubMapperLLM):
+    """
+    Stands in for `agents.unit_structured_llm`: maps the excerpt it is sent as the book stub would and
+    answers with the unit the prompt asks for (or the first unit of the excerpt).
+    """
+
+    def invoke(self, messages, config=None):
+        structure = super().invoke(messages, config)
+        prompt = next(part["text"] for part in messages[0].content if isinstance(part, dict) and part.get("type") == "text")
+        wanted = prompt.partition("titled `")[2].partition("`")[0]
+        units = structure.units or [agents.Unit(unit_title=wanted, unit_start_page=1, unit_end_page=1, lessons=[])]
+        return next((unit for unit in units if unit.unit_title == wanted), units[0])
+
+class RealClientGuard:
+    """Replaces a real LLM client factory; counts the attempts and fails each one."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.attempts = 0
+
+    def __call__(self):
+        self.attempts += 1
+        raise RuntimeError(f"The offline suite must not build a real LLM client ({self.name}).")
+
+def _title_words(title: str) -> set[str]:
+    return set(normalize_arabic(title.partition(":")[2] or title).split())
+
+def _stub_title_match(gt_title: str, candidate_titles: list[str]) -> dict:
+    """Picks the candidate sharing the most topic words, as a stand-in for semantic matching."""
+    gt_words = _title_words(gt_title)
+    scored = []
+    for candidate in candidate_titles:
+        candidate_words = _title_words(candidate)
+        union = gt_words | candidate_words
+        scored.append((len(gt_words & candidate_words) / len(union) if union else 0.0, candidate))
+    score, best = max(scored, default=(0.0, None))
+    if score >= 0.5:
+        return {"is_match": True, "best_match": best, "confidence": 0.95, "reasoning": "Stub: topic words match."}
+    return {"is_match": False, "best_match": None, "confidence": 0.05, "reasoning": "Stub: no candidate shares the topic."}
+
+def _parse_title_list(formatted: str) -> list[str]:
+    return [line[2:] for line in formatted.splitlines() if line.startswith("- ")]
+
+class StubMatcherChain:
+    """Stands in for `evaluate.matcher_chain`, answering after `latency` seconds."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def _answer(self, inputs: dict):
+        self.calls += 1
+        return evaluate.TitleMatch(**_stub_title_match(inputs["ground_truth_title"], _parse_title_list(inputs["candidate_titles"])))
+
+    def invoke(self, inputs: dict, config=None):
+        time.sleep(self.latency)
+        return self._answer(inputs)
+
+    async def ainvoke(self, inputs: dict, config=None):
+        await asyncio.sleep(self.latency)
+        return self._answer(inputs)
+
+class StubBatchMatcherChain(StubMatcherChain):
+    """Stands in for `evaluate.batch_matcher_chain`."""
+
+    def _answer(self, inputs: dict):
+        self.calls += 1
+        candidates = _parse_title_list(inputs["candidate_titles"])
+        return evaluate.BatchTitleMatch(matches=[
+            evaluate.LessonTitleMatch(ground_truth_title=t, **_stub_title_match(t, candidates))
+            for t in _parse_title_list(inputs["ground_truth_titles"])
+        ])
+
+class InjectedAPIError(Exception):
+    """A fake provider error carrying an HTTP status, as the OpenAI and Google SDK errors do."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Injected HTTP {status_code}")
+        self.status_code = status_code
+
+class FaultInjector:
+    """
+    Wraps a stub so that a `failure_rate` share of calls fail with a 429 or 503 and a `slow_rate`
+    share stall for `slow_latency` seconds first, exercising the retry, timeout and hedging paths
+    of the LLM client layer.
+    """
+
+    def __init__(self, stub, failure_rate: float, slow_rate: float, slow_latency: float, seed: int):
+        self.stub = stub
+        self.failure_rate = failure_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.rng = random.Random(seed)
+        self.injected = {"failures": 0, "stalls": 0}
+
+    def _draw(self) -> tuple[int | None, float]:
+        status, stall = None, 0.0
+        if self.rng.random() < self.failure_rate:
+            status = self.rng.choice([429, 503])
+            self.injected["failures"] += 1
+        elif self.rng.random() < self.slow_rate:
+            stall = self.slow_latency
+            self.injected["stalls"] += 1
+        return status, stall
+
+    def invoke(self, inputs, config=None):
+        status, stall = self._draw()
+        if status is not None:
+            raise InjectedAPIError(status)
+        time.sleep(stall)
+        return self.stub.invoke(inputs, config)
+
+    async def ainvoke(self, inputs, config=None):
+        status, stall = self._draw()
+        if status is not None:
+            raise InjectedAPIError(status)
+        await asyncio.sleep(stall)
+        return await self.stub.ainvoke(inputs, config)
+
+def install_stubs(llm_latency: float, args) -> dict:
+    """
+    Replaces the pipeline's LLM clients with local stubs (behind fault injectors), guards the real
+    client factories and tunes the LLM client layer for the suite's time scale; returns the stubs,
+    injectors and guards for call counting.
+    """
+    stubs = {"mapper": StubMapperLLM(llm_latency), "unit_mapper": StubUnitMapperLLM(llm_latency),
+             "matcher": StubMatcherChain(llm_latency), "batch_matcher": StubBatchMatcherChain(llm_latency)}
+    injectors = {name: FaultInjector(stub, args.failure_rate, args.slow_rate, args.slow_latency, args.seed + idx)
+                 for idx, (name, stub) in enumerate(stubs.items())}
+    agents.structured_llm = injectors["mapper"]
+    agents.unit_structured_llm = injectors["unit_mapper"]
+    evaluate.matcher_chain = injectors["matcher"]
+    evaluate.batch_matcher_chain = injectors["batch_matcher"]
+    guards = [RealClientGuard("agents.get_llm"), RealClientGuard("evaluate.get_evaluator_llm")]
+    agents.get_llm, evaluate.get_evaluator_llm = guards
+    for client in (agents.mapper_client, evaluate.evaluator_client):
+        client.base_backoff_s = args.retry_backoff
+        client.max_backoff_s = args.retry_backoff * 8
+        client.limiter.rate_per_s = float("inf")
+        client.limiter.burst = client.limiter._tokens = 1_000_000
+    evaluate.evaluator_client.hedge_after_s = args.hedge_after
+    agents.MAX_REQUEST_PAGES = args.max_request_pages
+    agents.WINDOW_PAGES = args.window_pages
+    agents.WINDOW_OVERLAP = args.window_overlap
+    agents.WINDOW_CONCURRENCY = args.window_concurrency
+    return {"stubs": stubs, "injectors": injectors, "guards": guards}
+
+# --- Running the Suite ---
+
+def timed(fn, verbose: bool):
+    """Runs `fn` (silencing the pipeline's progress output unless verbose) and returns (seconds, result)."""
+    started = time.perf_counter()
+    if verbose:
+        result = fn()
+    else:
+        with redirect_stdout(io.StringIO()):
+            result = fn()
+    return time.perf_counter() - started, result
+
+def run_size(page_count: int, args, llms: dict, work_dir: Path) -> dict:
+    """Benchmarks every stage on one synthetic book, keeping the best time of `args.repeat` runs."""
+    book_dir = work_dir / f"book_{page_count}"
+    book_dir.mkdir()
+    pages, structure = build_synthetic_book(page_count, args.lessons_per_unit, args.pages_per_lesson, args.seed)
+    pdf_path = book_dir / "book.pdf"
+    write_synthetic_pdf(pages, pdf_path)
+    markdown = golden_markdown(pages, structure)
+    ground_truth = paraphrase_ground_truth(structure)
+    agents.mapper_cache = ResponseCache(book_dir / "mapper_cache")
+
+    telemetry.reset()
+    timings = {"phase1_map": [], "map_validation": [], "phase2_assembly": [], "golden_parse": [], "content_eval": [], "evaluation": [],
+               "end_to_end": []}
+    stubs = llms["stubs"]
+    for run in range(args.repeat):
+        for stub in stubs.values():
+            stub.calls = 0
+
+        elapsed, structure_map = timed(lambda: pipeline.generate_structure_map(pdf_path, bypass_cache=True), args.verbose)
+        timings["phase1_map"].append(elapsed)
+
+        elapsed, (repaired_map, _) = timed(lambda: repair_structure_map(perturb_map(structure), load_page_headings(pdf_path)), args.verbose)
+        timings["map_validation"].append(elapsed)
+
+        pipeline.PAGE_CACHE_DIR = book_dir / f"page_cache_{run}"
+        final_json_path = book_dir / f"book_{run}_structured_pydantic.json"
+        if args.output_format == "packed":
+            final_json_path = final_json_path.with_suffix(PACK_SUFFIX)
+        elapsed, _ = timed(lambda: pipeline.run_assembly(structure_map, pdf_path, final_json_path, None,
+                                                         args.workers, args.output_format), args.verbose)
+        timings["phase2_assembly"].append(elapsed)
+
+        elapsed, golden = timed(lambda: parse_golden_markdown_to_json(markdown), args.verbose)
+        timings["golden_parse"].append(elapsed)
+
+        elapsed, content = timed(lambda: evaluate_content(golden, load_units(final_json_path)), args.verbose)
+        timings["content_eval"].append(elapsed)
+
+        elapsed, stats = timed(lambda: asyncio.run(evaluate.aevaluate_with_llm(ground_truth, structure_map, args.concurrency,
+                                                                               args.batch_lessons)), args.verbose)
+        timings["evaluation"].append(elapsed)
+
+        # The whole of process_book: with pipelining, page extraction overlaps the (stub) Mapper Agent call.
+        pipeline.PAGE_CACHE_DIR = book_dir / f"page_cache_e2e_{run}"
+        elapsed, _ = timed(lambda: pipeline.process_book(pdf_path, book_dir / f"e2e_{run}_agent_map.json",
+                                                         book_dir / f"e2e_{run}_structured_pydantic.json",
+                                                         extraction_workers=args.workers, bypass_mapper_cache=True,
+                                                         output_format=args.output_format, incremental=False), args.verbose)
+        timings["end_to_end"].append(elapsed)
+
+    best = {stage: round(min(values), 4) for stage, values in timings.items()}
+    return {
+        "pages": page_count,
+        "units": len(structure),
+        "lessons": sum(len(u["lessons"]) for u in structure),
+        "pdf_bytes": pdf_path.stat().st_size,
+        "timings_s": best,
+        "throughput": {"phase2_pages_per_s": round(page_count / best["phase2_assembly"], 1)},
+        "checks": {
+            "map_matches_ground_truth": structure_map == structure,
+            "repair_restores_map": repaired_map == structure,
+            "content_book_recall": content["book_recall"],
+            "content_min_lesson_recall": min((r["recall"] for r in content["sections"] if r["kind"] == "lesson"), default=0.0),
+            "matched_lessons": stats["matched_lessons_count"],
+            "match_tiers": stats["match_tiers"],
+            "llm_calls": {name: stub.calls for name, stub in stubs.items()},
+            "llm_failures": stats["llm_failures"],
+            "injected": {name: dict(injector.injected) for name, injector in llms["injectors"].items()},
+            "real_client_attempts": {guard.name: guard.attempts for guard in llms["guards"]},
+        },
+        "telemetry": telemetry.snapshot(),
+    }
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def compare_results(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Lists every stage that is more than `tolerance` slower than in the baseline at the same size."""
+    baseline_by_pages = {r["pages"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        previous = baseline_by_pages.get(result["pages"])
+        if previous is None:
+            continue
+        for stage, seconds in result["timings_s"].items():
+            old = previous["timings_s"].get(stage)
+            if old and seconds > old * (1 + tolerance):
+                regressions.append(f"{stage} @ {result['pages']} pages: {old:.4f}s -> {seconds:.4f}s (+{(seconds / old - 1) * 100:.0f}%)")
+    return regressions
+
+def print_results(results: list[dict]):
+    stages = list(results[0]["timings_s"]) if results else []
+    print(f"  {'pages':>6}{'units':>7}{'lessons':>9}" + "".join(f"{stage:>17}" for stage in stages) + f"{'map ok':>8}")
+    for r in results:
+        print(f"  {r['pages']:>6}{r['units']:>7}{r['lessons']:>9}" + "".join(f"{r['timings_s'][s]:>17.4f}" for s in stages)
+              + f"{'yes' if r['checks']['map_matches_ground_truth'] else 'NO':>8}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark on synthetic Arabic PDFs with stub LLMs.")
+    parser.add_argument("--pages", type=int, nargs="+", default=DEFAULT_PAGE_COUNTS, help="Page counts of the synthetic books.")
+    parser.add_argument("--lessons-per-unit", type=int, default=3, help="Lessons in each synthetic unit.")
+    parser.add_argument("--pages-per-lesson", type=int, default=6, help="Pages in each synthetic lesson.")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Seconds each stub LLM call sleeps.")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of stub LLM calls that fail with a 429/503.")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Share of stub LLM calls that stall for --slow-latency.")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="Seconds a stalled stub LLM call sleeps.")
+    parser.add_argument("--retry-backoff", type=float, default=0.01, help="Base retry backoff of the LLM clients, in seconds.")
+    parser.add_argument("--hedge-after", type=float, help="Hedge evaluator calls still running after this many seconds.")
+    parser.add_argument("--max-request-pages", type=int, default=agents.MAX_REQUEST_PAGES, help="Map longer payloads in windows.")
+    parser.add_argument("--window-pages", type=int, default=agents.WINDOW_PAGES, help="Pages per mapping window.")
+    parser.add_argument("--window-overlap", type=int, default=agents.WINDOW_OVERLAP, help="Pages shared by neighbouring windows.")
+    parser.add_argument("--window-concurrency", type=int, default=agents.WINDOW_CONCURRENCY, help="Windows mapped at once.")
+    parser.add_argument("--concurrency", type=int, default=evaluate.DEFAULT_CONCURRENCY, help="Evaluator concurrency.")
+    parser.add_argument("--batch-lessons", action="store_true", help="Evaluate with one batched call per unit.")
+    parser.add_argument("--workers", type=int, default=1, help="Phase 2 page extraction workers.")
+    parser.add_argument("--output-format", choices=OUTPUT_FORMATS, default="json", help="Phase 2 output format.")
+    parser.add_argument("--no-pipelining", action="store_true", help="Extract pages only after Phase 1, as without pipelining.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per size; the best time of each stage is reported.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic text.")
+    parser.add_argument("--out", type=Path, default=DEFAULT_OUT_PATH, help="Where to write the JSON results.")
+    parser.add_argument("--baseline", type=Path, help="A previous results file to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown vs. the baseline (0.2 = 20%%).")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's own progress output.")
+    args = parser.parse_args()
+
+    # The baseline is read first, since it may be the file about to be overwritten.
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    llms = install_stubs(args.llm_latency, args)
+    pipeline.PIPELINE_PAGE_EXTRACTION = not args.no_pipelining
+    print(f"Running the offline suite at {args.pages} pages (LLM latency {args.llm_latency}s, best of {args.repeat})\n")
+    results = []
+    with tempfile.TemporaryDirectory(prefix="offline_suite_") as work_dir:
+        for page_count in args.pages:
+            results.append(run_size(page_count, args, llms, Path(work_dir)))
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k not in ("out", "baseline", "verbose")},
+        "results": results,
+    }
+    print_results(results)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Results saved to: '{args.out}'")
+
+    # A stub missed by install_stubs would otherwise fall back to a real client, and the pipeline
+    # swallows the error that client raises without an API key.
+    real_clients = [guard.name for guard in llms["guards"] if guard.attempts]
+    if real_clients:
+        print(f"\n❌ The pipeline tried to build a real LLM client: {', '.join(real_clients)}")
+        sys.exit(1)
+
+    if baseline is not None:
+        regressions = compare_results(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print(f"✅ No stage regressed by more than {args.tolerance:.0%} against '{args.baseline}'.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+# checkpoint.py
+
+import os
+import re
+import json
+import time
+import hashlib
+from pathlib import Path
+from content_store import PACK_SUFFIX, load_packed_units
+from page_store import page_start_offsets
+
+MANIFEST_VERSION = 1
+PART_PAGES_PATTERN = re.compile(r"\(Pages (\d+)-(\d+)\)")
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def hash_json(data) -> str:
+    """Hashes a JSON-serializable object in canonical form (sorted keys, no whitespace)."""
+    return hash_text(json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(",", ":")))
+
+def range_key(start_page: int, end_page: int) -> str:
+    return f"{start_page}-{end_page}"
+
+# --- Manifest ---
+
+def manifest_path_for(final_json_path: Path) -> Path:
+    return final_json_path.with_name(f"{final_json_path.stem}.manifest.json")
+
+def new_manifest(pdf_hash: str) -> dict:
+    return {"version": MANIFEST_VERSION, "pdf_hash": pdf_hash, "phases": {}, "ranges": {}, "page_offsets": {}}
+
+def load_manifest(manifest_path: Path, pdf_hash: str) -> dict:
+    """Loads the manifest for this PDF; a missing, unreadable or stale manifest starts fresh."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return new_manifest(pdf_hash)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("pdf_hash") != pdf_hash:
+        return new_manifest(pdf_hash)
+    return manifest
+
+def save_manifest(manifest_path: Path, manifest: dict):
+    """Writes the manifest atomically so an interrupted run never leaves it half-written."""
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def mark_phase_complete(manifest_path: Path, manifest: dict, phase: str, **details):
+    manifest["phases"][phase] = {"completed_at": time.time(), **details}
+    save_manifest(manifest_path, manifest)
+
+# --- Reusing Previously Extracted Ranges ---
+
+def load_units(output_path: Path) -> list[dict]:
+    """Reads the units of a previous run's output, in JSON, NDJSON or packed form."""
+    if not output_path.exists():
+        return []
+    try:
+        if output_path.suffix == PACK_SUFFIX:
+            return load_packed_units(output_path)
+        with open(output_path, 'r', encoding='utf-8') as f:
+            if output_path.suffix == ".ndjson":
+                return [json.loads(line) for line in f if line.strip()]
+            return json.load(f).get("units", [])
+    except (OSError, ValueError):
+        return []
+
+def collect_range_contents(units: list[dict]) -> dict[str, str]:
+    """Maps each page range in a previous output to its extracted text."""
+    contents = {}
+    for unit in units:
+        for lesson in unit.get("lessons", []):
+            contents[range_key(lesson["start_page"], lesson["end_page"])] = lesson.get("content", "")
+        for part in unit.get("parts", []):
+            match = PART_PAGES_PATTERN.search(part.get("title", ""))
+            if match:
+                contents[range_key(int(match.group(1)), int(match.group(2)))] = part.get("content", "")
+            elif not unit.get("lessons") and len(unit.get("parts", [])) == 1:
+                # The introduction and afterword units hold a single part spanning the whole unit.
+                contents[range_key(unit["start_page"], unit["end_page"])] = part.get("content", "")
+    return contents
+
+
+class IncrementalPageSource:
+    """
+    Serves page ranges from a previous run when their boundaries and content hash still match the
+    manifest, and extracts only the changed ranges from a page source created on first use.
+    Every range served is recorded with its content hash for the next manifest, and every range
+    chunked with its page start offsets, so chunk provenance for a reused range comes from the
+    manifest instead of forcing its pages to be extracted again.
+    """
+
+    def __init__(self, previous_contents: dict[str, str], previous_hashes: dict[str, str], source_factory, page_count: int,
+                 previous_offsets: dict[str, list[int]] | None = None):
+        self.previous_contents = previous_contents
+        self.previous_hashes = previous_hashes
+        self.previous_offsets = previous_offsets or {}
+        self.source_factory = source_factory
+        self.page_count = page_count
+        self._source = None
+        self._reused_keys = set()
+        self.ranges = {}
+        self.page_offsets = {}
+        self.reused = 0
+        self.extracted = 0
+
+    def __len__(self) -> int:
+        return self.page_count
+
+    def _get_source(self):
+        if self._source is None:
+            self._source = self.source_factory()
+        return self._source
+
+    def page_text(self, page_number: int) -> str:
+        """Returns the raw text of a single 1-based page from the underlying source."""
+        return self._get_source().page_text(page_number)
+
+    def get_range_text(self, start_page: int, end_page: int) -> str:
+        key = range_key(start_page, end_page)
+        text = self.previous_contents.get(key)
+        if text is not None and self.previous_hashes.get(key) == hash_text(text):
+            self.reused += 1
+            self._reused_keys.add(key)
+        else:
+            text = self._get_source().get_range_text(start_page, end_page)
+            self.extracted += 1
+        self.ranges[key] = hash_text(text)
+        return text
+
+    def page_start_offsets(self, start_page: int, end_page: int) -> list[int]:
+        """
+        Where each page of a range begins within its content: recorded offsets for a range reused
+        unchanged, and otherwise computed from the pages of the underlying source.
+        """
+        key = range_key(start_page, end_page)
+        offsets = self.page_offsets.get(key)
+        if offsets is None:
+            offsets = self.previous_offsets.get(key) if key in self._reused_keys else None
+            if offsets is None:
+                offsets = page_start_offsets(self._get_source(), start_page, end_page)
+            self.page_offsets[key] = offsets
+        return offsets
@@ -0,0 +1,203 @@
+# chunker.py
+
+import re
+import json
+import bisect
+import argparse
+import fitz
+from pathlib import Path
+
+from checkpoint import PART_PAGES_PATTERN
+from content_store import PACK_SUFFIX, ContentStore
+from page_store import DocumentPageSource, page_start_offsets
+from stream_writer import NdjsonUnitWriter
+
+# --- Configuration ---
+DEFAULT_CHUNK_SIZE = 1200      # In characters, or in tokens when sizing by tokens.
+DEFAULT_CHUNK_OVERLAP = 150
+SIZE_UNITS = ("chars", "tokens")
+TOKEN_ENCODING = "cl100k_base"
+
+# Paragraphs are separated by blank lines; sentences end in Latin or Arabic terminal punctuation.
+PARAGRAPH_BREAK_PATTERN = re.compile(r"\n\s*\n")
+SENTENCE_BREAK_PATTERN = re.compile(r"(?<=[.!?؟۔…])\s+")
+WORD_PATTERN = re.compile(r"\S+\s*")
+
+def make_size_function(size_unit: str):
+    """Returns a callable measuring text in the chosen unit (characters or tokenizer tokens)."""
+    if size_unit == "chars":
+        return len
+    if size_unit == "tokens":
+        import tiktoken  # Only needed for token-based sizing.
+        encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        return lambda text: len(encoding.encode_ordinary(text))
+    raise ValueError(f"Unknown size unit '{size_unit}'; expected one of {SIZE_UNITS}")
+
+# --- Sections With Provenance ---
+
+def iter_sections(book: str, units):
+    """
+    Yields (provenance, content) for every lesson and unit part in page order, consuming units one
+    at a time.
+    """
+    for unit in units:
+        sections = []
+        for part in unit.get("parts", []):
+            match = PART_PAGES_PATTERN.search(part["title"])
+            start_page, end_page = (int(match.group(1)), int(match.group(2))) if match else (unit["start_page"], unit["end_page"])
+            sections.append(({"book": book, "unit": unit["title"], "lesson": None, "part": part["title"],
+                              "start_page": start_page, "end_page": end_page}, part.get("content", "")))
+        for lesson in unit.get("lessons", []):
+            sections.append(({"book": book, "unit": unit["title"], "lesson": lesson["title"], "part": None,
+                              "start_page": lesson["start_page"], "end_page": lesson["end_page"]}, lesson.get("content", "")))
+        yield from sorted(sections, key=lambda section: section[0]["start_page"])
+
+def section_page_offsets(page_source, start_page: int, end_page: int) -> list[int]:
+    """
+    Page start offsets for a section, taken from the source itself when it keeps them per range
+    (see IncrementalPageSource), so reused ranges are never re-read from the PDF just for provenance.
+    """
+    if hasattr(page_source, "page_start_offsets"):
+        return page_source.page_start_offsets(start_page, end_page)
+    return page_start_offsets(page_source, start_page, end_page)
+
+# --- Splitting and Packing ---
+
+def split_segments(text: str) -> list[tuple[int, int]]:
+    """Splits text into (start, end) spans at paragraph and then sentence boundaries."""
+    segments = []
+    paragraph_start = 0
+    for paragraph_break in list(PARAGRAPH_BREAK_PATTERN.finditer(text)) + [None]:
+        paragraph_end = paragraph_break.end() if paragraph_break else len(text)
+        sentence_start = paragraph_start
+        for sentence_break in SENTENCE_BREAK_PATTERN.finditer(text, paragraph_start, paragraph_end):
+            segments.append((sentence_start, sentence_break.end()))
+            sentence_start = sentence_break.end()
+        if sentence_start < paragraph_end:
+            segments.append((sentence_start, paragraph_end))
+        paragraph_start = paragraph_end
+    return segments
+
+def _split_oversized(text: str, start: int, end: int, chunk_size: int, size_of) -> list[tuple[int, int]]:
+    """Falls back to word boundaries for a single sentence longer than the chunk size."""
+    pieces, piece_start, piece_size = [], start, 0
+    for word in WORD_PATTERN.finditer(text, start, end):
+        word_size = size_of(word.group())
+        if piece_size and piece_size + word_size > chunk_size:
+            pieces.append((piece_start, word.start()))
+            piece_start, piece_size = word.start(), 0
+        piece_size += word_size
+    if piece_start < end:
+        pieces.append((piece_start, end))
+    return pieces
+
+def chunk_spans(text: str, chunk_size: int, chunk_overlap: int, size_of) -> list[tuple[int, int, int]]:
+    """
+    Packs sentence/paragraph segments greedily into (start, end, size) chunks of at most
+    `chunk_size`, where each chunk after the first repeats trailing segments of the previous
+    one worth up to `chunk_overlap`. Sizes are the sum of segment sizes.
+    """
+    segments = []
+    for start, end in split_segments(text):
+        size = size_of(text[start:end])
+        if size > chunk_size:
+            segments.extend((s, e, size_of(text[s:e])) for s, e in _split_oversized(text, start, end, chunk_size, size_of))
+        else:
+            segments.append((start, end, size))
+
+    chunks, window, window_size = [], [], 0
+    for segment in segments:
+        if window and window_size + segment[2] > chunk_size:
+            chunks.append((window[0][0], window[-1][1], window_size))
+            # Carry trailing segments into the next chunk as overlap, leaving room for the new segment.
+            carried, carried_size = [], 0
+            for previous in reversed(window):
+                if carried_size + previous[2] > chunk_overlap or carried_size + previous[2] + segment[2] > chunk_size:
+                    break
+                carried.insert(0, previous)
+                carried_size += previous[2]
+            window, window_size = carried, carried_size
+        window.append(segment)
+        window_size += segment[2]
+    if window:
+        chunks.append((window[0][0], window[-1][1], window_size))
+    return chunks
+
+def iter_chunks(book: str, units, page_source=None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                chunk_overlap: int = DEFAULT_CHUNK_OVERLAP, size_unit: str = "chars", first_index: int = 0):
+    """
+    Yields chunk records for a stream of assembled units, one section at a time. With a page source
+    (anything with `page_text(n)`), each chunk carries the physical pages its text actually spans;
+    without one, it carries its section's page range. Chunk ids are numbered from `first_index`.
+    """
+    size_of = make_size_function(size_unit)
+    chunk_index = first_index
+    for provenance, content in iter_sections(book, units):
+        if not content.strip():
+            continue
+        start_page = provenance["start_page"]
+        offsets = section_page_offsets(page_source, start_page, provenance["end_page"]) if page_source else None
+        for start, end, size in chunk_spans(content, chunk_size, chunk_overlap, size_of):
+            text = content[start:end].strip()
+            if not text:
+                continue
+            if offsets:
+                first_page = start_page + bisect.bisect_right(offsets, start) - 1
+                last_page = start_page + bisect.bisect_left(offsets, end) - 1
+                page_span = (first_page, max(first_page, last_page))
+            else:
+                page_span = (start_page, provenance["end_page"])
+            yield {
+                "chunk_id": f"{book}:{chunk_index}", **provenance,
+                "start_page": page_span[0], "end_page": page_span[1],
+                "char_start": start, "char_end": end, "size": size, "size_unit": size_unit, "text": text
+            }
+            chunk_index += 1
+
+def write_chunks(chunks, output_path: Path) -> int:
+    """Writes chunk records to JSONL as they are produced; returns the number written."""
+    with NdjsonUnitWriter(output_path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer.count
+
+def chunks_path_for(final_json_path: Path) -> Path:
+    return final_json_path.with_name(f"{final_json_path.stem}.chunks.jsonl")
+
+# --- Standalone Usage ---
+
+def iter_output_units(output_path: Path):
+    """Yields units from a structured output; NDJSON outputs and packed stores are read one unit at a time."""
+    if output_path.suffix == PACK_SUFFIX:
+        with ContentStore(output_path) as store:
+            yield from store.iter_units()
+        return
+    with open(output_path, 'r', encoding='utf-8') as f:
+        if output_path.suffix == ".ndjson":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from json.load(f).get("units", [])
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a structured book output into overlapping, provenance-tagged chunks.")
+    parser.add_argument("output_path", type=Path, help="Structured book JSON, NDJSON or packed store produced by main.py.")
+    parser.add_argument("--pdf", type=Path, help="Source PDF, for exact per-chunk page spans.")
+    parser.add_argument("--out", type=Path, help="Chunks JSONL path (default: next to the input).")
+    parser.add_argument("--size", type=int, default=DEFAULT_CHUNK_SIZE, help="Maximum chunk size.")
+    parser.add_argument("--overlap", type=int, default=DEFAULT_CHUNK_OVERLAP, help="Overlap between consecutive chunks.")
+    parser.add_argument("--unit", choices=SIZE_UNITS, default="chars", help="Measure sizes in characters or tokens.")
+    args = parser.parse_args()
+
+    out_path = args.out or chunks_path_for(args.output_path)
+    units = iter_output_units(args.output_path)
+    if args.pdf:
+        with fitz.open(args.pdf) as pdf_doc:
+            count = write_chunks(iter_chunks(args.output_path.stem, units, DocumentPageSource(pdf_doc), args.size, args.overlap, args.unit), out_path)
+    else:
+        count = write_chunks(iter_chunks(args.output_path.stem, units, None, args.size, args.overlap, args.unit), out_path)
+    print(f"✅ Wrote {count} chunks to: '{out_path}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# content_store.py
+
+import os
+import json
+import mmap
+import argparse
+from pathlib import Path
+
+PACK_FORMAT = "datachunk-pack"
+PACK_VERSION = 1
+# The metadata index keeps the output's stem, so sidecars, manifests and chunk files keep their names.
+PACK_SUFFIX = ".pack"
+BLOB_SUFFIX = ".blob"
+
+def blob_path_for(index_path: Path) -> Path:
+    return index_path.with_suffix(BLOB_SUFFIX)
+
+def _without_content(entry: dict, offset: int, length: int) -> dict:
+    return {**{k: v for k, v in entry.items() if k != "content"}, "offset": offset, "length": length}
+
+# --- Writing ---
+
+class PackedUnitWriter:
+    """
+    Writes units as a packed content store: every lesson's and part's text is appended to one
+    contiguous UTF-8 blob as the unit arrives, and a small JSON index keeps the titles, page ranges
+    and the (byte offset, byte length) of each section's text. Only the index, never the content,
+    is held in memory. Both files are written under temporary names and swapped in on close, so a
+    reader never sees an index that does not match its blob; after a failure, `abort` discards them
+    and leaves any previous store in place.
+    """
+
+    def __init__(self, index_path: Path):
+        self.index_path = Path(index_path)
+        self.blob_path = blob_path_for(self.index_path)
+        self._tmp_blob_path = self.blob_path.with_name(self.blob_path.name + ".tmp")
+        self._tmp_index_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        self.f = open(self._tmp_blob_path, 'wb')
+        self.units = []
+        self.offset = 0
+        self.count = 0
+
+    def _append(self, entry: dict) -> dict:
+        data = entry.get("content", "").encode("utf-8")
+        self.f.write(data)
+        packed = _without_content(entry, self.offset, len(data))
+        self.offset += len(data)
+        return packed
+
+    def write(self, unit: dict):
+        packed = {k: v for k, v in unit.items() if k not in ("lessons", "parts")}
+        packed["lessons"] = [self._append(lesson) for lesson in unit.get("lessons", [])]
+        packed["parts"] = [self._append(part) for part in unit.get("parts", [])]
+        self.f.flush()
+        self.units.append(packed)
+        self.count += 1
+
+    def close(self):
+        self.f.close()
+        index = {"format": PACK_FORMAT, "version": PACK_VERSION, "encoding": "utf-8",
+                 "blob": self.blob_path.name, "blob_bytes": self.offset, "units": self.units}
+        with open(self._tmp_index_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(self._tmp_blob_path, self.blob_path)
+        os.replace(self._tmp_index_path, self.index_path)
+
+    def abort(self):
+        """Discards everything written so far without touching an existing store."""
+        self.f.close()
+        self._tmp_blob_path.unlink(missing_ok=True)
+        self._tmp_index_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_packed_units(units, index_path: Path) -> int:
+    """Drains a unit iterator into a packed content store at `index_path`; returns the unit count."""
+    with PackedUnitWriter(index_path) as writer:
+        for unit in units:
+            writer.write(unit)
+    return writer.count
+
+# --- Reading ---
+
+def load_pack_index(index_path: Path) -> dict:
+    """Reads and checks a packed store's metadata index without touching its content blob."""
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+    if index.get("format") != PACK_FORMAT or index.get("version") != PACK_VERSION:
+        raise ValueError(f"'{index_path}' is not a version {PACK_VERSION} packed content store.")
+    return index
+
+class ContentStore:
+    """
+    Read access to a packed content store. The metadata index is parsed up front; the content blob
+    is memory-mapped, so `text()` decodes only the bytes of the section asked for and the operating
+    system pages in just those parts of the file.
+
+        with ContentStore(Path("output/book2_structured_pydantic.pack")) as store:
+            lesson = store.units[1]["lessons"][0]
+            print(lesson["title"], store.text(lesson)[:200])
+    """
+
+    def __init__(self, index_path: Path):
+        self.index_path = Path(index_path)
+        index = load_pack_index(self.index_path)
+        self.units = index["units"]
+        self._file = open(self.index_path.with_name(index["blob"]), 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        if size != index["blob_bytes"]:
+            self._file.close()
+            raise ValueError(f"The content blob of '{self.index_path}' has {size} bytes; its index expects {index['blob_bytes']}.")
+        # An empty file cannot be mapped, and has nothing to read anyway.
+        self._blob = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def text(self, section: dict) -> str:
+        """The content of a lesson or part entry from `units`."""
+        return self.text_at(section["offset"], section["length"])
+
+    def text_at(self, offset: int, length: int) -> str:
+        return self._blob[offset:offset + length].decode("utf-8")
+
+    def iter_units(self):
+        """Yields units in the regular output form (with `content`), decoding one unit at a time."""
+        for unit in self.units:
+            full = {k: v for k, v in unit.items() if k not in ("lessons", "parts")}
+            for key in ("lessons", "parts"):
+                full[key] = [{**{k: v for k, v in s.items() if k not in ("offset", "length")}, "content": self.text(s)}
+                             for s in unit.get(key, [])]
+            yield full
+
+    def close(self):
+        if isinstance(self._blob, mmap.mmap):
+            self._blob.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def load_packed_units(index_path: Path) -> list[dict]:
+    """All units of a packed store in the regular output form."""
+    with ContentStore(index_path) as store:
+        return list(store.iter_units())
+
+# --- Converting Existing Outputs ---
+
+def convert_to_packed(output_path: Path, index_path: Path | None = None) -> Path:
+    """Packs a structured JSON or NDJSON output; the store is written next to it by default."""
+    from chunker import iter_output_units
+    index_path = index_path or output_path.with_suffix(PACK_SUFFIX)
+    write_packed_units(iter_output_units(output_path), index_path)
+    return index_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert structured book outputs to packed, memory-mappable content stores.")
+    parser.add_argument("output_paths", type=Path, nargs="+", help="Structured book JSON or NDJSON files produced by main.py.")
+    parser.add_argument("--out-dir", type=Path, help="Where to write the stores (default: next to each input).")
+    args = parser.parse_args()
+
+    for output_path in args.output_paths:
+        if not output_path.exists():
+            print(f"❌ Error: Output not found at '{output_path}'")
+            continue
+        index_path = None
+        if args.out_dir:
+            args.out_dir.mkdir(parents=True, exist_ok=True)
+            index_path = args.out_dir / output_path.with_suffix(PACK_SUFFIX).name
+        index_path = convert_to_packed(output_path, index_path)
+        index_kb = index_path.stat().st_size / 1024
+        blob_kb = blob_path_for(index_path).stat().st_size / 1024
+        print(f"✅ '{output_path}' ({output_path.stat().st_size / 1024:,.0f} KB) -> '{index_path}' "
+              f"({index_kb:,.0f} KB index + {blob_kb:,.0f} KB content)")
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,24 @@
 # evaluate_llm.py
 
 import json
+import asyncio
 import argparse
 from pathlib import Path
-from dotenv import load_dotenv
-
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.pydantic_v1 import BaseModel, Field
+from pydantic.v1 import BaseModel, Field
+from fuzzy_match import TitleIndex
+from verdict_cache import VerdictCache
+from telemetry import telemetry, record_llm_usage
+from llm_client import get_llm_client
 
 # --- 1. Setup the Evaluator Agent ---
-load_dotenv()
-
 # We use a powerful model for the nuanced task of semantic comparison.
-evaluator_llm = ChatOpenAI(model="gpt-4o", temperature=0)
+EVALUATOR_MODEL = "gpt-4o"
+EVALUATOR_REQUESTS_PER_MINUTE = 300
+EVALUATOR_TIMEOUT_S = 60.0
+# A matcher call still running after this long is raced against a duplicate request.
+EVALUATOR_HEDGE_AFTER_S = 15.0
+evaluator_client = get_llm_client("openai", EVALUATOR_MODEL, requests_per_minute=EVALUATOR_REQUESTS_PER_MINUTE, burst=10,
+                                  timeout_s=EVALUATOR_TIMEOUT_S, hedge_after_s=EVALUATOR_HEDGE_AFTER_S)
 
 # Define the structured output we want from the LLM using Pydantic.
 # This makes parsing the LLM's response extremely reliable.
@@ -23,9 +28,6 @@ class TitleMatch(BaseModel):
     confidence: float = Field(description="A confidence score from 0.0 (no match) to 1.0 (perfect match).")
     reasoning: str = Field(description="A brief explanation for the decision.")
 
-# Create the chain with structured output.
-structured_llm = evaluator_llm.with_structured_output(TitleMatch)
-
 MATCHER_PROMPT_TEMPLATE = """
 You are a meticulous comparison agent specializing in Arabic academic titles. Your task is to determine if a given `ground_truth_title` has a semantic equivalent in a list of `candidate_titles`.
 
@@ -39,8 +41,70 @@ Ground Truth Title:
 Candidate Titles from Agent:
 {candidate_titles}
 """
-matcher_prompt = ChatPromptTemplate.from_template(MATCHER_PROMPT_TEMPLATE)
-matcher_chain = matcher_prompt | structured_llm
+
+# Optional single-call matching of all of a unit's lessons at once.
+class LessonTitleMatch(TitleMatch):
+    ground_truth_title: str = Field(description="The ground truth title this match result refers to, copied exactly.")
+
+class BatchTitleMatch(BaseModel):
+    matches: list[LessonTitleMatch] = Field(description="One match result per ground truth title, in the given order.")
+
+BATCH_MATCHER_PROMPT_TEMPLATE = """
+You are a meticulous comparison agent specializing in Arabic academic titles. For EACH title in `ground_truth_titles`, determine if it has a semantic equivalent in the list of `candidate_titles`.
+
+- A semantic match is one where the titles refer to the same chapter or lesson, even if there are minor wording differences, punctuation changes, or variations in diacritics (e.g., 'الـمُنـكـر' vs. 'المنكر').
+- Each candidate title may be the best match for at most one ground truth title.
+- If a clear match exists, set `is_match` to true, provide the `best_match` from the candidate list, and set confidence to 0.9 or higher.
+- If there is no plausible match, set `is_match` to false and confidence to 0.1 or lower.
+- Return exactly one result per ground truth title, in the same order, copying the title into `ground_truth_title`.
+
+Ground Truth Titles:
+{ground_truth_titles}
+
+Candidate Titles from Agent:
+{candidate_titles}
+"""
+
+# The OpenAI client and both chains are imported and built on first use, so importing this module
+# (e.g. for the local matching tier or the report) needs neither langchain nor an API key.
+evaluator_llm = None
+matcher_chain = None
+batch_matcher_chain = None
+
+def get_evaluator_llm():
+    """The evaluator chat model, built on first use."""
+    global evaluator_llm
+    if evaluator_llm is None:
+        from dotenv import load_dotenv
+        from langchain_openai import ChatOpenAI
+        load_dotenv()
+        # Retries and timeouts are handled by `evaluator_client`.
+        evaluator_llm = ChatOpenAI(model=EVALUATOR_MODEL, temperature=0, max_retries=0, timeout=EVALUATOR_TIMEOUT_S)
+    return evaluator_llm
+
+def get_matcher_chain():
+    """Prompt | model with TitleMatch structured output, for one title at a time."""
+    global matcher_chain
+    if matcher_chain is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        matcher_chain = ChatPromptTemplate.from_template(MATCHER_PROMPT_TEMPLATE) | get_evaluator_llm().with_structured_output(TitleMatch)
+    return matcher_chain
+
+def get_batch_matcher_chain():
+    """Prompt | model with BatchTitleMatch structured output, for all of a unit's lessons at once."""
+    global batch_matcher_chain
+    if batch_matcher_chain is None:
+        from langchain_core.prompts import ChatPromptTemplate
+        batch_matcher_chain = ChatPromptTemplate.from_template(BATCH_MATCHER_PROMPT_TEMPLATE) | get_evaluator_llm().with_structured_output(BatchTitleMatch)
+    return batch_matcher_chain
+
+# Maximum number of evaluator LLM requests in flight at once.
+DEFAULT_CONCURRENCY = 8
+MATCH_CONFIDENCE_THRESHOLD = 0.8
+# LLM verdicts are memoized here across runs; changing either prompt template invalidates them.
+VERDICT_CACHE_PATH = Path("output/evaluator_verdicts.sqlite")
+TELEMETRY_LOG_PATH = Path("output/telemetry.jsonl")
+METRICS_TEXTFILE_PATH = Path("output/metrics/evaluate.prom")
 
 # --- 2. Helper and Core Evaluation Functions ---
 
@@ -57,20 +121,152 @@ def load_json_file(file_path: Path) -> list | None:
         print(f"❌ Error loading {file_path}: {e}")
         return None
 
+def _format_titles(titles: list[str]) -> str:
+    return "\n".join(f"- {t}" for t in titles)
+
+# Reasoning of the placeholder verdict for a title whose LLM call failed after all retries.
+LLM_FAILURE_REASONING = "API call failed."
+
+def _failed_match(gt_title: str, e: Exception) -> TitleMatch:
+    print(f"  -- LLM evaluation call failed for title '{gt_title}': {e}")
+    return TitleMatch(is_match=False, best_match=None, confidence=0.0, reasoning=LLM_FAILURE_REASONING)
+
 def find_best_semantic_match(gt_title: str, agent_titles: list[str]) -> TitleMatch:
     """Uses the LLM to find the best semantic match for a title."""
     try:
-        response = matcher_chain.invoke({
+        response = evaluator_client.invoke(get_matcher_chain(), {
             "ground_truth_title": gt_title,
-            "candidate_titles": "\n".join(f"- {t}" for t in agent_titles)
+            "candidate_titles": _format_titles(agent_titles)
         })
         return response
     except Exception as e:
-        print(f"  -- LLM evaluation call failed for title '{gt_title}': {e}")
-        return TitleMatch(is_match=False, best_match=None, confidence=0.0, reasoning="API call failed.")
+        return _failed_match(gt_title, e)
 
-def evaluate_with_llm(ground_truth_units: list, agent_units: list):
-    """Performs a semantic evaluation of the agent's map against the ground truth."""
+def _cached_match(verdict_cache: VerdictCache | None, gt_title: str, agent_titles: list[str]) -> TitleMatch | None:
+    if verdict_cache is None:
+        return None
+    verdict = verdict_cache.lookup(gt_title, agent_titles)
+    return TitleMatch(**verdict) if verdict is not None else None
+
+def _store_match(verdict_cache: VerdictCache | None, gt_title: str, agent_titles: list[str], match: TitleMatch):
+    if verdict_cache is not None:
+        verdict_cache.store(gt_title, agent_titles, match.is_match, match.best_match, match.confidence, match.reasoning)
+
+async def afind_best_semantic_match(gt_title: str, agent_titles: list[str], semaphore: asyncio.Semaphore,
+                                    verdict_cache: VerdictCache | None = None) -> TitleMatch:
+    """Async variant of `find_best_semantic_match`, limited by a shared semaphore and memoized in `verdict_cache`."""
+    cached = _cached_match(verdict_cache, gt_title, agent_titles)
+    if cached is not None:
+        return cached
+    async with semaphore:
+        from langchain_core.callbacks import UsageMetadataCallbackHandler
+        usage = UsageMetadataCallbackHandler()
+        telemetry.incr("llm_calls")
+        try:
+            with telemetry.span("llm.matcher", model=EVALUATOR_MODEL, candidates=len(agent_titles)):
+                response = await evaluator_client.ainvoke(get_matcher_chain(), {
+                    "ground_truth_title": gt_title,
+                    "candidate_titles": _format_titles(agent_titles)
+                }, config={"callbacks": [usage]})
+        except Exception as e:
+            telemetry.incr("llm_errors")
+            return _failed_match(gt_title, e)
+        record_llm_usage(usage.usage_metadata)
+    _store_match(verdict_cache, gt_title, agent_titles, response)
+    return response
+
+async def afind_batch_semantic_matches(gt_titles: list[str], agent_titles: list[str], semaphore: asyncio.Semaphore,
+                                       verdict_cache: VerdictCache | None = None) -> list[TitleMatch]:
+    """Matches several ground truth titles against the same candidates in a single LLM call."""
+    results = {t: _cached_match(verdict_cache, t, agent_titles) for t in gt_titles}
+    pending = [t for t in gt_titles if results[t] is None]
+    if not pending:
+        return [results[t] for t in gt_titles]
+
+    async with semaphore:
+        from langchain_core.callbacks import UsageMetadataCallbackHandler
+        usage = UsageMetadataCallbackHandler()
+        telemetry.incr("llm_calls")
+        try:
+            with telemetry.span("llm.batch_matcher", model=EVALUATOR_MODEL, titles=len(pending), candidates=len(agent_titles)):
+                response = await evaluator_client.ainvoke(get_batch_matcher_chain(), {
+                    "ground_truth_titles": _format_titles(pending),
+                    "candidate_titles": _format_titles(agent_titles)
+                }, config={"callbacks": [usage]})
+        except Exception as e:
+            telemetry.incr("llm_errors")
+            response = None
+            for t in pending:
+                results[t] = _failed_match(t, e)
+        record_llm_usage(usage.usage_metadata)
+
+    if response is not None:
+        by_title = {m.ground_truth_title: m for m in response.matches}
+        for idx, gt_title in enumerate(pending):
+            match = by_title.get(gt_title)
+            if match is None and len(response.matches) == len(pending):
+                match = response.matches[idx]  # Fall back to position if the title was not copied exactly.
+            if match is None:
+                results[gt_title] = TitleMatch(is_match=False, best_match=None, confidence=0.0, reasoning="No result returned for this title.")
+                continue
+            results[gt_title] = TitleMatch(is_match=match.is_match, best_match=match.best_match,
+                                           confidence=match.confidence, reasoning=match.reasoning)
+            _store_match(verdict_cache, gt_title, agent_titles, results[gt_title])
+    return [results[t] for t in gt_titles]
+
+def local_semantic_match(gt_title: str, index: TitleIndex) -> TitleMatch | None:
+    """Deterministic first tier: accepts a high-confidence, unambiguous fuzzy match without the LLM."""
+    match = index.best_match(gt_title)
+    if match is None:
+        return None
+    title, score = match
+    return TitleMatch(is_match=True, best_match=title, confidence=score, reasoning=f"Local normalized fuzzy match (score {score:.2f}).")
+
+def _is_confident(match_result: TitleMatch, available: dict) -> bool:
+    return (match_result.is_match and match_result.confidence >= MATCH_CONFIDENCE_THRESHOLD
+            and match_result.best_match in available)
+
+async def match_unit_lessons(gt_unit: dict, agent_unit: dict, semaphore: asyncio.Semaphore,
+                             batch_lessons: bool = False, verdict_cache: VerdictCache | None = None) -> list[tuple[dict, dict | None, TitleMatch, str]]:
+    """
+    Matches one unit's GT lessons to the agent's lessons, returning (gt_lesson, agent_lesson, match, tier)
+    tuples, where tier is "local" or "llm". Each agent lesson is matched at most once, in GT order,
+    so lessons within a unit stay sequential.
+    """
+    gt_lessons = gt_unit.get("lessons", [])
+    available_agent_lessons = {l.get("lesson_title", ""): l for l in agent_unit.get("lessons", [])}
+    lesson_index = TitleIndex(available_agent_lessons)
+
+    batch_results = {}
+    if batch_lessons:
+        # Only titles the local tier cannot resolve up front are sent in the single batched call.
+        pending = [l.get("lesson_title", "") for l in gt_lessons if local_semantic_match(l.get("lesson_title", ""), lesson_index) is None]
+        if pending:
+            batch_results = dict(zip(pending, await afind_batch_semantic_matches(pending, list(available_agent_lessons.keys()), semaphore, verdict_cache)))
+
+    results = []
+    for gt_lesson in gt_lessons:
+        gt_lesson_title = gt_lesson.get("lesson_title", "")
+        lesson_match_result, tier = local_semantic_match(gt_lesson_title, lesson_index), "local"
+        if lesson_match_result is None:
+            tier = "llm"
+            lesson_match_result = batch_results.get(gt_lesson_title)
+            if lesson_match_result is None:
+                lesson_match_result = await afind_best_semantic_match(gt_lesson_title, list(available_agent_lessons.keys()), semaphore, verdict_cache)
+
+        if not _is_confident(lesson_match_result, available_agent_lessons):
+            results.append((gt_lesson, None, lesson_match_result, tier))
+            continue
+        lesson_index.remove(lesson_match_result.best_match)
+        results.append((gt_lesson, available_agent_lessons.pop(lesson_match_result.best_match), lesson_match_result, tier))
+    return results
+
+async def aevaluate_with_llm(ground_truth_units: list, agent_units: list, concurrency: int = DEFAULT_CONCURRENCY,
+                             batch_lessons: bool = False, verdict_cache: VerdictCache | None = None) -> dict:
+    """
+    Performs a semantic evaluation of the agent's map against the ground truth.
+    Units are matched first; lesson matching for all matched units then runs concurrently.
+    """
     stats = {
         "gt_units_count": len(ground_truth_units),
         "agent_units_count": len(agent_units),
@@ -78,32 +274,43 @@ def evaluate_with_llm(ground_truth_units: list, agent_units: list):
         "gt_lessons_count": sum(len(u.get("lessons", [])) for u in ground_truth_units),
         "matched_lessons_count": 0,
         "page_errors": 0, "total_page_comparisons": 0,
+        "match_tiers": {"local": 0, "llm": 0},
+        "llm_failures": 0,
         "errors": []
     }
+    semaphore = asyncio.Semaphore(concurrency)
 
     # Create a list of available agent unit titles to match against.
     # We will remove titles as they are matched to prevent one agent unit matching multiple GT units.
     available_agent_units = {u.get("unit_title", ""): u for u in agent_units}
+    unit_index = TitleIndex(available_agent_units)
+    matched_units = []
 
     print("\n--- Evaluating Units ---")
     for gt_unit in ground_truth_units:
         gt_title = gt_unit.get("unit_title", "")
         print(f"Checking GT Unit: '{gt_title}'...")
 
-        # Use the LLM to find the best match from the available agent titles
-        match_result = find_best_semantic_match(gt_title, list(available_agent_units.keys()))
+        # Try the local fuzzy matcher first; only ambiguous titles go to the LLM
+        match_result, tier = local_semantic_match(gt_title, unit_index), "local"
+        if match_result is None:
+            tier = "llm"
+            match_result = await afind_best_semantic_match(gt_title, list(available_agent_units.keys()), semaphore, verdict_cache)
+        stats["match_tiers"][tier] += 1
+        stats["llm_failures"] += match_result.reasoning == LLM_FAILURE_REASONING
 
-        if not match_result.is_match or match_result.confidence < 0.8:
+        if not _is_confident(match_result, available_agent_units):
             stats["errors"].append(f"MISSING UNIT (Semantic): Could not find a confident match for GT Unit '{gt_title}'. Reason: {match_result.reasoning}")
             continue
         
         agent_unit_title = match_result.best_match
         agent_unit = available_agent_units.pop(agent_unit_title) # Find and remove the matched unit
+        unit_index.remove(agent_unit_title)
         stats["matched_units_count"] += 1
-        print(f"  ✅ Matched with Agent Unit: '{agent_unit_title}' (Confidence: {match_result.confidence:.2f})")
+        matched_units.append((gt_unit, agent_unit))
+        print(f"  ✅ Matched with Agent Unit: '{agent_unit_title}' (Confidence: {match_result.confidence:.2f}, {tier})")
 
         # Now that we have a semantic match, compare page numbers
-        # ... (page comparison logic is the same) ...
         stats["total_page_comparisons"] += 2
         if gt_unit.get("unit_start_page") != agent_unit.get("unit_start_page"):
             stats["page_errors"] += 1
@@ -112,19 +319,21 @@ def evaluate_with_llm(ground_truth_units: list, agent_units: list):
             stats["page_errors"] += 1
             stats["errors"].append(f"PAGE MISMATCH (Unit End): '{gt_title}' | GT: {gt_unit.get('unit_end_page')}, Agent: {agent_unit.get('unit_end_page')}")
 
-        # Evaluate lessons within the matched unit
-        available_agent_lessons = {l.get("lesson_title", ""): l for l in agent_unit.get("lessons", [])}
-        for gt_lesson in gt_unit.get("lessons", []):
-            gt_lesson_title = gt_lesson.get("lesson_title", "")
-            
-            lesson_match_result = find_best_semantic_match(gt_lesson_title, list(available_agent_lessons.keys()))
+    # Evaluate lessons within all matched units concurrently
+    print(f"\n--- Evaluating Lessons ({len(matched_units)} units, concurrency {concurrency}) ---")
+    lesson_results = await asyncio.gather(*(
+        match_unit_lessons(gt_unit, agent_unit, semaphore, batch_lessons, verdict_cache) for gt_unit, agent_unit in matched_units
+    ))
 
-            if not lesson_match_result.is_match or lesson_match_result.confidence < 0.8:
+    for (gt_unit, _), unit_lesson_results in zip(matched_units, lesson_results):
+        gt_title = gt_unit.get("unit_title", "")
+        for gt_lesson, agent_lesson, lesson_match_result, tier in unit_lesson_results:
+            gt_lesson_title = gt_lesson.get("lesson_title", "")
+            stats["match_tiers"][tier] += 1
+            stats["llm_failures"] += lesson_match_result.reasoning == LLM_FAILURE_REASONING
+            if agent_lesson is None:
                 stats["errors"].append(f"MISSING LESSON in Unit '{gt_title}': No match for '{gt_lesson_title}'. Reason: {lesson_match_result.reasoning}")
                 continue
-
-            agent_lesson_title = lesson_match_result.best_match
-            agent_lesson = available_agent_lessons.pop(agent_lesson_title)
             stats["matched_lessons_count"] += 1
 
             # Compare lesson page numbers
@@ -140,8 +349,29 @@ def evaluate_with_llm(ground_truth_units: list, agent_units: list):
     for extra_title in available_agent_units:
         stats["errors"].append(f"EXTRA UNIT: Unit '{extra_title}' was found by the agent but has no match in the ground truth.")
 
-    # Calculate final stats and print report
+    for tier, count in stats["match_tiers"].items():
+        telemetry.incr(f"matches_{tier}", count)
+    if verdict_cache is not None:
+        stats["verdict_cache"] = {"hits": verdict_cache.hits, "misses": verdict_cache.misses}
+        telemetry.incr("verdict_cache_hits", verdict_cache.hits)
+        telemetry.incr("verdict_cache_misses", verdict_cache.misses)
+    return stats
+
+def evaluate_with_llm(ground_truth_units: list, agent_units: list, concurrency: int = DEFAULT_CONCURRENCY,
+                      batch_lessons: bool = False, use_verdict_cache: bool = True):
+    """Runs the async evaluation to completion and prints the report."""
+    verdict_cache = None
+    if use_verdict_cache:
+        verdict_cache = VerdictCache(VERDICT_CACHE_PATH, EVALUATOR_MODEL, MATCHER_PROMPT_TEMPLATE + BATCH_MATCHER_PROMPT_TEMPLATE)
+    try:
+        with telemetry.span("evaluation", concurrency=concurrency, batch_lessons=batch_lessons):
+            stats = asyncio.run(aevaluate_with_llm(ground_truth_units, agent_units, concurrency, batch_lessons, verdict_cache))
+    finally:
+        if verdict_cache is not None:
+            verdict_cache.close()
     print_report(stats)
+    telemetry.write_prometheus(METRICS_TEXTFILE_PATH)
+    telemetry.print_summary()
 
 def print_report(stats: dict):
     # ... (This function is the same as the previous script, you can copy it here) ...
@@ -166,6 +396,26 @@ def print_report(stats: dict):
     print(f"  - Recall (semantically matched): {recall_l:.2f}% ({matched_l}/{gt_l})")
     print(f"  - Precision (no extra lessons):  {precision_l:.2f}% ({matched_l}/{agent_l})")
 
+    tiers = stats.get("match_tiers", {})
+    total_matches = sum(tiers.values())
+    print("\n[Matching Tiers]")
+    for tier, label in (("local", "Local fuzzy matcher"), ("llm", "LLM semantic matcher")):
+        count = tiers.get(tier, 0)
+        share = (count / total_matches * 100) if total_matches > 0 else 0
+        print(f"  - {label + ':':<22} {count} ({share:.1f}%)")
+
+    if "verdict_cache" in stats:
+        hits, misses = stats["verdict_cache"]["hits"], stats["verdict_cache"]["misses"]
+        hit_rate = (hits / (hits + misses) * 100) if hits + misses > 0 else 0
+        print("\n[Verdict Cache]")
+        print(f"  - Hits:     {hits}")
+        print(f"  - Misses:   {misses}")
+        print(f"  - Hit Rate: {hit_rate:.2f}%")
+
+    if stats.get("llm_failures"):
+        print(f"\n⚠️ {stats['llm_failures']} title(s) could not be judged because the LLM call failed after all retries;")
+        print("   they are reported as missing, so recall above is a lower bound. Re-run to evaluate them.")
+
     total_pages, page_errors = stats["total_page_comparisons"], stats["page_errors"]
     page_accuracy = ((total_pages - page_errors) / total_pages * 100) if total_pages > 0 else 0
     print("\n[Overall Page Number Accuracy]")
@@ -184,6 +434,9 @@ def main():
     parser = argparse.ArgumentParser(description="Evaluate an agent's structural map JSON against a ground truth file using an LLM for semantic title matching.")
     parser.add_argument("ground_truth_path", type=Path, help="Path to the ground truth JSON file.")
     parser.add_argument("agent_map_path", type=Path, help="Path to the agent's generated map JSON file.")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum number of evaluator LLM requests in flight.")
+    parser.add_argument("--batch-lessons", action="store_true", help="Match all of a unit's lessons in a single LLM call.")
+    parser.add_argument("--no-verdict-cache", action="store_true", help="Ignore memoized LLM verdicts from previous runs.")
     args = parser.parse_args()
 
     gt_data = load_json_file(args.ground_truth_path)
@@ -193,7 +446,8 @@ def main():
         print("\nEvaluation cannot proceed due to file loading errors.")
         return
 
-    evaluate_with_llm(gt_data, agent_data)
+    telemetry.configure(TELEMETRY_LOG_PATH)
+    evaluate_with_llm(gt_data, agent_data, args.concurrency, args.batch_lessons, not args.no_verdict_cache)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
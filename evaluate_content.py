@@ -0,0 +1,236 @@
+# evaluate_content.py
+
+import json
+import hashlib
+import operator
+import argparse
+from pathlib import Path
+from arabic_text import normalize_arabic
+from checkpoint import load_units
+from parser import parse_golden_markdown_file
+from telemetry import telemetry
+
+# --- Configuration ---
+# Length of the character shingles compared between golden and assembled text (normalized, spaces included).
+SHINGLE_SIZE = 5
+# Bins of the one-permutation MinHash signature; the estimate's standard error is about 1/sqrt(bins).
+SIGNATURE_BINS = 256
+# A golden section is aligned with an assembled one only if their shingle Jaccard similarity reaches this.
+MIN_MATCH_SIMILARITY = 0.2
+# Candidates whose estimated similarity is within this margin of the best one (or of the threshold) are
+# close calls, and are re-scored with the exact Jaccard similarity of their shingle sets.
+CLOSE_CALL_MARGIN = 0.1
+TELEMETRY_LOG_PATH = Path("output/telemetry.jsonl")
+
+_EMPTY_BIN = 1 << 64
+
+# --- Shingles and Signatures ---
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[str]:
+    """Character shingles of the normalized text, so extraction quirks (diacritics, lam-alef, spacing) do not count."""
+    normalized = normalize_arabic(text)
+    if not normalized:
+        return set()
+    if len(normalized) <= size:
+        return {normalized}
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+def minhash_signature(shingle_set: set[str], bins: int = SIGNATURE_BINS) -> list[int]:
+    """
+    A one-permutation MinHash signature: each shingle is hashed once, the hash picks a bin, and
+    every bin keeps its smallest value. Costs one hash per distinct shingle instead of one per
+    shingle and permutation. Empty bins (short sections) are filled from the next non-empty bin,
+    offset by the distance, so two signatures agree in a bin only where their sets share a minimum.
+    """
+    signature = [_EMPTY_BIN] * bins
+    for shingle in shingle_set:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        b = value % bins
+        if value < signature[b]:
+            signature[b] = value
+
+    occupied = [i for i, value in enumerate(signature) if value != _EMPTY_BIN]
+    if occupied and len(occupied) < bins:
+        dense, source = list(signature), occupied[0] + bins
+        for i in range(bins - 1, -1, -1):
+            if signature[i] != _EMPTY_BIN:
+                source = i
+            else:
+                dense[i] = signature[source % bins] + (source - i) * _EMPTY_BIN
+        signature = dense
+    return signature
+
+def estimate_similarity(signature_a: list[int], signature_b: list[int]) -> float:
+    """Estimated Jaccard similarity: the share of bins in which both signatures hold the same minimum."""
+    return sum(map(operator.eq, signature_a, signature_b)) / len(signature_a)
+
+def jaccard(a: set, b: set) -> float:
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+# --- Sections ---
+
+def golden_sections(golden: dict) -> list[dict]:
+    """
+    The golden book's lessons (the text of all their parts) and, per unit, the text of the parts
+    before its first lesson, in book order.
+    """
+    sections = []
+    for unit in golden.get("units", []):
+        unit_text = "\n".join(p.get("content", "") for p in unit.get("parts", []))
+        sections.append({"kind": "unit", "unit": unit["title"], "title": unit["title"], "text": unit_text})
+        for lesson in unit.get("lessons", []):
+            lesson_text = "\n".join(p.get("content", "") for p in lesson.get("parts", []))
+            sections.append({"kind": "lesson", "unit": unit["title"], "title": lesson["title"], "text": lesson_text})
+    return sections
+
+def assembled_sections(units: list[dict]) -> list[dict]:
+    """The same sections of an assembled output: lesson contents and each unit's text outside its lessons."""
+    sections = []
+    for unit in units:
+        unit_text = "\n".join(p.get("content", "") for p in unit.get("parts", []))
+        sections.append({"kind": "unit", "unit": unit["title"], "title": unit["title"], "text": unit_text})
+        for lesson in unit.get("lessons", []):
+            sections.append({"kind": "lesson", "unit": unit["title"], "title": lesson["title"], "text": lesson.get("content", "")})
+    return sections
+
+def _prepare(sections: list[dict]) -> list[dict]:
+    """Drops sections without text and replaces the text with its shingle set and signature."""
+    prepared = []
+    for section in sections:
+        shingle_set = shingles(section.pop("text"))
+        if shingle_set:
+            prepared.append({**section, "shingles": shingle_set, "signature": minhash_signature(shingle_set)})
+    return prepared
+
+# --- Evaluation ---
+
+def align_sections(golden: list[dict], assembled: list[dict]) -> tuple[dict[int, tuple[int, float]], int]:
+    """
+    Aligns golden and assembled sections one-to-one by content. Every pair is scored from the
+    signatures; close calls are re-scored exactly, and pairs are then assigned greedily, most similar
+    first. Returns {golden index: (assembled index, similarity)} and the number of exact re-scorings.
+    """
+    pairs, exact_checks = [], 0
+    for gi, g in enumerate(golden):
+        estimates = [(estimate_similarity(g["signature"], a["signature"]), ai) for ai, a in enumerate(assembled)]
+        if not estimates:
+            continue
+        best = max(estimates)[0]
+        floor = max(best - CLOSE_CALL_MARGIN, MIN_MATCH_SIMILARITY - CLOSE_CALL_MARGIN)
+        candidates = [(score, ai) for score, ai in estimates if score >= floor]
+        if len(candidates) > 1 or best < MIN_MATCH_SIMILARITY + CLOSE_CALL_MARGIN:
+            exact_checks += len(candidates)
+            candidates = [(jaccard(g["shingles"], assembled[ai]["shingles"]), ai) for _, ai in candidates]
+        pairs += [(score, gi, ai) for score, ai in candidates if score >= MIN_MATCH_SIMILARITY]
+
+    alignment, taken = {}, set()
+    for score, gi, ai in sorted(pairs, reverse=True):
+        if gi not in alignment and ai not in taken:
+            alignment[gi] = (ai, score)
+            taken.add(ai)
+    return alignment, exact_checks
+
+def evaluate_content(golden: dict, agent_units: list[dict]) -> dict:
+    """
+    Compares the assembled content against the golden book. Each golden section is aligned with the
+    assembled section whose text it shares the most shingles with; its recall is the share of its
+    shingles found in that section and its precision the share of the section's shingles that are
+    golden. Book-level recall and precision compare all shingles of both books.
+    """
+    with telemetry.span("content_evaluation") as span:
+        gold = _prepare(golden_sections(golden))
+        assembled = _prepare(assembled_sections(agent_units))
+        alignment, exact_checks = align_sections(gold, assembled)
+
+        results = []
+        for gi, g in enumerate(gold):
+            result = {"kind": g["kind"], "unit": g["unit"], "title": g["title"], "matched_title": None,
+                      "similarity": 0.0, "recall": 0.0, "precision": 0.0}
+            if gi in alignment:
+                ai, similarity = alignment[gi]
+                a = assembled[ai]
+                shared = len(g["shingles"] & a["shingles"])
+                result.update(matched_title=a["title"], similarity=round(similarity, 4),
+                              recall=round(shared / len(g["shingles"]), 4), precision=round(shared / len(a["shingles"]), 4))
+            results.append(result)
+
+        gold_all = set().union(*(g["shingles"] for g in gold))
+        assembled_all = set().union(*(a["shingles"] for a in assembled))
+        shared_all = len(gold_all & assembled_all)
+        matched = {ai for ai, _ in alignment.values()}
+        span.update(sections=len(gold), exact_checks=exact_checks)
+
+    telemetry.incr("content_sections_compared", len(gold))
+    telemetry.incr("content_exact_checks", exact_checks)
+    return {
+        "sections": results,
+        "golden_sections": len(gold),
+        "assembled_sections": len(assembled),
+        "aligned_sections": len(alignment),
+        "unaligned_assembled": [assembled[ai]["title"] for ai in range(len(assembled)) if ai not in matched],
+        "exact_checks": exact_checks,
+        "book_recall": round(shared_all / len(gold_all), 4) if gold_all else 0.0,
+        "book_precision": round(shared_all / len(assembled_all), 4) if assembled_all else 0.0,
+    }
+
+def print_content_report(stats: dict):
+    print("\n--- CONTENT EVALUATION REPORT ---")
+    lessons = [r for r in stats["sections"] if r["kind"] == "lesson"]
+    mean = lambda key: sum(r[key] for r in lessons) / len(lessons) * 100 if lessons else 0
+    print("\n[Book Level]")
+    print(f"  - Content Recall:    {stats['book_recall'] * 100:.2f}% of golden shingles were assembled")
+    print(f"  - Content Precision: {stats['book_precision'] * 100:.2f}% of assembled shingles are golden")
+    print("\n[Section Alignment]")
+    print(f"  - Golden Sections:    {stats['golden_sections']}")
+    print(f"  - Assembled Sections: {stats['assembled_sections']}")
+    print(f"  - Aligned:            {stats['aligned_sections']} ({stats['exact_checks']} close calls scored exactly)")
+    print("\n[Lesson Level]")
+    print(f"  - Mean Recall:    {mean('recall'):.2f}%")
+    print(f"  - Mean Precision: {mean('precision'):.2f}%")
+
+    print("\n[Per-Lesson Content]")
+    print(f"  {'recall':>8}{'precision':>11}  lesson -> assembled")
+    for r in lessons:
+        matched = r["matched_title"] if r["matched_title"] is not None else "(no match)"
+        flag = "  ⚠️" if r["recall"] < 0.9 or r["precision"] < 0.9 else ""
+        print(f"  {r['recall'] * 100:>7.1f}%{r['precision'] * 100:>10.1f}%  {r['title']} -> {matched}{flag}")
+    if stats["unaligned_assembled"]:
+        print("\n[Assembled Sections Without a Golden Counterpart]")
+        for title in stats["unaligned_assembled"]:
+            print(f"  - {title}")
+    print("\n--- END OF REPORT ---")
+
+def load_golden(golden_path: Path) -> dict:
+    """A golden book from its markdown, or from the JSON that `parser.parse_golden_markdown_to_json` produces."""
+    if golden_path.suffix == ".md":
+        return parse_golden_markdown_file(golden_path)
+    with open(golden_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate the assembled content of a book against its golden-standard text, without any LLM calls.")
+    parser.add_argument("golden_path", type=Path, help="Golden-standard markdown, or its parsed JSON.")
+    parser.add_argument("output_path", type=Path, help="Structured book output produced by main.py (JSON, NDJSON or packed store).")
+    parser.add_argument("--out", type=Path, help="Also write the per-section results to this JSON file.")
+    args = parser.parse_args()
+
+    for path in (args.golden_path, args.output_path):
+        if not path.exists():
+            print(f"❌ Error: File not found at '{path}'")
+            return
+    agent_units = load_units(args.output_path)
+    if not agent_units:
+        print(f"❌ Error: No units could be read from '{args.output_path}'")
+        return
+
+    telemetry.configure(TELEMETRY_LOG_PATH)
+    stats = evaluate_content(load_golden(args.golden_path), agent_units)
+    print_content_report(stats)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+        print(f"✅ Per-section results saved to: '{args.out}'")
+
+if __name__ == "__main__":
+    main()
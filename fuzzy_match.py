@@ -0,0 +1,89 @@
+# fuzzy_match.py
+
+import re
+from collections import Counter, defaultdict
+from arabic_text import normalize_arabic
+
+# --- Configuration ---
+NGRAM_SIZE = 3
+# A local match is accepted only if it is both strong and clearly better than the runner-up.
+ACCEPT_THRESHOLD = 0.9
+MIN_MARGIN = 0.1
+
+# The normalized text before the colon of a 'الوحدة الأولى:' / 'الدرس الثاني:' style label.
+HEADING_LABEL_PATTERN = re.compile(r"^(ال)?(وحده|درس)\b")
+
+def strip_heading_label(title: str) -> str:
+    """Drops a leading unit/lesson label, since agent maps often omit or reword it."""
+    label, sep, rest = title.partition(":")
+    if sep and rest.strip() and HEADING_LABEL_PATTERN.match(normalize_arabic(label)):
+        return rest.strip()
+    return title
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> set[str]:
+    """Character n-grams of a normalized string, padded so that word boundaries count."""
+    padded = f" {text} "
+    if len(padded) <= n:
+        return {padded}
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class TitleIndex:
+    """
+    An n-gram similarity index over candidate titles, scoring with the Dice coefficient on
+    normalized character trigrams. Each title is indexed both as-is and with its heading label
+    stripped, and the better of the two scores is used.
+    """
+
+    def __init__(self, titles=()):
+        self._grams = {}
+        self._postings = (defaultdict(set), defaultdict(set))
+        for title in titles:
+            self.add(title)
+
+    def _variants(self, title: str) -> tuple[set[str], set[str]]:
+        full = normalize_arabic(title)
+        stripped = normalize_arabic(strip_heading_label(title)) or full
+        return char_ngrams(full), char_ngrams(stripped)
+
+    def add(self, title: str):
+        if title in self._grams:
+            return
+        self._grams[title] = self._variants(title)
+        for postings, grams in zip(self._postings, self._grams[title]):
+            for gram in grams:
+                postings[gram].add(title)
+
+    def remove(self, title: str):
+        variants = self._grams.pop(title, None)
+        if variants is None:
+            return
+        for postings, grams in zip(self._postings, variants):
+            for gram in grams:
+                postings[gram].discard(title)
+
+    def __len__(self) -> int:
+        return len(self._grams)
+
+    def search(self, query: str, limit: int = 2) -> list[tuple[str, float]]:
+        """Returns up to `limit` (title, score) pairs, best first."""
+        scores = {}
+        for variant, (postings, query_grams) in enumerate(zip(self._postings, self._variants(query))):
+            shared = Counter()
+            for gram in query_grams:
+                for title in postings.get(gram, ()):
+                    shared[title] += 1
+            for title, count in shared.items():
+                score = 2 * count / (len(query_grams) + len(self._grams[title][variant]))
+                scores[title] = max(scores.get(title, 0.0), score)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+    def best_match(self, query: str, accept_threshold: float = ACCEPT_THRESHOLD,
+                   min_margin: float = MIN_MARGIN) -> tuple[str, float] | None:
+        """Returns the (title, score) of a high-confidence, unambiguous match, or None."""
+        results = self.search(query, limit=2)
+        if not results or results[0][1] < accept_threshold:
+            return None
+        if len(results) > 1 and results[0][1] - results[1][1] < min_margin:
+            return None
+        return results[0]
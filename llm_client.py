@@ -0,0 +1,349 @@
+# llm_client.py
+
+import time
+import random
+import asyncio
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from telemetry import telemetry
+
+# --- Defaults ---
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_BURST = 5
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_TIMEOUT_S = 120.0
+DEFAULT_BASE_BACKOFF_S = 1.0
+DEFAULT_MAX_BACKOFF_S = 60.0
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_TIMEOUT_S = 30.0
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server-side failures.
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Provider SDK errors that carry no status code but are transient (OpenAI, google-api-core, httpx).
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "ResourceExhausted", "ServiceUnavailable", "DeadlineExceeded", "TooManyRequests",
+    "ConnectError", "ReadTimeout", "RemoteProtocolError",
+}
+
+class LLMTimeoutError(TimeoutError):
+    """An attempt (or the whole call) ran past its deadline."""
+
+class CircuitOpenError(RuntimeError):
+    """The provider's circuit breaker is open, so the call was not attempted."""
+
+
+def _start_attempt(fn, *args) -> Future:
+    """
+    Runs a synchronous attempt on its own daemon thread, so it can be timed out and hedged. An
+    abandoned attempt finishes in the background, its result is discarded, and it never holds up
+    interpreter exit (as a pooled thread would).
+    """
+    future = Future()
+    def run():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=run, name="llm-attempt", daemon=True).start()
+    return future
+
+def _status_code(error: BaseException) -> int | None:
+    for value in (getattr(error, "status_code", None), getattr(error, "code", None),
+                  getattr(getattr(error, "response", None), "status_code", None)):
+        if isinstance(value, int):
+            return value
+    return None
+
+def _error_chain(error: BaseException):
+    """The error and its causes; langchain often wraps the SDK error that carries the status."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an LLM call that raised `error` is worth retrying."""
+    for e in _error_chain(error):
+        if isinstance(e, (TimeoutError, asyncio.TimeoutError, ConnectionError)):
+            return True
+        status = _status_code(e)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if type(e).__name__ in RETRYABLE_ERROR_NAMES:
+            return True
+    return False
+
+def retry_after_seconds(error: BaseException) -> float | None:
+    """The server's Retry-After hint, if the error's response carries one."""
+    for e in _error_chain(error):
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        try:
+            value = headers.get("retry-after") if headers is not None else None
+            if value is not None:
+                return float(value)
+        except (AttributeError, TypeError, ValueError):
+            continue
+    return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. `reserve` always takes a token, letting the balance go negative, and
+    returns how long the caller must wait before using it, so sync and async callers share one bucket.
+    """
+
+    def __init__(self, rate_per_s: float, burst: int):
+        self.rate_per_s = rate_per_s
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate_per_s)
+        self._updated = now
+
+    def reserve(self) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate_per_s)
+
+    def try_acquire(self) -> bool:
+        """Takes a token only if one is available right now (used for optional hedge requests)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive transient failures and rejects calls for
+    `reset_timeout_s`; then a single probe call is let through (half-open), and its outcome closes
+    the circuit or opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout_s: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout_s:
+                self.state, self._probe_in_flight = "half_open", False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state, self._failures, self._probe_in_flight = "closed", 0, False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    telemetry.incr("llm_circuit_opened")
+                self.state, self._opened_at, self._probe_in_flight = "open", time.monotonic(), False
+
+
+class LLMClient:
+    """
+    Runs calls to one provider/model under a shared rate limit, with per-attempt timeouts, an
+    overall deadline, exponential backoff with full jitter on transient errors and a circuit breaker.
+    With `hedge_after_s` set, an attempt still running after that long is raced against a second,
+    identical request (if the rate limit has a token to spare) and the first answer wins.
+
+    The client wraps any langchain runnable: `client.invoke(chain, inputs, config)` behaves like
+    `chain.invoke(inputs, config)`, and `ainvoke` likewise.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE, burst: int = DEFAULT_BURST,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS, timeout_s: float | None = DEFAULT_TIMEOUT_S,
+                 deadline_s: float | None = None, base_backoff_s: float = DEFAULT_BASE_BACKOFF_S,
+                 max_backoff_s: float = DEFAULT_MAX_BACKOFF_S, hedge_after_s: float | None = None,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_timeout_s: float = DEFAULT_RESET_TIMEOUT_S):
+        self.name = name
+        self.limiter = TokenBucket(requests_per_minute / 60, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout_s)
+        self.max_attempts = max_attempts
+        self.timeout_s = timeout_s
+        self.deadline_s = deadline_s
+        self.base_backoff_s = base_backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.hedge_after_s = hedge_after_s
+
+    # --- Shared Policy ---
+
+    def _check_circuit(self):
+        if not self.breaker.allow():
+            telemetry.incr("llm_circuit_rejections")
+            raise CircuitOpenError(f"Circuit breaker for '{self.name}' is open after repeated failures.")
+
+    def _attempt_timeout(self, deadline: float | None) -> float | None:
+        if deadline is None:
+            return self.timeout_s
+        remaining = max(0.0, deadline - time.monotonic())
+        return remaining if self.timeout_s is None else min(self.timeout_s, remaining)
+
+    def _next_delay(self, attempt: int, error: Exception, deadline: float | None) -> float | None:
+        """Backoff before the next attempt, or None if the error should be raised now."""
+        if not is_retryable(error) or attempt >= self.max_attempts:
+            return None
+        delay = random.uniform(0, min(self.max_backoff_s, self.base_backoff_s * 2 ** (attempt - 1)))
+        hint = retry_after_seconds(error)
+        if hint is not None:
+            delay = max(delay, min(hint, self.max_backoff_s))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        telemetry.incr("llm_retries")
+        print(f"  -- '{self.name}' call failed ({type(error).__name__}); retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s.")
+        return delay
+
+    def _record_outcome(self, error: Exception | None):
+        if error is None:
+            self.breaker.record_success()
+        elif is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            # The provider answered; a bad request or unparsable output says nothing about its health.
+            self.breaker.record_success()
+
+    def _overall_deadline(self) -> float | None:
+        return time.monotonic() + self.deadline_s if self.deadline_s else None
+
+    # --- Synchronous Calls ---
+
+    def _attempt(self, runnable, inputs, config, deadline: float | None):
+        wait_s = self.limiter.reserve()
+        if wait_s:
+            telemetry.incr("llm_rate_limited_s", wait_s)
+            time.sleep(wait_s)
+        timeout = self._attempt_timeout(deadline)
+        started = time.monotonic()
+        pending = {_start_attempt(runnable.invoke, inputs, config)}
+        hedged, last_error = self.hedge_after_s is None, None
+        while pending:
+            elapsed = time.monotonic() - started
+            waits = [] if timeout is None else [timeout - elapsed]
+            if not hedged:
+                waits.append(self.hedge_after_s - elapsed)
+            done, pending = wait(pending, timeout=max(0.0, min(waits)) if waits else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                last_error = future.exception()
+            elapsed = time.monotonic() - started
+            if pending and timeout is not None and elapsed >= timeout:
+                telemetry.incr("llm_timeouts")
+                raise LLMTimeoutError(f"'{self.name}' call timed out after {timeout:.1f}s.")
+            if pending and not hedged and elapsed >= self.hedge_after_s:
+                hedged = True
+                if self.limiter.try_acquire():
+                    telemetry.incr("llm_hedges")
+                    pending.add(_start_attempt(runnable.invoke, inputs, config))
+        raise last_error
+
+    def invoke(self, runnable, inputs, config=None):
+        """`runnable.invoke(inputs, config)` with rate limiting, timeouts, retries, hedging and the breaker."""
+        deadline = self._overall_deadline()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._check_circuit()
+            try:
+                result = self._attempt(runnable, inputs, config, deadline)
+            except Exception as e:
+                self._record_outcome(e)
+                delay = self._next_delay(attempt, e, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self._record_outcome(None)
+            return result
+
+    # --- Asynchronous Calls ---
+
+    async def _aattempt(self, runnable, inputs, config, deadline: float | None):
+        wait_s = self.limiter.reserve()
+        if wait_s:
+            telemetry.incr("llm_rate_limited_s", wait_s)
+            await asyncio.sleep(wait_s)
+        timeout = self._attempt_timeout(deadline)
+        started = time.monotonic()
+        pending = {asyncio.ensure_future(runnable.ainvoke(inputs, config))}
+        hedged, last_error = self.hedge_after_s is None, None
+        try:
+            while pending:
+                elapsed = time.monotonic() - started
+                waits = [] if timeout is None else [timeout - elapsed]
+                if not hedged:
+                    waits.append(self.hedge_after_s - elapsed)
+                done, pending = await asyncio.wait(pending, timeout=max(0.0, min(waits)) if waits else None,
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    last_error = task.exception()
+                elapsed = time.monotonic() - started
+                if pending and timeout is not None and elapsed >= timeout:
+                    telemetry.incr("llm_timeouts")
+                    raise LLMTimeoutError(f"'{self.name}' call timed out after {timeout:.1f}s.")
+                if pending and not hedged and elapsed >= self.hedge_after_s:
+                    hedged = True
+                    if self.limiter.try_acquire():
+                        telemetry.incr("llm_hedges")
+                        pending.add(asyncio.ensure_future(runnable.ainvoke(inputs, config)))
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def ainvoke(self, runnable, inputs, config=None):
+        """Async counterpart of `invoke`; losing hedges and timed-out attempts are cancelled."""
+        deadline = self._overall_deadline()
+        attempt = 0
+        while True:
+            attempt += 1
+            self._check_circuit()
+            try:
+                result = await self._aattempt(runnable, inputs, config, deadline)
+            except Exception as e:
+                self._record_outcome(e)
+                delay = self._next_delay(attempt, e, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self._record_outcome(None)
+            return result
+
+
+# One client per provider/model, so every caller of a model shares its rate limit and breaker.
+_clients: dict[tuple[str, str], LLMClient] = {}
+_clients_lock = threading.Lock()
+
+def get_llm_client(provider: str, model: str, **settings) -> LLMClient:
+    """Returns the process-wide client for `provider`/`model`, creating it with `settings` on first use."""
+    with _clients_lock:
+        client = _clients.get((provider, model))
+        if client is None:
+            client = _clients[(provider, model)] = LLMClient(f"{provider}/{model}", **settings)
+        return client
@@ -1,107 +1,379 @@
 import json
-import fitz  
+import time
+import fitz
+import argparse
+import contextvars
 from pathlib import Path
-from agents import generate_structure_map_from_pdf
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack, nullcontext
+from outline_mapper import generate_structure_map
+from agents import mapper_cache_key, remap_unit_from_pdf
+from map_validator import load_page_headings, repair_structure_map, print_validation_report
+from page_store import PageTextStore, DocumentPageSource, compute_file_hash
+from stream_writer import write_units_streaming, partial_path_for, NdjsonUnitWriter
+from content_store import PACK_SUFFIX, blob_path_for
+from search_index import build_search_index
+from chunker import DEFAULT_CHUNK_SIZE, DEFAULT_CHUNK_OVERLAP, chunks_path_for, iter_chunks
+from telemetry import telemetry
+from checkpoint import (IncrementalPageSource, collect_range_contents, hash_json, load_manifest, load_units,
+                        manifest_path_for, mark_phase_complete)
 
 # --- Configuration ---
 INPUT_DIR = Path("input")
 OUTPUT_DIR = Path("output")
 PDF_FILENAME = "book2.pdf"
 AGENT_MAP_FILENAME = "agent_map_pydantic.json"
+# Set to an existing structure map JSON (or pass --map) to skip Phase 1 and only re-assemble.
+EXISTING_MAP_PATH = None
 FINAL_JSON_FILENAME = "book2_structured_pydantic.json"
+# Extracted page text is cached here, keyed by PDF hash. Set to None to disable.
+PAGE_CACHE_DIR = OUTPUT_DIR / "page_cache"
+# Set to True to ignore cached Mapper Agent maps and query the LLM again.
+BYPASS_MAPPER_CACHE = False
+# Check a freshly generated map's ranges and snap boundaries to the pages that open with each title.
+VALIDATE_MAP = True
+# Ask the Mapper Agent again, for just that unit's pages, when a unit's ranges cannot be repaired locally.
+REQUERY_UNRESOLVED_RANGES = True
+# Worker processes for Phase 2 page extraction. None uses one per CPU; 1 keeps it serial.
+PAGE_EXTRACTION_WORKERS = None
+# While Phase 1 waits on the Mapper Agent, extract every page's text in the background: page text does
+# not depend on the map, so map validation and Phase 2 only read the ready text. Applies to the "json"
+# output format, which holds the whole book's text anyway; the streaming formats keep reading lazily.
+PIPELINE_PAGE_EXTRACTION = True
+# "json" builds the whole book in memory and writes it at the end. "json-stream" writes the same
+# JSON document unit by unit, and "ndjson" writes one unit per line (to a .ndjson file). "packed" writes
+# a small metadata index (.pack) plus one UTF-8 content blob (.blob) that readers memory-map and slice
+# (see content_store.py). All three stream pages straight from the PDF with bounded memory. While a
+# run is in progress, "json-stream" and "ndjson" output grows in `<output>.partial`, which can be
+# tailed; it is renamed to the output path once complete.
+OUTPUT_FORMAT = "json"
+# Split each assembled unit into overlapping, provenance-tagged chunks for RAG ingestion,
+# written to `<output stem>.chunks.jsonl`. Sizes are in "chars" or "tokens".
+WRITE_CHUNKS = True
+CHUNK_SIZE = DEFAULT_CHUNK_SIZE
+CHUNK_OVERLAP = DEFAULT_CHUNK_OVERLAP
+CHUNK_SIZE_UNIT = "chars"
+# Rebuild the full-text search index over every structured output after a run.
+BUILD_SEARCH_INDEX = True
+SEARCH_INDEX_DIR = OUTPUT_DIR / "search_index"
+# Checkpoint each phase in a manifest next to the output and re-extract only changed page ranges on re-runs.
+INCREMENTAL = True
+# Timed spans are appended here as JSON lines, and a Prometheus textfile snapshot is written at the end of a run.
+TELEMETRY_LOG_PATH = OUTPUT_DIR / "telemetry.jsonl"
+METRICS_TEXTFILE_PATH = OUTPUT_DIR / "metrics" / "datachunk.prom"
+# Derived rates shown in the end-of-run summary: label -> (counter, span).
+SUMMARY_RATES = {
+    "Phase 2 pages/sec": ("pages_assembled", "phase2.assembly"),
+    "Phase 2 characters/sec": ("characters_assembled", "phase2.assembly"),
+}
 
 # --- Helper Function for Text Extraction ---
-def extract_text_from_pages(pdf_doc, start_page: int, end_page: int) -> str:
+def extract_text_from_pages(page_store: PageTextStore, start_page: int, end_page: int) -> str:
     """Extracts text from a specified 1-based page range."""
-    text = ""
-    start_idx, end_idx = start_page - 1, end_page - 1
-    start_idx = max(0, start_idx)
-    end_idx = min(len(pdf_doc) - 1, end_idx)
-    for i in range(start_idx, end_idx + 1):
-        page = pdf_doc.load_page(i)
-        text += page.get_text("text") + "\n\n"
-    return text.strip()
-
-def main():
-    print(f"Starting the Pydantic-based PDF processing pipeline for: '{PDF_FILENAME}'")
-    OUTPUT_DIR.mkdir(exist_ok=True)
-    pdf_path = INPUT_DIR / PDF_FILENAME
-    agent_map_path = OUTPUT_DIR / AGENT_MAP_FILENAME
-    final_json_path = OUTPUT_DIR / FINAL_JSON_FILENAME
-
-    if not pdf_path.exists():
-        print(f"❌ Error: Input PDF file not found at '{pdf_path}'")
-        return
-
-    # --- Phase 1: Generate the Structure Map Directly from the PDF ---
-    structure_map = generate_structure_map_from_pdf(pdf_path)
-    if not structure_map:
-        print("Halting process due to failure in generating the structure map.")
-        return
-
-    with open(agent_map_path, 'w', encoding='utf-8') as f:
-        json.dump(structure_map, f, ensure_ascii=False, indent=2)
-    print(f"✅ Agent's validated structural map saved to: '{agent_map_path}'")
-    
-    # --- Phase 2: Programmatic Assembly using the Map and PDF ---
-    print("\n--> Starting programmatic content extraction and assembly...")
-    pdf_doc = fitz.open(pdf_path)
-    final_json = {"units": []}
+    return page_store.get_range_text(start_page, end_page)
 
+def iter_book_units(structure_map: list[dict], page_store: PageTextStore):
+    """Yields each assembled unit (intro, mapped units, afterword) as soon as it is complete."""
     if structure_map and structure_map[0].get("unit_start_page", 1) > 1:
         first_unit_start_page = structure_map[0]["unit_start_page"]
-        intro_content = extract_text_from_pages(pdf_doc, 1, first_unit_start_page - 1)
+        with telemetry.span("phase2.unit", title="المقدمة"):
+            intro_content = extract_text_from_pages(page_store, 1, first_unit_start_page - 1)
         intro_unit = {
             "title": "المقدمة", "start_page": 1, "end_page": first_unit_start_page - 1,
             "lessons": [], "parts": [{"title": "Introduction Content", "content": intro_content}]
         }
-        final_json["units"].append(intro_unit)
         print("✅ Programmatically extracted introduction.")
+        yield intro_unit
 
     for unit_data in structure_map:
-        unit_obj = {
-            "title": unit_data.get("unit_title"), "start_page": unit_data.get("unit_start_page"),
-            "end_page": unit_data.get("unit_end_page"), "lessons": [], "parts": []
-        }
-        last_processed_page = unit_obj["start_page"] - 1
-        for lesson_data in unit_data.get("lessons", []):
-            lesson_start = lesson_data.get("lesson_start_page")
-            lesson_end = lesson_data.get("lesson_end_page")
-            if lesson_start > last_processed_page + 1:
-                part_content = extract_text_from_pages(pdf_doc, last_processed_page + 1, lesson_start - 1)
-                unit_obj["parts"].append({"title": f"Unit Content (Pages {last_processed_page + 1}-{lesson_start - 1})", "content": part_content})
-            lesson_content = extract_text_from_pages(pdf_doc, lesson_start, lesson_end)
-            lesson_obj = {
-                "title": lesson_data.get("lesson_title"), "start_page": lesson_start,
-                "end_page": lesson_end, "content": lesson_content
+        with telemetry.span("phase2.unit", title=unit_data.get("unit_title"), lessons=len(unit_data.get("lessons", []))):
+            unit_obj = {
+                "title": unit_data.get("unit_title"), "start_page": unit_data.get("unit_start_page"),
+                "end_page": unit_data.get("unit_end_page"), "lessons": [], "parts": []
             }
-            unit_obj["lessons"].append(lesson_obj)
-            last_processed_page = lesson_end
-        if unit_obj["end_page"] > last_processed_page:
-            part_content = extract_text_from_pages(pdf_doc, last_processed_page + 1, unit_obj["end_page"])
-            unit_obj["parts"].append({"title": f"Unit Conclusion (Pages {last_processed_page + 1}-{unit_obj['end_page']})", "content": part_content})
-        final_json["units"].append(unit_obj)
+            last_processed_page = unit_obj["start_page"] - 1
+            for lesson_data in unit_data.get("lessons", []):
+                lesson_start = lesson_data.get("lesson_start_page")
+                lesson_end = lesson_data.get("lesson_end_page")
+                if lesson_start > last_processed_page + 1:
+                    part_content = extract_text_from_pages(page_store, last_processed_page + 1, lesson_start - 1)
+                    unit_obj["parts"].append({"title": f"Unit Content (Pages {last_processed_page + 1}-{lesson_start - 1})", "content": part_content})
+                lesson_content = extract_text_from_pages(page_store, lesson_start, lesson_end)
+                lesson_obj = {
+                    "title": lesson_data.get("lesson_title"), "start_page": lesson_start,
+                    "end_page": lesson_end, "content": lesson_content
+                }
+                unit_obj["lessons"].append(lesson_obj)
+                last_processed_page = lesson_end
+            if unit_obj["end_page"] > last_processed_page:
+                part_content = extract_text_from_pages(page_store, last_processed_page + 1, unit_obj["end_page"])
+                unit_obj["parts"].append({"title": f"Unit Conclusion (Pages {last_processed_page + 1}-{unit_obj['end_page']})", "content": part_content})
         print(f"✅ Processed Unit: {unit_obj['title']}")
+        yield unit_obj
 
     if structure_map:
         last_mapped_page = structure_map[-1].get("unit_end_page")
-        total_pages = len(pdf_doc)
+        total_pages = len(page_store)
         if last_mapped_page and total_pages > last_mapped_page:
             start_page_after = last_mapped_page + 1
-            afterword_content = extract_text_from_pages(pdf_doc, start_page_after, total_pages)
+            with telemetry.span("phase2.unit", title="ملحق / خاتمة"):
+                afterword_content = extract_text_from_pages(page_store, start_page_after, total_pages)
             afterword_unit = {
                 "title": "ملحق / خاتمة", "start_page": start_page_after, "end_page": total_pages,
                 "lessons": [], "parts": [{"title": "Afterword Content", "content": afterword_content}]
             }
-            final_json["units"].append(afterword_unit)
             print("✅ Programmatically extracted afterword/appendix.")
-    
-    pdf_doc.close()
+            yield afterword_unit
+
+def unit_characters(unit: dict) -> int:
+    """Characters of extracted text in a unit's lessons and parts."""
+    return sum(len(section.get("content", "")) for section in unit["lessons"] + unit["parts"])
+
+def navigation_entry(unit: dict) -> dict:
+    """A unit's titles and page ranges without any content, for the navigation sidecar."""
+    return {
+        "title": unit["title"], "start_page": unit["start_page"], "end_page": unit["end_page"],
+        "lessons": [{"title": l["title"], "start_page": l["start_page"], "end_page": l["end_page"]} for l in unit["lessons"]]
+    }
+
+def nav_path_for(final_json_path: Path) -> Path:
+    return final_json_path.with_name(f"{final_json_path.stem}.nav.json")
+
+def write_navigation_sidecar(nav_units: list[dict], final_json_path: Path) -> Path:
+    """Writes the lightweight `.nav.json` sidecar the Streamlit navigator loads instead of the full book."""
+    nav_path = nav_path_for(final_json_path)
+    with open(nav_path, 'w', encoding='utf-8') as f:
+        json.dump({"units": nav_units}, f, ensure_ascii=False, indent=2)
+    return nav_path
+
+# --- Speculative Page Extraction ---
+
+def start_page_prefetch(pdf_path: Path, extraction_workers: int | None) -> Future:
+    """
+    Starts building the book's PageTextStore on a background thread, returning its future. The
+    extraction cannot be interrupted once it has started: if the book is abandoned, it runs to
+    completion in the background (still filling the page cache) and its result is ignored.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="page-prefetch")
+    # Run in a copy of the current context so the extraction span is parented to this book's span.
+    future = executor.submit(contextvars.copy_context().run, PageTextStore.from_pdf, pdf_path,
+                             cache_dir=PAGE_CACHE_DIR, workers=extraction_workers)
+    executor.shutdown(wait=False)
+    return future
+
+def wait_for_prefetch(prefetch: Future) -> PageTextStore:
+    """The prefetched store; time spent waiting for it is what the overlap with Phase 1 did not hide."""
+    started = time.perf_counter()
+    store = prefetch.result()
+    telemetry.incr("page_prefetch_wait_s", time.perf_counter() - started)
+    return store
+
+def run_assembly(structure_map: list[dict], pdf_path: Path, final_json_path: Path, manifest: dict | None,
+                 extraction_workers: int | None, output_format: str, prefetch: Future | None = None) -> dict:
+    """
+    Phase 2. With a manifest from a previous run of the same PDF, ranges whose boundaries and content
+    are unchanged are reused from the previous output and only the rest are extracted from the PDF.
+    Returns the content hash of every range served and the page start offsets of every range chunked,
+    for the next manifest. If `prefetch` holds a PageTextStore being built by `start_page_prefetch`,
+    ranges are sliced from it instead.
+
+    With WRITE_CHUNKS, each unit is also chunked as it streams past, so chunking never needs the
+    whole book in memory.
+    """
+    streaming = output_format in ("json-stream", "ndjson", "packed")
+    with ExitStack() as stack, fitz.open(pdf_path) as pdf_doc:
+        if streaming:
+            source_factory = lambda: DocumentPageSource(pdf_doc)
+        elif prefetch is not None:
+            source_factory = lambda: wait_for_prefetch(prefetch)
+        else:
+            source_factory = lambda: PageTextStore.from_pdf(pdf_path, cache_dir=PAGE_CACHE_DIR, workers=extraction_workers)
+
+        previous_hashes = (manifest or {}).get("ranges", {})
+        previous_contents = collect_range_contents(load_units(final_json_path)) if previous_hashes else {}
+        page_source = IncrementalPageSource(previous_contents, previous_hashes, source_factory, len(pdf_doc),
+                                            (manifest or {}).get("page_offsets", {}))
+
+        nav_units = []
+        chunk_writer = stack.enter_context(NdjsonUnitWriter(chunks_path_for(final_json_path))) if WRITE_CHUNKS else None
+        def tracked_units():
+            for unit in iter_book_units(structure_map, page_source):
+                nav_units.append(navigation_entry(unit))
+                telemetry.incr("units_assembled")
+                telemetry.incr("characters_assembled", unit_characters(unit))
+                if chunk_writer:
+                    for chunk in iter_chunks(final_json_path.stem, [unit], page_source, CHUNK_SIZE, CHUNK_OVERLAP,
+                                             CHUNK_SIZE_UNIT, first_index=chunk_writer.count):
+                        chunk_writer.write(chunk)
+                yield unit
 
-    with open(final_json_path, 'w', encoding='utf-8') as f:
-        json.dump(final_json, f, ensure_ascii=False, indent=2)
+        if streaming:
+            if output_format != "packed":
+                print(f"--> Streaming units to '{partial_path_for(final_json_path)}' (tail it to follow the run); "
+                      f"it becomes '{final_json_path}' once complete.")
+            write_units_streaming(tracked_units(), final_json_path, output_format)
+        else:
+            final_json = {"units": list(tracked_units())}
+            with open(final_json_path, 'w', encoding='utf-8') as f:
+                json.dump(final_json, f, ensure_ascii=False, indent=2)
+
+    nav_path = write_navigation_sidecar(nav_units, final_json_path)
+    print(f"✅ Navigation sidecar saved to: '{nav_path}'")
+    if chunk_writer:
+        telemetry.incr("chunks_written", chunk_writer.count)
+        print(f"✅ {chunk_writer.count} chunks saved to: '{chunks_path_for(final_json_path)}'")
+    telemetry.incr("pages_assembled", len(page_source))
+    telemetry.incr("output_bytes", final_json_path.stat().st_size)
+    if output_format == "packed":
+        telemetry.incr("output_bytes", blob_path_for(final_json_path).stat().st_size)
+    telemetry.incr("ranges_reused", page_source.reused)
+    telemetry.incr("ranges_extracted", page_source.extracted)
+
+    if previous_hashes:
+        print(f"✅ Reused {page_source.reused} unchanged page ranges; extracted {page_source.extracted} changed ones.")
+    return {"ranges": page_source.ranges, "page_offsets": page_source.page_offsets}
+
+def validate_structure_map_against_pdf(structure_map: list[dict], pdf_path: Path, llm_semaphore=None,
+                                       page_source=None) -> list[dict]:
+    """
+    Validation stage between the phases: returns the map with its boundaries repaired from the page
+    text, read from `page_source` if given and otherwise from the PDF.
+    """
+    requery = None
+    if REQUERY_UNRESOLVED_RANGES:
+        def requery(unit, first_page, last_page):
+            with llm_semaphore or nullcontext():
+                return remap_unit_from_pdf(pdf_path, unit, first_page, last_page)
+
+    with telemetry.span("phase1.validate", book=pdf_path.name) as span:
+        repaired, report = repair_structure_map(structure_map, load_page_headings(pdf_path, page_source), requery)
+        span["snapped"] = len(report["snapped"])
+        span["requeried"] = len(report["requeried"])
+    print_validation_report(report)
+    return repaired
+
+def process_book(pdf_path: Path, agent_map_path: Path, final_json_path: Path, llm_semaphore=None,
+                 extraction_workers: int | None = PAGE_EXTRACTION_WORKERS,
+                 bypass_mapper_cache: bool = BYPASS_MAPPER_CACHE, output_format: str = OUTPUT_FORMAT,
+                 incremental: bool = INCREMENTAL, existing_map_path: Path | None = None) -> bool:
+    """
+    Runs both phases for a single PDF. With `existing_map_path`, Phase 1 is skipped and that map is
+    assembled as-is, so no LLM client is ever built. If `llm_semaphore` is given, the Mapper Agent call is made
+    while holding it, capping how many books query the LLM at once. Returns True on success.
+
+    With `incremental`, each completed phase is checkpointed in a manifest next to the output. A re-run
+    reuses the saved (possibly hand-corrected) map instead of repeating Phase 1, as long as the Mapper
+    Agent's prompt, model and schema are unchanged and `bypass_mapper_cache` is not set; it skips Phase 2
+    when the map is unchanged, and otherwise re-extracts only the page ranges whose boundaries moved.
+
+    With PIPELINE_PAGE_EXTRACTION, a map that has to be generated is generated while the page text is
+    extracted in the background, so the run takes about as long as the slower of the two instead of both.
+    If no map can be generated, the background extraction is cancelled, or left to finish unused.
+    """
+    if not pdf_path.exists():
+        print(f"❌ Error: Input PDF file not found at '{pdf_path}'")
+        return False
+
+    if output_format == "ndjson":
+        final_json_path = final_json_path.with_suffix(".ndjson")
+    elif output_format == "packed":
+        final_json_path = final_json_path.with_suffix(PACK_SUFFIX)
+    manifest_path = manifest_path_for(final_json_path)
+    manifest = load_manifest(manifest_path, compute_file_hash(pdf_path)) if incremental else None
+
+    # --- Phase 1: Generate the Structure Map from the PDF Outline or the Mapper Agent ---
+    prefetch = None
+    mapper_key = mapper_cache_key(pdf_path) if manifest is not None else None
+    map_phase = manifest["phases"].get("map", {}) if manifest else {}
+    with telemetry.span("phase1.map", book=pdf_path.name) as span:
+        if existing_map_path is not None:
+            with open(existing_map_path, 'r', encoding='utf-8') as f:
+                structure_map = json.load(f)
+            span["source"] = "map_file"
+            print(f"✅ Skipping Phase 1: using the structure map at '{existing_map_path}'")
+        elif map_phase and not bypass_mapper_cache and map_phase.get("mapper_key") == mapper_key and agent_map_path.exists():
+            with open(agent_map_path, 'r', encoding='utf-8') as f:
+                structure_map = json.load(f)
+            span["source"] = "checkpoint"
+            print(f"✅ Resuming from checkpoint: reusing the structure map at '{agent_map_path}'")
+        else:
+            if PIPELINE_PAGE_EXTRACTION and output_format == "json":
+                prefetch = start_page_prefetch(pdf_path, extraction_workers)
+            structure_map = generate_structure_map(pdf_path, bypass_cache=bypass_mapper_cache, llm_semaphore=llm_semaphore)
+            if not structure_map:
+                if prefetch is not None:
+                    # Drops the extraction if it has not started yet; a running one finishes unused.
+                    prefetch.cancel()
+                span["error"] = "No structure map"
+                print("Halting process due to failure in generating the structure map.")
+                return False
+            if VALIDATE_MAP:
+                page_source = wait_for_prefetch(prefetch) if prefetch is not None else None
+                structure_map = validate_structure_map_against_pdf(structure_map, pdf_path, llm_semaphore, page_source)
+
+            with open(agent_map_path, 'w', encoding='utf-8') as f:
+                json.dump(structure_map, f, ensure_ascii=False, indent=2)
+            print(f"✅ Agent's validated structural map saved to: '{agent_map_path}'")
+            if manifest is not None:
+                mark_phase_complete(manifest_path, manifest, "map", mapper_key=mapper_key)
+        span["units"] = len(structure_map)
+
+    # --- Phase 2: Programmatic Assembly using the Map and PDF ---
+    map_hash = hash_json(structure_map)
+    assembly = (manifest or {}).get("phases", {}).get("assembly", {})
+    # Outputs from before the chunk file or navigation sidecar existed are re-assembled to produce them.
+    sidecars_current = nav_path_for(final_json_path).exists() and (not WRITE_CHUNKS or chunks_path_for(final_json_path).exists())
+    if assembly.get("map_hash") == map_hash and assembly.get("output_format") == output_format and final_json_path.exists() and sidecars_current:
+        print(f"\n✅✅✅ Structure map unchanged since the last run; '{final_json_path}' is up to date.")
+        return True
+
+    print("\n--> Starting programmatic content extraction and assembly...")
+    with telemetry.span("phase2.assembly", book=pdf_path.name, output_format=output_format):
+        served = run_assembly(structure_map, pdf_path, final_json_path, manifest, extraction_workers, output_format, prefetch)
+    if manifest is not None:
+        manifest.update(served)
+        mark_phase_complete(manifest_path, manifest, "assembly", map_hash=map_hash, output_format=output_format)
 
     print(f"\n✅✅✅ Pipeline complete! Final structured JSON is available at: '{final_json_path}'")
+    return True
+
+def build_output_search_index(output_dir: Path = OUTPUT_DIR, index_dir: Path = SEARCH_INDEX_DIR):
+    """
+    Post-processing stage: indexes every structured output in `output_dir` for full-text search. A book
+    written in more than one output format is indexed once, from its most recently written output.
+    """
+    latest = {}
+    for suffix in (".json", ".ndjson", PACK_SUFFIX):
+        for path in output_dir.glob(f"*_structured_pydantic{suffix}"):
+            if path.stem not in latest or path.stat().st_mtime > latest[path.stem].stat().st_mtime:
+                latest[path.stem] = path
+    json_paths = [latest[stem] for stem in sorted(latest)]
+    if not json_paths:
+        return
+    doc_count = build_search_index(json_paths, index_dir)
+    print(f"✅ Search index rebuilt over {len(json_paths)} books ({doc_count} lessons/parts) at: '{index_dir}'")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the structure-mapping and assembly pipeline on the configured PDF.")
+    parser.add_argument("--map", type=Path, dest="map_path", default=EXISTING_MAP_PATH,
+                        help="Skip Phase 1 and assemble from this structure map JSON (e.g. output/agent_map_pydantic.json).")
+    args = parser.parse_args()
+    if args.map_path is not None and not args.map_path.exists():
+        print(f"❌ Error: Structure map not found at '{args.map_path}'")
+        return
+
+    print(f"Starting the Pydantic-based PDF processing pipeline for: '{PDF_FILENAME}'")
+    OUTPUT_DIR.mkdir(exist_ok=True)
+    telemetry.configure(TELEMETRY_LOG_PATH)
+    with telemetry.span("book", book=PDF_FILENAME):
+        ok = process_book(INPUT_DIR / PDF_FILENAME, OUTPUT_DIR / AGENT_MAP_FILENAME, OUTPUT_DIR / FINAL_JSON_FILENAME,
+                          existing_map_path=args.map_path)
+    if ok and BUILD_SEARCH_INDEX:
+        with telemetry.span("search_index"):
+            build_output_search_index()
+    telemetry.write_prometheus(METRICS_TEXTFILE_PATH)
+    telemetry.print_summary(SUMMARY_RATES)
+    print(f"✅ Metrics snapshot saved to: '{METRICS_TEXTFILE_PATH}'")
 
 
 if __name__ == '__main__':
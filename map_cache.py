@@ -0,0 +1,98 @@
+# map_cache.py
+
+import os
+import json
+import time
+import hashlib
+from pathlib import Path
+
+# --- Configuration ---
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_AGE_DAYS = 30
+
+def make_cache_key(*parts: str) -> str:
+    """Builds a content address from the given parts (e.g. PDF hash, prompt, model, schema)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        encoded = part.encode("utf-8")
+        # Length-prefix each part so that ("ab", "c") and ("a", "bc") hash differently.
+        digest.update(len(encoded).to_bytes(8, "big"))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    A content-addressed on-disk cache of validated LLM responses, one JSON file per key.
+
+    Entries stored more than `max_age_days` ago are treated as misses and evicted, however often
+    they are read. When the cache grows past `max_entries` or `max_bytes`, the least recently used
+    entries are evicted first. An entry file's modification time is when it was stored and its
+    access time when it was last used (every hit sets it), so eviction only needs to stat the files.
+    """
+
+    def __init__(self, cache_dir: Path, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_age_days: float = DEFAULT_MAX_AGE_DAYS):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_days * 24 * 60 * 60
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> dict | list | None:
+        """Returns the cached payload for `key`, or None on a miss or an expired entry."""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry.get("created_at", 0) > self.max_age_seconds:
+            path.unlink(missing_ok=True)
+            return None
+        try:
+            # Mark the entry as recently used, keeping its modification time (when it was stored).
+            os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+        except OSError:
+            # Another process evicted it after it was read; the payload is still good.
+            pass
+        return entry.get("payload")
+
+    def put(self, key: str, payload: dict | list):
+        """Stores `payload` under `key` atomically, then enforces the size limits."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"created_at": time.time(), "payload": payload}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Removes expired entries, then the least recently used ones until within limits."""
+        now = time.time()
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if now - stat.st_mtime > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total_bytes -= size
+
+    def clear(self):
+        """Deletes every entry in the cache."""
+        for path in self.cache_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
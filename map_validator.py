@@ -0,0 +1,242 @@
+# map_validator.py
+
+import json
+import argparse
+import fitz
+from pathlib import Path
+from arabic_text import normalize_arabic
+from fuzzy_match import char_ngrams, strip_heading_label
+from payload_builder import HEADING_SCAN_LINES, TOC_PATTERN
+from telemetry import telemetry
+
+# --- Configuration ---
+# A boundary is only moved to a page within this many pages of where the map put it.
+MAX_SNAP_DISTANCE = 3
+# Minimum trigram similarity between a title and one of a page's leading lines to count as its heading.
+HEADING_MATCH_THRESHOLD = 0.75
+# Extra pages sent on each side of a unit's range when the Mapper Agent is asked to map it again.
+REQUERY_PAGE_MARGIN = 2
+
+# --- Page Headings ---
+
+def _page_heading(page_text: str) -> list[str] | None:
+    lines = [line.strip() for line in page_text.splitlines() if line.strip()][:HEADING_SCAN_LINES]
+    if any(TOC_PATTERN.search(line) for line in lines):
+        return None
+    return [normalize_arabic(line) for line in lines]
+
+def load_page_headings(pdf_path: Path, page_source=None) -> list[list[str] | None]:
+    """
+    The normalized leading lines of every page (index 0 is page 1). Table-of-contents pages list
+    every title, so they are stored as None and never match a heading. With a `page_source` (e.g. a
+    PageTextStore already extracted for Phase 2), its text is used instead of reading the PDF again.
+    """
+    if page_source is not None:
+        return [_page_heading(page_source.page_text(n)) for n in range(1, len(page_source) + 1)]
+    with fitz.open(pdf_path) as pdf_doc:
+        return [_page_heading(page.get_text("text")) for page in pdf_doc]
+
+def heading_score(title: str, page_lines: list[str] | None) -> float:
+    """How well `title` (with or without its unit/lesson label) matches one of a page's leading lines."""
+    if not page_lines:
+        return 0.0
+    variants = {normalize_arabic(title), normalize_arabic(strip_heading_label(title))} - {""}
+    best = 0.0
+    for line in page_lines:
+        line_grams = char_ngrams(line)
+        for variant in variants:
+            if variant == line or (len(variant.split()) > 1 and variant in line):
+                return 1.0
+            variant_grams = char_ngrams(variant)
+            best = max(best, 2 * len(line_grams & variant_grams) / (len(line_grams) + len(variant_grams)))
+    return best
+
+def locate_heading(title: str, claimed_page: int, headings: list, low: int, high: int) -> int | None:
+    """The page nearest `claimed_page` (within MAX_SNAP_DISTANCE and [low, high]) that opens with `title`."""
+    for distance in range(MAX_SNAP_DISTANCE + 1):
+        for page in sorted({claimed_page - distance, claimed_page + distance}):
+            if low <= page <= high and heading_score(title, headings[page - 1]) >= HEADING_MATCH_THRESHOLD:
+                return page
+    return None
+
+# --- Validation ---
+
+def _issue(unit_idx: int, severity: str, message: str) -> dict:
+    return {"unit": unit_idx, "severity": severity, "message": message}
+
+def validate_structure_map(structure_map: list[dict], page_count: int) -> list[dict]:
+    """
+    Checks page ranges for inversions, pages outside the book, unit order and overlaps, and lessons
+    out of order, overlapping or outside their unit (errors), plus gaps between consecutive units or
+    lessons (warnings). Each issue names the index of the unit it belongs to.
+    """
+    issues = []
+    previous_unit = None
+    for ui, unit in enumerate(structure_map):
+        title, start, end = unit.get("unit_title"), unit.get("unit_start_page"), unit.get("unit_end_page")
+        if start > end:
+            issues.append(_issue(ui, "error", f"Unit '{title}' ends before it starts ({start}-{end})."))
+        if start < 1 or end > page_count:
+            issues.append(_issue(ui, "error", f"Unit '{title}' ({start}-{end}) lies outside the book's {page_count} pages."))
+        if previous_unit is not None:
+            previous_end = previous_unit["unit_end_page"]
+            if start <= previous_unit["unit_start_page"]:
+                issues.append(_issue(ui, "error", f"Unit '{title}' starts at or before the previous unit (page {start})."))
+            elif start <= previous_end:
+                issues.append(_issue(ui, "error", f"Unit '{title}' starts on page {start}, inside the previous unit (ends {previous_end})."))
+            elif start > previous_end + 1:
+                issues.append(_issue(ui, "warning", f"Pages {previous_end + 1}-{start - 1} fall between units (before '{title}')."))
+        previous_unit = unit
+
+        previous_lesson = None
+        for lesson in unit.get("lessons", []):
+            l_title, l_start, l_end = lesson.get("lesson_title"), lesson.get("lesson_start_page"), lesson.get("lesson_end_page")
+            if l_start > l_end:
+                issues.append(_issue(ui, "error", f"Lesson '{l_title}' ends before it starts ({l_start}-{l_end})."))
+            if l_start < start or l_end > end:
+                issues.append(_issue(ui, "error", f"Lesson '{l_title}' ({l_start}-{l_end}) lies outside its unit ({start}-{end})."))
+            if previous_lesson is not None:
+                previous_end = previous_lesson["lesson_end_page"]
+                if l_start <= previous_lesson["lesson_start_page"]:
+                    issues.append(_issue(ui, "error", f"Lesson '{l_title}' starts at or before the previous lesson (page {l_start})."))
+                elif l_start <= previous_end:
+                    issues.append(_issue(ui, "error", f"Lesson '{l_title}' starts on page {l_start}, inside the previous lesson (ends {previous_end})."))
+                elif l_start > previous_end + 1:
+                    issues.append(_issue(ui, "warning", f"Pages {previous_end + 1}-{l_start - 1} fall between lessons (before '{l_title}')."))
+            previous_lesson = lesson
+    return issues
+
+# --- Repair ---
+
+def _snap_starts(units: list[dict], headings: list, snapped: list, unlocated: list):
+    """Moves each unit and lesson start to the nearest page that opens with its title."""
+    page_count = len(headings)
+    for ui, unit in enumerate(units):
+        low = units[ui - 1]["unit_start_page"] + 1 if ui else 1
+        page = locate_heading(unit["unit_title"], unit["unit_start_page"], headings, low, page_count)
+        if page is None:
+            unlocated.append(unit["unit_title"])
+        elif page != unit["unit_start_page"]:
+            snapped.append({"title": unit["unit_title"], "from": unit["unit_start_page"], "to": page})
+            unit["unit_start_page"] = page
+
+        lessons = unit.get("lessons", [])
+        for li, lesson in enumerate(lessons):
+            low = lessons[li - 1]["lesson_start_page"] + 1 if li else unit["unit_start_page"]
+            page = locate_heading(lesson["lesson_title"], lesson["lesson_start_page"], headings, low, page_count)
+            if page is None:
+                unlocated.append(lesson["lesson_title"])
+            elif page != lesson["lesson_start_page"]:
+                snapped.append({"title": lesson["lesson_title"], "from": lesson["lesson_start_page"], "to": page})
+                lesson["lesson_start_page"] = page
+
+def _closed_end(end: int, old_next_start: int, next_start: int) -> int:
+    """
+    An end page after the next start may have been snapped: an end that met the next start keeps
+    meeting it, one that overlaps it is cut back, and one before a gap is left alone.
+    """
+    if end == old_next_start - 1:
+        return next_start - 1
+    return min(end, next_start - 1)
+
+def _close_ranges(units: list[dict], original: list[dict], page_count: int):
+    """
+    Re-derives end pages from the (snapped) starts, compared with the `original` map: ends follow a
+    snapped start they met and overlaps are removed, while gaps between ranges (front matter, blank
+    separator pages) are kept, since they are not errors. A last lesson that ended with its unit
+    keeps doing so; otherwise it is only clamped to the unit.
+    """
+    for ui, unit in enumerate(units):
+        old_unit_end = unit["unit_end_page"]
+        if ui + 1 < len(units):
+            unit["unit_end_page"] = _closed_end(old_unit_end, original[ui + 1]["unit_start_page"], units[ui + 1]["unit_start_page"])
+        unit["unit_end_page"] = max(unit["unit_start_page"], min(unit["unit_end_page"], page_count))
+
+        lessons = unit.get("lessons", [])
+        original_lessons = original[ui].get("lessons", [])
+        for li, lesson in enumerate(lessons):
+            if li + 1 < len(lessons):
+                lesson["lesson_end_page"] = _closed_end(lesson["lesson_end_page"], original_lessons[li + 1]["lesson_start_page"],
+                                                        lessons[li + 1]["lesson_start_page"])
+            elif lesson["lesson_end_page"] >= old_unit_end or lesson["lesson_end_page"] < lesson["lesson_start_page"]:
+                lesson["lesson_end_page"] = unit["unit_end_page"]
+            lesson["lesson_end_page"] = max(lesson["lesson_start_page"], min(lesson["lesson_end_page"], unit["unit_end_page"]))
+
+def repair_structure_map(structure_map: list[dict], headings: list, requery=None) -> tuple[list[dict], dict]:
+    """
+    Validates the map, snaps every start to the page that actually opens with its title, re-derives
+    end pages (keeping any gaps between ranges), and validates again. Units that still have errors are passed to `requery(unit,
+    first_page, last_page)`, if given, which returns a fresh unit (or None) for just that page range.
+    Returns the repaired map and a report of what was found and changed.
+    """
+    page_count = len(headings)
+    units = json.loads(json.dumps(structure_map))
+    report = {"issues_before": validate_structure_map(units, page_count), "snapped": [], "unlocated": [], "requeried": []}
+
+    _snap_starts(units, headings, report["snapped"], report["unlocated"])
+    _close_ranges(units, structure_map, page_count)
+    issues = validate_structure_map(units, page_count)
+
+    if requery is not None:
+        unresolved = sorted({issue["unit"] for issue in issues if issue["severity"] == "error"})
+        for ui in unresolved:
+            unit = units[ui]
+            first_page = max(1, unit["unit_start_page"] - REQUERY_PAGE_MARGIN)
+            last_page = min(page_count, max(unit["unit_start_page"], unit["unit_end_page"]) + REQUERY_PAGE_MARGIN)
+            remapped = requery(unit, first_page, last_page)
+            if remapped is not None:
+                units[ui] = remapped
+                report["requeried"].append(unit["unit_title"])
+        if report["requeried"]:
+            issues = validate_structure_map(units, page_count)
+
+    report["issues_after"] = issues
+    telemetry.incr("map_issues_found", sum(i["severity"] == "error" for i in report["issues_before"]))
+    telemetry.incr("map_boundaries_snapped", len(report["snapped"]))
+    telemetry.incr("map_units_requeried", len(report["requeried"]))
+    telemetry.incr("map_issues_remaining", sum(i["severity"] == "error" for i in issues))
+    return units, report
+
+def print_validation_report(report: dict):
+    errors_before = [i for i in report["issues_before"] if i["severity"] == "error"]
+    remaining = report["issues_after"]
+    if not errors_before and not report["snapped"] and not remaining:
+        print("✅ Structure map validated: every range is consistent and every boundary matches its page heading.")
+        return
+    print(f"-> Map validation found {len(errors_before)} range error(s); snapped {len(report['snapped'])} boundaries to their headings.")
+    for move in report["snapped"]:
+        print(f"  - '{move['title']}': page {move['from']} -> {move['to']}")
+    if report["requeried"]:
+        print(f"  - Re-mapped {len(report['requeried'])} unresolved unit(s) with the Mapper Agent: {', '.join(report['requeried'])}")
+    if report["unlocated"]:
+        print(f"  - {len(report['unlocated'])} title(s) were not found on any nearby page and were left as mapped.")
+    for issue in remaining:
+        icon = "❌" if issue["severity"] == "error" else "⚠️"
+        print(f"  {icon} {issue['message']}")
+    if not any(i["severity"] == "error" for i in remaining):
+        print("✅ Structure map repaired: no range errors remain.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate a structure map against its PDF and repair boundaries from the page text.")
+    parser.add_argument("pdf_path", type=Path, help="The book PDF.")
+    parser.add_argument("map_path", type=Path, help="The structure map JSON (e.g. output/agent_map_pydantic.json).")
+    parser.add_argument("--out", type=Path, help="Where to write the repaired map (default: overwrite the input map).")
+    parser.add_argument("--requery", action="store_true", help="Ask the Mapper Agent again for units that cannot be repaired locally.")
+    args = parser.parse_args()
+
+    with open(args.map_path, 'r', encoding='utf-8') as f:
+        structure_map = json.load(f)
+    requery = None
+    if args.requery:
+        from agents import remap_unit_from_pdf
+        requery = lambda unit, first_page, last_page: remap_unit_from_pdf(args.pdf_path, unit, first_page, last_page)
+
+    repaired, report = repair_structure_map(structure_map, load_page_headings(args.pdf_path), requery)
+    print_validation_report(report)
+    out_path = args.out or args.map_path
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(repaired, f, ensure_ascii=False, indent=2)
+    print(f"✅ Repaired map saved to: '{out_path}'")
+
+if __name__ == "__main__":
+    main()
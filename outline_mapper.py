@@ -0,0 +1,91 @@
+# outline_mapper.py
+
+import re
+import fitz
+from contextlib import nullcontext
+from pathlib import Path
+from agents import BookStructure, Unit, Lesson, generate_structure_map_from_pdf
+
+# Titles are matched with and without the definite article, e.g. 'الوحدة الأولى' or 'وحدة 1'.
+UNIT_TITLE_PATTERN = re.compile(r"^\s*(ال)?وحدة")
+LESSON_TITLE_PATTERN = re.compile(r"^\s*(ال)?درس")
+
+def _classify(title: str) -> str:
+    if UNIT_TITLE_PATTERN.match(title):
+        return "unit"
+    if LESSON_TITLE_PATTERN.match(title):
+        return "lesson"
+    return "other"
+
+def _end_page(entries: list[dict], idx: int, page_count: int, skip_lessons: bool = False) -> int:
+    """
+    The page before the next entry at the same or a shallower outline level (the next sibling or
+    an ancestor's sibling). Units skip lesson entries so that flat outlines still work.
+    """
+    entry = entries[idx]
+    for nxt in entries[idx + 1:]:
+        if nxt["level"] > entry["level"] or (skip_lessons and nxt["kind"] == "lesson"):
+            continue
+        return max(entry["page"], nxt["page"] - 1)
+    return page_count
+
+def build_structure_map_from_outline(toc: list, page_count: int) -> list[dict] | None:
+    """
+    Builds a validated structure map from a fitz outline (`[level, title, page]` rows with
+    physical 1-based pages). Returns None if the outline has no usable unit entries.
+    """
+    entries = []
+    for level, title, page, *_ in toc:
+        title = " ".join(str(title).split())
+        if 1 <= page <= page_count and title:
+            entries.append({"level": level, "title": title, "page": page, "kind": _classify(title)})
+
+    units = []
+    for idx, entry in enumerate(entries):
+        if entry["kind"] == "unit":
+            end_page = _end_page(entries, idx, page_count, skip_lessons=True)
+            units.append({"title": entry["title"], "start": entry["page"], "end": end_page, "lessons": []})
+        elif entry["kind"] == "lesson" and units:
+            unit = units[-1]
+            if entry["page"] <= unit["end"]:
+                end_page = min(_end_page(entries, idx, page_count), unit["end"])
+                unit["lessons"].append(Lesson(lesson_title=entry["title"], lesson_start_page=entry["page"], lesson_end_page=end_page))
+
+    if not units:
+        return None
+    if any(prev["start"] >= cur["start"] for prev, cur in zip(units, units[1:])):
+        return None
+
+    book = BookStructure(units=[
+        Unit(unit_title=u["title"], unit_start_page=u["start"], unit_end_page=u["end"], lessons=u["lessons"])
+        for u in units
+    ])
+    return book.dict()["units"]
+
+def generate_structure_map_from_outline(pdf_path: Path) -> list[dict] | None:
+    """Builds the structure map from the PDF's embedded bookmark outline, if it has a usable one."""
+    with fitz.open(pdf_path) as pdf_doc:
+        toc = pdf_doc.get_toc(simple=True)
+        page_count = len(pdf_doc)
+    if not toc:
+        return None
+    return build_structure_map_from_outline(toc, page_count)
+
+def generate_structure_map(pdf_path: Path, bypass_cache: bool = False, llm_semaphore=None) -> list[dict] | None:
+    """
+    Phase 1 entry point: uses the embedded outline when it yields units, and otherwise falls back
+    to the Mapper Agent (holding `llm_semaphore`, if given, for the duration of the LLM call).
+    """
+    try:
+        units_list = generate_structure_map_from_outline(pdf_path)
+    except Exception as e:
+        print(f"⚠️ Could not read the PDF outline, falling back to the Mapper Agent: {e}")
+        units_list = None
+
+    if units_list:
+        print(f"✅ Built structure map from the PDF outline with {len(units_list)} units (no LLM call needed).")
+        return units_list
+
+    print("-> No usable PDF outline found; falling back to the Mapper Agent.")
+    with llm_semaphore or nullcontext():
+        return generate_structure_map_from_pdf(pdf_path, bypass_cache=bypass_cache)
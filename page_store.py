@@ -0,0 +1,217 @@
+# page_store.py
+
+import os
+import json
+import hashlib
+import multiprocessing
+import fitz
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from telemetry import telemetry
+
+PAGE_SEPARATOR = "\n\n"
+HASH_CHUNK_SIZE = 1024 * 1024
+# Smaller documents are extracted serially; process start-up would outweigh the gain.
+MIN_PAGES_PER_SHARD = 32
+SHARDS_PER_WORKER = 4
+# Recently read pages kept by DocumentPageSource, so adjacent ranges don't re-parse their shared pages.
+PAGE_WINDOW_SIZE = 16
+# Extraction workers are spawned rather than forked: extraction may run on a background thread
+# (see main.start_page_prefetch), and forking a process that has other threads can deadlock the child.
+WORKER_START_METHOD = "spawn"
+
+# --- Helper Function for PDF Hashing ---
+def compute_file_hash(file_path: Path) -> str:
+    """Computes the SHA-256 hex digest of a file without loading it fully into memory."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# --- Sharded Parallel Extraction ---
+def _extract_shard(pdf_path: str, start_idx: int, end_idx: int) -> list[str]:
+    """Worker entry point: opens its own fitz handle and extracts pages [start_idx, end_idx)."""
+    with fitz.open(pdf_path) as pdf_doc:
+        return [pdf_doc.load_page(i).get_text("text") for i in range(start_idx, end_idx)]
+
+def plan_shards(page_count: int, workers: int) -> list[tuple[int, int]]:
+    """Splits [0, page_count) into contiguous shards, a few per worker for load balancing."""
+    shard_count = max(1, min(workers * SHARDS_PER_WORKER, page_count // MIN_PAGES_PER_SHARD))
+    shard_size = -(-page_count // shard_count)
+    return [(start, min(start + shard_size, page_count)) for start in range(0, page_count, shard_size)]
+
+def extract_page_texts(pdf_path: Path, workers: int | None = 1) -> list[str]:
+    """
+    Extracts the text of every page, in order. With more than one worker the page range is split
+    into shards, each extracted in a separate process with its own document handle.
+    """
+    workers = workers or os.cpu_count() or 1
+    with fitz.open(pdf_path) as pdf_doc:
+        page_count = len(pdf_doc)
+        if workers <= 1 or page_count < MIN_PAGES_PER_SHARD * 2:
+            return [page.get_text("text") for page in pdf_doc]
+
+    shards = plan_shards(page_count, workers)
+    page_texts = []
+    with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=multiprocessing.get_context(WORKER_START_METHOD)) as pool:
+        # `map` yields results in submission order, so shards are merged back in page order.
+        for shard_texts in pool.map(_extract_shard, [str(pdf_path)] * len(shards), *zip(*shards)):
+            page_texts.extend(shard_texts)
+    return page_texts
+
+# --- Page Boundaries Within a Range ---
+def page_start_offsets(page_source, start_page: int, end_page: int) -> list[int]:
+    """
+    Character offsets at which each page of a range begins within that range's content, which is
+    the pages joined with PAGE_SEPARATOR and then stripped (see PageTextStore.get_range_text).
+    """
+    offsets, position, leading = [], 0, None
+    for page_number in range(start_page, min(end_page, len(page_source)) + 1):
+        text = page_source.page_text(page_number)
+        if leading is None:
+            leading = len(text) - len(text.lstrip()) if text.strip() else None
+            if leading is None:
+                # A blank leading page is stripped away entirely; it starts where the next one does.
+                offsets.append(0)
+                continue
+        offsets.append(max(0, position - leading))
+        position += len(text) + len(PAGE_SEPARATOR)
+    return offsets
+
+
+class PageTextStore:
+    """
+    Holds the text of every page of a PDF, extracted exactly once.
+
+    All page texts live in one contiguous UTF-8 blob (each page followed by a blank line),
+    with a byte offset per page boundary, so any 1-based page range is a single slice.
+    """
+
+    def __init__(self, blob: bytes, offsets: list[int]):
+        self.blob = blob
+        self.offsets = offsets
+
+    @classmethod
+    def from_page_texts(cls, page_texts: list[str]) -> "PageTextStore":
+        """Builds the store from a list of per-page texts, in page order."""
+        encoded_pages = [(text + PAGE_SEPARATOR).encode("utf-8") for text in page_texts]
+        offsets = [0]
+        for encoded in encoded_pages:
+            offsets.append(offsets[-1] + len(encoded))
+        return cls(b"".join(encoded_pages), offsets)
+
+    @classmethod
+    def from_document(cls, pdf_doc) -> "PageTextStore":
+        """Extracts the text of every page of an open fitz document, once."""
+        return cls.from_page_texts([page.get_text("text") for page in pdf_doc])
+
+    @classmethod
+    def from_pdf(cls, pdf_path: Path, cache_dir: Path | None = None, workers: int | None = 1) -> "PageTextStore":
+        """
+        Opens a PDF and extracts every page, sharded across `workers` processes (None means one
+        per CPU). If `cache_dir` is given, the extracted text is stored there keyed by the PDF's
+        SHA-256 hash and reused on subsequent runs.
+        """
+        cache_key = None
+        if cache_dir is not None:
+            cache_key = compute_file_hash(pdf_path)
+            cached = cls.load(cache_dir, cache_key)
+            if cached is not None:
+                telemetry.incr("page_cache_hits")
+                print(f"✅ Loaded cached page text for '{Path(pdf_path).name}' ({len(cached)} pages).")
+                return cached
+            telemetry.incr("page_cache_misses")
+
+        with telemetry.span("phase2.extract_pages", workers=workers) as span:
+            store = cls.from_page_texts(extract_page_texts(pdf_path, workers))
+            span["pages"] = len(store)
+        telemetry.incr("pages_extracted", len(store))
+
+        if cache_key is not None:
+            store.save(cache_dir, cache_key)
+        return store
+
+    # --- On-disk Cache ---
+
+    @staticmethod
+    def _cache_paths(cache_dir: Path, cache_key: str) -> tuple[Path, Path]:
+        cache_dir = Path(cache_dir)
+        return cache_dir / f"{cache_key}.txt", cache_dir / f"{cache_key}.offsets.json"
+
+    def save(self, cache_dir: Path, cache_key: str):
+        """Writes the blob and its page offsets to the cache directory."""
+        blob_path, offsets_path = self._cache_paths(cache_dir, cache_key)
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        blob_path.write_bytes(self.blob)
+        with open(offsets_path, 'w', encoding='utf-8') as f:
+            json.dump(self.offsets, f)
+
+    @classmethod
+    def load(cls, cache_dir: Path, cache_key: str) -> "PageTextStore | None":
+        """Loads a previously saved store, or returns None if it is missing or inconsistent."""
+        blob_path, offsets_path = cls._cache_paths(cache_dir, cache_key)
+        if not blob_path.exists() or not offsets_path.exists():
+            return None
+        try:
+            with open(offsets_path, 'r', encoding='utf-8') as f:
+                offsets = json.load(f)
+            blob = blob_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if not offsets or offsets[-1] != len(blob):
+            return None
+        return cls(blob, offsets)
+
+    # --- Range Lookup ---
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def page_text(self, page_number: int) -> str:
+        """Returns the raw text of a single 1-based page."""
+        idx = page_number - 1
+        return self.blob[self.offsets[idx]:self.offsets[idx + 1]].decode("utf-8")[:-len(PAGE_SEPARATOR)]
+
+    def get_range_text(self, start_page: int, end_page: int) -> str:
+        """Returns the text of a 1-based inclusive page range, clamped to the document."""
+        start_idx = max(0, start_page - 1)
+        end_idx = min(len(self) - 1, end_page - 1)
+        if end_idx < start_idx:
+            return ""
+        return self.blob[self.offsets[start_idx]:self.offsets[end_idx + 1]].decode("utf-8").strip()
+
+
+class DocumentPageSource:
+    """
+    A bounded-memory alternative to PageTextStore for streaming assembly: pages are read on demand
+    from an open fitz document and only a small window of recently used page texts is retained.
+    """
+
+    def __init__(self, pdf_doc, window_size: int = PAGE_WINDOW_SIZE):
+        self.pdf_doc = pdf_doc
+        self.window_size = window_size
+        self._window = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self.pdf_doc)
+
+    def page_text(self, page_number: int) -> str:
+        """Returns the raw text of a single 1-based page."""
+        text = self._window.get(page_number)
+        if text is None:
+            text = self.pdf_doc.load_page(page_number - 1).get_text("text")
+            telemetry.incr("pages_extracted")
+            self._window[page_number] = text
+            if len(self._window) > self.window_size:
+                self._window.popitem(last=False)
+        else:
+            self._window.move_to_end(page_number)
+        return text
+
+    def get_range_text(self, start_page: int, end_page: int) -> str:
+        """Returns the text of a 1-based inclusive page range, clamped to the document."""
+        start_page = max(1, start_page)
+        end_page = min(len(self), end_page)
+        return "".join(self.page_text(n) + PAGE_SEPARATOR for n in range(start_page, end_page + 1)).strip()
@@ -1,75 +1,183 @@
 # parser.py
 
+import re
 import json
+from pathlib import Path
 from markdown_it import MarkdownIt
+from markdown_it.rules_block.html_block import HTML_SEQUENCES
+
+# An ATX heading or a code fence at the start of a line; used to find safe split points when streaming.
+ATX_HEADING_PATTERN = re.compile(r" {0,3}#{1,6}(?:[ \t]|$)")
+FENCE_PATTERN = re.compile(r" {0,3}(`{3,}|~{3,})")
+# A setext underline ends the paragraph above it, turning it into a heading.
+SETEXT_UNDERLINE_PATTERN = re.compile(r" {0,3}(?:=+|-+)[ \t]*$")
+READ_CHUNK_SIZE = 1 << 16
+
+class _StructureBuilder:
+    """
+    The unit/lesson/part state machine. Each object is registered with its parent once, when it is
+    opened, and part content is collected in a list and joined when the part is closed, so building
+    is linear in the number of tokens.
+    """
+
+    def __init__(self):
+        self.result_json = {"units": []}
+        self.current_unit = None
+        self.current_lesson = None
+        self.current_part = None
+        self._part_lines = None
+
+    def _close_part(self):
+        if self.current_part is not None:
+            self.current_part["content"] = "".join(self._part_lines)
+        self.current_part = None
+        self._part_lines = None
+
+    def consume(self, tokens):
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+
+            if token.type == 'heading_open':
+                # Get the heading text from the next token
+                heading_text = tokens[i+1].content.strip()
+
+                if token.tag == 'h1': # New Unit
+                    self._close_part()
+                    self.current_unit = {"title": heading_text, "lessons": [], "parts": []}
+                    self.result_json["units"].append(self.current_unit)
+                    self.current_lesson = None
+
+                elif token.tag == 'h2': # New Lesson
+                    self._close_part()
+                    self.current_lesson = {"title": heading_text, "parts": []}
+                    if self.current_unit is not None:
+                        self.current_unit["lessons"].append(self.current_lesson)
+
+                elif token.tag == 'h3': # New Part
+                    self._close_part()
+                    self.current_part = {"title": heading_text, "content": ""}
+                    self._part_lines = []
+                    # Parts belong to the current lesson, or to the unit before its first lesson
+                    if self.current_lesson is not None:
+                        self.current_lesson["parts"].append(self.current_part)
+                    elif self.current_unit is not None:
+                        self.current_unit["parts"].append(self.current_part)
+
+                i += 2  # Skip the inline content and heading_close tokens
+                continue
+
+            # Reconstruct content for the current part
+            # This part could be enhanced to better reconstruct complex markdown like tables
+            if self.current_part is not None and token.content:
+                if token.markup:
+                    self._part_lines.append(f"{token.markup} ")
+                self._part_lines.append(token.content)
+                self._part_lines.append("\n")
+
+            i += 1
+
+    def finish(self) -> dict:
+        self._close_part()
+        return self.result_json
+
 
 def parse_golden_markdown_to_json(golden_md_text: str) -> dict:
     """
     Parses a golden-standard markdown string into a structured JSON dictionary.
     """
-    md = MarkdownIt()
-    tokens = md.parse(golden_md_text)
-
-    # State machine variables to build the nested structure
-    result_json = {"units": []}
-    current_unit = None
-    current_lesson = None
-    current_part = None
-
-    # This helper function saves the completed objects to the structure
-    def save_state():
-        nonlocal current_unit, current_lesson, current_part
-        if current_part and current_lesson:
-            current_lesson["parts"].append(current_part)
-        if current_lesson and current_unit:
-            current_unit["lessons"].append(current_lesson)
-        if current_unit and current_unit not in result_json["units"]:
-             # This check prevents re-adding if a unit has no lessons
-            result_json["units"].append(current_unit)
-
-    i = 0
-    while i < len(tokens):
-        token = tokens[i]
-
-        if token.type == 'heading_open':
-            # Get the heading text from the next token
-            heading_text = tokens[i+1].content.strip()
-
-            if token.tag == 'h1': # New Unit
-                save_state() # Save the previous unit/lesson/part
-                current_unit = {"title": heading_text, "lessons": [], "parts": []}
-                current_lesson = None
-                current_part = None
-
-            elif token.tag == 'h2': # New Lesson
-                if current_part: # Save the previous part
-                    current_lesson["parts"].append(current_part)
-                current_lesson = {"title": heading_text, "parts": []}
-                current_part = None
-
-            elif token.tag == 'h3': # New Part
-                if current_part: # Save the previous part
-                    # Decide where to save: lesson parts or unit parts
-                    if current_lesson:
-                        current_lesson["parts"].append(current_part)
-                    elif current_unit:
-                        current_unit["parts"].append(current_part)
-                current_part = {"title": heading_text, "content": ""}
-            
-            i += 2  # Skip the inline content and heading_close tokens
-            continue
-
-        # Reconstruct content for the current part
-        # This part could be enhanced to better reconstruct complex markdown like tables
-        if current_part and token.content:
-            content_to_add = token.content
-            if token.markup:
-                content_to_add = f"{token.markup} {content_to_add}"
-            current_part["content"] += content_to_add + "\n"
-
-        i += 1
-    
-    # After the loop, save the very last objects that are still in memory
-    save_state()
-
-    return result_json
\ No newline at end of file
+    builder = _StructureBuilder()
+    builder.consume(MarkdownIt().parse(golden_md_text))
+    return builder.finish()
+
+
+class GoldenMarkdownStreamParser:
+    """
+    Incremental form of `parse_golden_markdown_to_json`: markdown is fed in arbitrary chunks and
+    only the section since the last heading is buffered. An ATX heading line outside a code fence or
+    an HTML block (recognized with markdown-it's own start and end sequences) is a candidate split
+    point. The buffered section is then parsed with that line appended, and split there only if
+    markdown-it reads the line as a top-level heading, which closes every preceding block. The
+    tokens before the heading are the section's own, so each section is parsed once, and the result
+    matches a single parse of the whole document.
+    """
+
+    def __init__(self):
+        self.md = MarkdownIt()
+        self.builder = _StructureBuilder()
+        self._pending = ""        # Incomplete trailing line
+        self._section = []        # Complete lines since the last split point
+        self._fence = None        # Opening marker of the code fence we are inside, if any
+        self._html_end = None     # Closing pattern of the HTML block we are inside, if any
+        self._paragraph = False   # Whether the previous line belongs to a paragraph
+
+    def _flush_section(self):
+        if self._section:
+            self.builder.consume(self.md.parse("".join(self._section)))
+            self._section = []
+
+    def _split_before(self, line: str) -> bool:
+        """Consumes the buffered section if `line` opens a top-level heading after it."""
+        tokens = self.md.parse("".join(self._section) + line)
+        heading = tokens[-3] if len(tokens) >= 3 else None
+        if heading is None or heading.type != "heading_open" or heading.level != 0 or heading.map[0] != len(self._section):
+            return False
+        self.builder.consume(tokens[:-3])
+        self._section = []
+        return True
+
+    def _html_block_end(self, text: str):
+        """The closing pattern of the HTML block `text` opens, or None if it opens none here."""
+        for start, end, can_interrupt_paragraph in HTML_SEQUENCES:
+            if start.search(text):
+                return end if can_interrupt_paragraph or not self._paragraph else None
+        return None
+
+    def _add_line(self, line: str):
+        text = line.rstrip("\n")
+        # What markdown-it matches HTML block sequences against: the line after its indentation.
+        content = text.lstrip(" \t")
+        indent = len(text[:len(text) - len(content)].expandtabs(4))
+        fence = FENCE_PATTERN.match(line)
+        paragraph = False
+        if self._fence is not None:
+            if fence and fence.group(1)[0] == self._fence[0] and len(fence.group(1)) >= len(self._fence) \
+                    and not line[fence.end():].strip():
+                self._fence = None
+        elif self._html_end is not None:
+            if self._html_end.search(content):
+                self._html_end = None
+        elif fence:
+            self._fence = fence.group(1)
+        elif ATX_HEADING_PATTERN.match(line) and self._split_before(line):
+            pass
+        elif indent <= 3 and content.startswith("<") and (html_end := self._html_block_end(content)) is not None:
+            # A block whose closing sequence is on its first line ends there.
+            if not html_end.search(content):
+                self._html_end = html_end
+        elif not (self._paragraph and SETEXT_UNDERLINE_PATTERN.match(line)):
+            paragraph = bool(content) and (self._paragraph or indent <= 3)
+        self._paragraph = paragraph
+        self._section.append(line)
+
+    def feed(self, chunk: str):
+        lines = (self._pending + chunk).split("\n")
+        self._pending = lines.pop()
+        for line in lines:
+            self._add_line(line + "\n")
+
+    def close(self) -> dict:
+        if self._pending:
+            self._add_line(self._pending)
+            self._pending = ""
+        self._flush_section()
+        return self.builder.finish()
+
+
+def parse_golden_markdown_file(md_path: Path, chunk_size: int = READ_CHUNK_SIZE) -> dict:
+    """Parses a golden-standard markdown file by streaming it through GoldenMarkdownStreamParser."""
+    stream_parser = GoldenMarkdownStreamParser()
+    with open(md_path, 'r', encoding='utf-8') as f:
+        while chunk := f.read(chunk_size):
+            stream_parser.feed(chunk)
+    return stream_parser.close()
@@ -0,0 +1,94 @@
+# payload_builder.py
+
+import re
+import fitz
+from pathlib import Path
+
+# --- Configuration ---
+# Only the first few lines of a page are checked for headings.
+HEADING_SCAN_LINES = 6
+MAX_HEADING_WORDS = 14
+# If more than this share of pages are candidates, the excerpt would save little; send the full PDF.
+MAX_CANDIDATE_RATIO = 0.6
+
+TOC_PATTERN = re.compile(r"(المحتويات|الفهرس|فهرس)")
+HEADING_PATTERN = re.compile(r"(^|\s)(ال)?(وحدة|درس)(\s|$)")
+# Closing sections bound the last unit, so they are kept as well.
+CLOSING_PATTERN = re.compile(r"(^|\s)(الخاتمة|خاتمة|الملاحق|ملحق|المراجع|المصادر)(\s|$)")
+
+def _leading_lines(page_text: str) -> list[str]:
+    lines = [line.strip() for line in page_text.splitlines() if line.strip()]
+    return lines[:HEADING_SCAN_LINES]
+
+def is_candidate_page(page_text: str) -> bool:
+    """True for table-of-contents pages and pages whose opening lines carry a unit/lesson heading."""
+    for line in _leading_lines(page_text):
+        if len(line.split()) > MAX_HEADING_WORDS:
+            continue
+        if TOC_PATTERN.search(line) or HEADING_PATTERN.search(line) or CLOSING_PATTERN.search(line):
+            return True
+    return False
+
+def find_candidate_pages(pdf_doc) -> list[int]:
+    """Returns the 0-based indices of the pages worth sending to the Mapper Agent."""
+    return [i for i, page in enumerate(pdf_doc) if is_candidate_page(page.get_text("text"))]
+
+def build_reduced_pdf(pdf_path: Path) -> tuple[bytes, list[int], int] | None:
+    """
+    Writes a reduced PDF holding only the candidate pages. Returns its bytes, the page-number
+    mapping table (excerpt page k is physical page `page_map[k - 1]`) and the full page count,
+    or None when no useful reduction is possible.
+    """
+    with fitz.open(pdf_path) as pdf_doc:
+        page_count = len(pdf_doc)
+        candidates = find_candidate_pages(pdf_doc)
+        if not candidates or len(candidates) > page_count * MAX_CANDIDATE_RATIO:
+            return None
+        pdf_doc.select(candidates)
+        reduced_bytes = pdf_doc.tobytes(garbage=3, deflate=True)
+    return reduced_bytes, [i + 1 for i in candidates], page_count
+
+def count_pdf_pages(pdf_bytes: bytes) -> int:
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
+        return len(pdf_doc)
+
+def split_pdf_windows(pdf_bytes: bytes, windows: list[tuple[int, int]]) -> list[bytes]:
+    """Cuts a PDF into one smaller PDF per (first, last) page window (1-based, inclusive)."""
+    window_pdfs = []
+    for first_page, last_page in windows:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as pdf_doc:
+            pdf_doc.select(list(range(first_page - 1, last_page)))
+            window_pdfs.append(pdf_doc.tobytes(garbage=3, deflate=True))
+    return window_pdfs
+
+def build_page_range_pdf(pdf_path: Path, first_page: int, last_page: int) -> bytes:
+    """Writes a PDF holding only physical pages `first_page`..`last_page` (1-based, inclusive)."""
+    with fitz.open(pdf_path) as pdf_doc:
+        pdf_doc.select(list(range(first_page - 1, last_page)))
+        return pdf_doc.tobytes(garbage=3, deflate=True)
+
+# --- Translating Answers Back to Physical Pages ---
+
+def _physical_start(page_map: list[int], excerpt_page: int) -> int:
+    idx = min(max(excerpt_page, 1), len(page_map)) - 1
+    return page_map[idx]
+
+def _physical_end(page_map: list[int], excerpt_page: int, page_count: int) -> int:
+    """A range ending on excerpt page k runs up to the page before excerpt page k + 1 begins."""
+    if excerpt_page >= len(page_map):
+        return page_count
+    return page_map[max(excerpt_page, 1)] - 1
+
+def translate_to_physical_pages(units: list[dict], page_map: list[int], page_count: int) -> list[dict]:
+    """Converts a structure map expressed in excerpt page numbers into physical page numbers."""
+    translated = []
+    for unit in units:
+        unit_start = _physical_start(page_map, unit["unit_start_page"])
+        unit_end = max(unit_start, _physical_end(page_map, unit["unit_end_page"], page_count))
+        lessons = []
+        for lesson in unit.get("lessons", []):
+            lesson_start = _physical_start(page_map, lesson["lesson_start_page"])
+            lesson_end = max(lesson_start, _physical_end(page_map, lesson["lesson_end_page"], page_count))
+            lessons.append({**lesson, "lesson_start_page": lesson_start, "lesson_end_page": min(lesson_end, unit_end)})
+        translated.append({**unit, "unit_start_page": unit_start, "unit_end_page": unit_end, "lessons": lessons})
+    return translated
@@ -0,0 +1,219 @@
+# search_index.py
+
+import os
+import re
+import json
+import mmap
+import math
+import time
+import shutil
+import argparse
+from pathlib import Path
+from collections import Counter, defaultdict
+from arabic_text import normalize_arabic
+from checkpoint import PART_PAGES_PATTERN, load_units
+
+# --- Configuration ---
+LEXICON_FILENAME = "lexicon.json"
+DOCS_FILENAME = "docs.json"
+POSTINGS_FILENAME = "postings.bin"
+# Each build is written to its own `build-<id>` directory; this file names the current one and is
+# swapped in atomically, so readers always open a lexicon, docs and postings from the same build.
+CURRENT_FILENAME = "CURRENT"
+BUILD_DIR_PREFIX = "build-"
+# Builds kept on disk: the current one, and the previous one for readers that are still opening it.
+BUILDS_KEPT = 2
+OPEN_ATTEMPTS = 3
+DEFAULT_RESULT_LIMIT = 20
+
+# Leading article/preposition clusters stripped so that 'الحديث', 'والحديث' and 'حديث' share a term.
+ARTICLE_PREFIX_PATTERN = re.compile(r"^(وال|بال|كال|فال|ال|لل)(?=..)")
+
+def tokenize(text: str) -> list[str]:
+    """Splits text into normalized search terms."""
+    return [ARTICLE_PREFIX_PATTERN.sub("", token) for token in normalize_arabic(text).split()]
+
+# --- Varint Encoding for Postings ---
+
+def _encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_varints(buf, offset: int, count: int) -> list[int]:
+    values, value, shift = [], 0, 0
+    while len(values) < count:
+        byte = buf[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value, shift = 0, 0
+    return values
+
+# --- Building ---
+
+def iter_documents(book: str, units: list[dict]):
+    """Yields one searchable document per lesson and per unit part, with its provenance."""
+    for unit in units:
+        for lesson in unit.get("lessons", []):
+            yield {"book": book, "unit": unit["title"], "lesson": lesson["title"],
+                   "start_page": lesson["start_page"], "end_page": lesson["end_page"]}, lesson.get("content", "")
+        for part in unit.get("parts", []):
+            # Parts carry their own range in the title; intro/afterword parts span the whole unit.
+            match = PART_PAGES_PATTERN.search(part["title"])
+            start_page, end_page = (int(match.group(1)), int(match.group(2))) if match else (unit["start_page"], unit["end_page"])
+            yield {"book": book, "unit": unit["title"], "lesson": None, "part": part["title"],
+                   "start_page": start_page, "end_page": end_page}, part.get("content", "")
+
+def current_build_dir(index_dir: Path) -> Path | None:
+    """The directory of the index's current build, or None if it has never been built."""
+    try:
+        return Path(index_dir) / (Path(index_dir) / CURRENT_FILENAME).read_text(encoding="utf-8").strip()
+    except OSError:
+        return None
+
+def index_built_at(index_dir: Path) -> float | None:
+    """When the current build was swapped in (a modification time), or None if there is none."""
+    try:
+        return (Path(index_dir) / CURRENT_FILENAME).stat().st_mtime
+    except OSError:
+        return None
+
+def build_search_index(json_paths: list[Path], index_dir: Path) -> int:
+    """
+    Builds an inverted index over the structured book JSON/NDJSON files or packed stores, one book at a time. Postings are
+    stored as varint-encoded (doc-id delta, term frequency) pairs in a single binary file; the
+    lexicon maps each term to its byte offset and document count. The files are written to a new
+    build directory, which then replaces the current one in a single step; indexes already open keep
+    reading their own build. Returns the number of documents.
+    """
+    docs = []
+    postings = defaultdict(list)
+    for json_path in json_paths:
+        units = load_units(json_path)
+        for doc, content in iter_documents(json_path.stem, units):
+            doc_id = len(docs)
+            docs.append(doc)
+            for term, tf in Counter(tokenize(content)).items():
+                postings[term].append((doc_id, tf))
+        del units
+
+    blob, lexicon = bytearray(), {}
+    for term in sorted(postings):
+        lexicon[term] = [len(blob), len(postings[term])]
+        previous = 0
+        for doc_id, tf in postings[term]:
+            _encode_varint(doc_id - previous, blob)
+            _encode_varint(tf, blob)
+            previous = doc_id
+    # Zero-padded so that build directories sort in build order.
+    build_dir = index_dir / f"{BUILD_DIR_PREFIX}{time.time_ns():020d}-{os.getpid()}"
+    build_dir.mkdir(parents=True)
+    (build_dir / POSTINGS_FILENAME).write_bytes(bytes(blob))
+    with open(build_dir / LEXICON_FILENAME, 'w', encoding='utf-8') as f:
+        json.dump(lexicon, f, ensure_ascii=False, separators=(",", ":"))
+    with open(build_dir / DOCS_FILENAME, 'w', encoding='utf-8') as f:
+        json.dump(docs, f, ensure_ascii=False, separators=(",", ":"))
+
+    tmp_path = index_dir / f"{CURRENT_FILENAME}.{os.getpid()}.tmp"
+    tmp_path.write_text(build_dir.name, encoding="utf-8")
+    os.replace(tmp_path, index_dir / CURRENT_FILENAME)
+    for old_build in sorted(index_dir.glob(f"{BUILD_DIR_PREFIX}*"))[:-BUILDS_KEPT]:
+        # An index still reading an old build keeps its open files on POSIX; elsewhere the build stays until next time.
+        shutil.rmtree(old_build, ignore_errors=True)
+    for filename in (LEXICON_FILENAME, DOCS_FILENAME, POSTINGS_FILENAME):
+        # Left directly in the index directory by builds from before build directories existed.
+        (index_dir / filename).unlink(missing_ok=True)
+    return len(docs)
+
+# --- Querying ---
+
+class SearchIndex:
+    """
+    Read-only access to the current build of an index; postings are memory-mapped and decoded per
+    query term. If a newer build removes the one being opened, the new current build is opened.
+    """
+
+    def __init__(self, index_dir: Path):
+        for attempt in range(OPEN_ATTEMPTS):
+            build_dir = current_build_dir(index_dir)
+            if build_dir is None:
+                raise FileNotFoundError(f"No search index has been built in '{index_dir}'.")
+            try:
+                self._open(build_dir)
+                return
+            except FileNotFoundError:
+                if attempt + 1 == OPEN_ATTEMPTS:
+                    raise
+
+    def _open(self, build_dir: Path):
+        with open(build_dir / LEXICON_FILENAME, 'r', encoding='utf-8') as f:
+            self.lexicon = json.load(f)
+        with open(build_dir / DOCS_FILENAME, 'r', encoding='utf-8') as f:
+            self.docs = json.load(f)
+        self._file = open(build_dir / POSTINGS_FILENAME, 'rb')
+        has_postings = os.fstat(self._file.fileno()).st_size > 0
+        self._postings = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if has_postings else b""
+
+    def _term_postings(self, term: str) -> dict[int, int]:
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return {}
+        offset, count = entry
+        values = _decode_varints(self._postings, offset, count * 2)
+        result, doc_id = {}, 0
+        for delta, tf in zip(values[::2], values[1::2]):
+            doc_id += delta
+            result[doc_id] = tf
+        return result
+
+    def search(self, query: str, limit: int = DEFAULT_RESULT_LIMIT) -> list[dict]:
+        """Returns documents containing every query term, ranked by TF-IDF."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        per_term = sorted((self._term_postings(t) for t in terms), key=len)
+        if not per_term[0]:
+            return []
+        matching = set(per_term[0]).intersection(*per_term[1:])
+        total_docs = len(self.docs)
+        scores = Counter()
+        for postings in per_term:
+            idf = math.log(1 + total_docs / len(postings))
+            for doc_id in matching:
+                scores[doc_id] += (1 + math.log(postings[doc_id])) * idf
+        return [{**self.docs[doc_id], "score": round(score, 3)} for doc_id, score in scores.most_common(limit)]
+
+    def close(self):
+        if isinstance(self._postings, mmap.mmap):
+            self._postings.close()
+        self._file.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the full-text search index over structured book JSON files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build an index from structured JSON files.")
+    build_parser.add_argument("json_paths", type=Path, nargs="+", help="Structured book JSON files to index.")
+    build_parser.add_argument("--index-dir", type=Path, required=True, help="Directory to write the index to.")
+    query_parser = subparsers.add_parser("query", help="Search an existing index.")
+    query_parser.add_argument("index_dir", type=Path, help="Directory of a built index.")
+    query_parser.add_argument("query", help="Search terms.")
+    query_parser.add_argument("--limit", type=int, default=DEFAULT_RESULT_LIMIT, help="Maximum number of results.")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        doc_count = build_search_index(args.json_paths, args.index_dir)
+        print(f"✅ Indexed {doc_count} lessons/parts from {len(args.json_paths)} books into '{args.index_dir}'")
+    else:
+        index = SearchIndex(args.index_dir)
+        for hit in index.search(args.query, args.limit):
+            section = hit["lesson"] or hit.get("part")
+            print(f"  - [{hit['book']}] {hit['unit']} / {section} | Pages {hit['start_page']}-{hit['end_page']} | score={hit['score']}")
+        index.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# stream_writer.py
+
+import os
+import json
+from pathlib import Path
+from content_store import PackedUnitWriter
+
+OUTPUT_FORMATS = ("json", "json-stream", "ndjson", "packed")
+# Streamed text outputs are written here while a run is in progress; this is the file to tail.
+PARTIAL_SUFFIX = ".partial"
+
+def partial_path_for(path: Path) -> Path:
+    """Where the streamed output for `path` grows during a run, before it is renamed to `path`."""
+    path = Path(path)
+    return path.with_name(path.name + PARTIAL_SUFFIX)
+
+def _indent(text: str, prefix: str) -> str:
+    # Not splitlines(): it also splits on U+0085/U+2028/U+2029, which json.dumps leaves unescaped in strings.
+    return "\n".join(prefix + line for line in text.split("\n"))
+
+class _AtomicFileWriter:
+    """
+    Writes to `<path>.partial` and renames it over `path` on `close`, so a failed run never leaves
+    a truncated file that looks complete: consumers tail the partial file during the run, and `path`
+    only ever holds complete output. `abort` deletes the partial file instead, keeping any previous
+    output. Used as a context manager, it closes on success and aborts on an exception.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.partial_path = partial_path_for(self.path)
+        self.f = open(self.partial_path, 'w', encoding='utf-8')
+        self.count = 0
+
+    def _finish(self):
+        pass
+
+    def close(self):
+        self._finish()
+        self.f.close()
+        os.replace(self.partial_path, self.path)
+
+    def abort(self):
+        self.f.close()
+        self.partial_path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+class JsonArrayUnitWriter(_AtomicFileWriter):
+    """
+    Writes `{"units": [...]}` one unit at a time, byte-for-byte identical to `json.dump(..., indent=2)`.
+    Each unit is flushed as soon as it is written, so the partial file can be tailed during a run.
+    """
+
+    def write(self, unit: dict):
+        separator = ",\n" if self.count else '{\n  "units": [\n'
+        self.f.write(separator + _indent(json.dumps(unit, ensure_ascii=False, indent=2), "    "))
+        self.f.flush()
+        self.count += 1
+
+    def _finish(self):
+        self.f.write("\n  ]\n}" if self.count else '{\n  "units": []\n}')
+
+class NdjsonUnitWriter(_AtomicFileWriter):
+    """Writes one compact JSON unit per line, flushed as soon as each unit is complete."""
+
+    def write(self, unit: dict):
+        self.f.write(json.dumps(unit, ensure_ascii=False) + "\n")
+        self.f.flush()
+        self.count += 1
+
+def write_units_streaming(units, path: Path, output_format: str) -> int:
+    """
+    Drains a unit iterator into `path` without holding more than one unit in memory. If the iterator
+    raises, the partial output is discarded and any previous file at `path` is left as it was.
+    """
+    if output_format == "packed":
+        writer = PackedUnitWriter(path)
+    elif output_format == "ndjson":
+        writer = NdjsonUnitWriter(path)
+    else:
+        writer = JsonArrayUnitWriter(path)
+    with writer:
+        for unit in units:
+            writer.write(unit)
+    return writer.count
@@ -1,12 +1,22 @@
 # app.py
 
 import streamlit as st
+import sys
 import json
+import fitz
+import threading
 from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Import the dedicated PDF viewer component
 from streamlit_pdf_viewer import pdf_viewer
 
+# The search index lives with the pipeline modules in the repository root.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from search_index import SearchIndex, build_search_index, index_built_at
+from content_store import PACK_SUFFIX, ContentStore, load_pack_index
+
 # --- 1. Configuration and Data Loading ---
 
 st.set_page_config(layout="wide", page_title="Book Navigator")
@@ -26,44 +36,238 @@ BOOKS = {
         "json_path": DATA_DIR / "book2_structured_pydantic.json"
     }
 }
+# Maximum number of page-range PDFs kept in memory across reruns and sessions.
+SUBSET_CACHE_SIZE = 32
+SEARCH_INDEX_DIR = DATA_DIR / "search_index"
+SEARCH_RESULT_LIMIT = 10
+# Packed content stores (main.py with OUTPUT_FORMAT = "packed") are looked up in the data directory and
+# then directly in the pipeline's output directory, so they do not have to be copied over by hand.
+STORE_DIRS = [DATA_DIR, Path(__file__).resolve().parent.parent / "output"]
+
+def nav_path_for(json_path: Path) -> Path:
+    """The lightweight navigation sidecar (titles and page ranges only) written by main.py."""
+    return json_path.with_name(f"{json_path.stem}.nav.json")
+
+def store_path_for(json_path: Path) -> Path | None:
+    """The packed content store of a book, if one has been written."""
+    for store_dir in STORE_DIRS:
+        store_path = store_dir / f"{json_path.stem}{PACK_SUFFIX}"
+        if store_path.exists():
+            return store_path
+    return None
+
+def mtime_ns(path: Path | None) -> int:
+    """A file's modification time, passed to cached loaders so a rewritten file is loaded again."""
+    try:
+        return path.stat().st_mtime_ns if path else 0
+    except OSError:
+        return 0
+
+def load_navigation_index(json_path: Path) -> dict | None:
+    """
+    The navigation index for a book: ordered unit/lesson titles, title-to-page-range maps and the
+    book-order list of lesson ranges. It is read from the packed store's metadata index, which also
+    gives the byte slices of every lesson's and part's text, or else from the navigation sidecar;
+    the full structured JSON is only parsed as a fallback for books processed before sidecars
+    existed. It is rebuilt whenever the file it is read from changes.
+    """
+    store_path = store_path_for(json_path)
+    nav_path = nav_path_for(json_path)
+    source_path = store_path or (nav_path if nav_path.exists() else json_path)
+    return build_navigation_index(json_path, store_path, source_path, mtime_ns(source_path))
 
-@st.cache_data
-def load_book_structure(json_path: Path) -> dict | None:
-    """Loads the structured JSON file for a selected book."""
-    if not json_path.exists():
+@st.cache_data(max_entries=2 * len(BOOKS))
+def build_navigation_index(json_path: Path, store_path: Path | None, source_path: Path, source_mtime_ns: int) -> dict | None:
+    """Cached per source file and modification time (see `load_navigation_index`)."""
+    if not source_path.exists():
         st.error(f"Error: JSON file not found at {json_path}")
         return None
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        if store_path:
+            units = load_pack_index(store_path)["units"]
+        else:
+            with open(source_path, 'r', encoding='utf-8') as f:
+                units = json.load(f).get("units", [])
     except Exception as e:
         st.error(f"Failed to load or parse JSON file: {e}")
         return None
 
-# --- NEW: Updated PDF function to use `pages_to_render` ---
-def show_pdf_with_component(pdf_path: Path, pages: list[int]):
+    index = {"unit_titles": [], "unit_ranges": {}, "lesson_titles": {}, "lesson_ranges": {}, "lesson_order": [],
+             "store_path": store_path, "store_mtime_ns": source_mtime_ns if store_path else 0, "sections": {}}
+    for unit in units:
+        if store_path:
+            # (unit, None) holds the unit's own parts; (unit, lesson) the lesson's text.
+            index["sections"].setdefault((unit["title"], None), [(p["title"], p["offset"], p["length"]) for p in unit.get("parts", [])])
+            for lesson in unit.get("lessons", []):
+                index["sections"].setdefault((unit["title"], lesson["title"]), [(lesson["title"], lesson["offset"], lesson["length"])])
+        unit_start = unit.get("start_page", 1)
+        index["unit_titles"].append(unit["title"])
+        index["unit_ranges"].setdefault(unit["title"], (unit_start, unit.get("end_page", unit_start)))
+        lesson_titles = index["lesson_titles"].setdefault(unit["title"], [])
+        lesson_ranges = index["lesson_ranges"].setdefault(unit["title"], {})
+        for lesson in unit.get("lessons", []):
+            lesson_start = lesson.get("start_page", 1)
+            lesson_range = (lesson_start, lesson.get("end_page", lesson_start))
+            lesson_titles.append(lesson["title"])
+            lesson_ranges.setdefault(lesson["title"], lesson_range)
+            index["lesson_order"].append(lesson_range)
+    return index
+
+def load_search_index() -> SearchIndex | None:
+    """
+    Opens the full-text index over all books. It is rebuilt from the books' packed stores or structured
+    JSON when missing or older than any of them, so re-running the pipeline never leaves search stale.
+    """
+    sources = tuple(store_path_for(book["json_path"]) or book["json_path"] for book in BOOKS.values())
+    newest_source = max((path.stat().st_mtime for path in sources if path.exists()), default=0.0)
+    return open_search_index(sources, newest_source)
+
+@st.cache_resource(max_entries=1)
+def open_search_index(sources: tuple[Path, ...], newest_source: float) -> SearchIndex | None:
+    """Cached per set of sources and their newest mtime, so a changed book opens the rebuilt index."""
+    try:
+        built_at = index_built_at(SEARCH_INDEX_DIR)
+        if built_at is None or built_at < newest_source:
+            build_search_index(list(sources), SEARCH_INDEX_DIR)
+        return SearchIndex(SEARCH_INDEX_DIR)
+    except Exception as e:
+        st.error(f"Failed to load the search index: {e}")
+        return None
+
+@st.cache_resource(max_entries=len(BOOKS))
+def open_content_store(store_path: Path, store_mtime_ns: int) -> ContentStore | None:
+    """
+    Memory-maps a book's packed content store once per version (its index's modification time, as
+    recorded in the navigation index), so offsets and content always come from the same store.
+    Sections are decoded only when shown.
+    """
+    try:
+        return ContentStore(store_path)
+    except Exception as e:
+        st.error(f"Failed to open the content store: {e}")
+        return None
+
+def book_name_for_stem(stem: str) -> str | None:
+    """Maps a search hit's book (its structured JSON stem) back to the navigator's book name."""
+    for book_name, book in BOOKS.items():
+        if book["json_path"].stem == stem:
+            return book_name
+    return None
+
+# --- Page-Subset PDFs ---
+
+def build_pdf_subset(pdf_path: Path, start_page: int, end_page: int) -> bytes:
+    """Builds a small PDF containing only the given 1-based page range."""
+    with fitz.open(pdf_path) as src:
+        start_idx = max(0, start_page - 1)
+        end_idx = min(len(src) - 1, end_page - 1)
+        with fitz.open() as subset:
+            subset.insert_pdf(src, from_page=start_idx, to_page=end_idx)
+            return subset.tobytes(garbage=3, deflate=True)
+
+class PdfSubsetCache:
+    """
+    A bounded LRU cache of page-range PDFs keyed by (book, start, end), with background prefetching
+    so that switching to a neighbouring lesson finds its PDF already built.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-prefetch")
+
+    def _store(self, key, pdf_bytes: bytes):
+        with self._lock:
+            self._entries[key] = pdf_bytes
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, book_name: str, pdf_path: Path, start_page: int, end_page: int) -> bytes:
+        key = (book_name, start_page, end_page)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        pdf_bytes = build_pdf_subset(pdf_path, start_page, end_page)
+        self._store(key, pdf_bytes)
+        return pdf_bytes
+
+    def _prefetch_one(self, key, pdf_path: Path):
+        try:
+            self._store(key, build_pdf_subset(pdf_path, key[1], key[2]))
+        except Exception:
+            pass  # Prefetching is best-effort; a real request will surface any error.
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def prefetch(self, book_name: str, pdf_path: Path, ranges: list[tuple[int, int]]):
+        """Schedules page ranges to be built in the background if they are not cached yet."""
+        for start_page, end_page in ranges:
+            key = (book_name, start_page, end_page)
+            with self._lock:
+                if key in self._entries or key in self._pending:
+                    continue
+                self._pending.add(key)
+            self._executor.submit(self._prefetch_one, key, pdf_path)
+
+@st.cache_resource
+def get_subset_cache() -> PdfSubsetCache:
+    return PdfSubsetCache(SUBSET_CACHE_SIZE)
+
+def adjacent_lesson_ranges(nav_index: dict, start_page: int, end_page: int) -> list[tuple[int, int]]:
+    """Returns the page ranges of the lessons just before and after the given range, in book order."""
+    ranges = nav_index["lesson_order"]
+    if (start_page, end_page) not in ranges:
+        return []
+    idx = ranges.index((start_page, end_page))
+    return [ranges[i] for i in (idx - 1, idx + 1) if 0 <= i < len(ranges)]
+
+def show_pdf_with_component(book_name: str, pdf_path: Path, pages: list[int], nav_index: dict | None = None):
     """
     Displays a specific range of pages from a PDF using the streamlit_pdf_viewer component.
+    Only a PDF of the selected pages is sent to the browser; neighbouring lessons are prefetched.
     """
     if not pdf_path.exists():
         st.error(f"Error: PDF file not found at {pdf_path}")
         return
         
     try:
-        with open(pdf_path, "rb") as f:
-            pdf_bytes = f.read()
-        
-        # Call the component, passing the list of pages to render.
-        # This will filter the view to only the selected range.
+        subset_cache = get_subset_cache()
+        start_page, end_page = pages[0], pages[-1]
+        pdf_bytes = subset_cache.get(book_name, pdf_path, start_page, end_page)
+        if nav_index:
+            subset_cache.prefetch(book_name, pdf_path, adjacent_lesson_ranges(nav_index, start_page, end_page))
+
+        # The subset holds exactly the selected range, so every page in it is rendered.
         pdf_viewer(
             input=pdf_bytes,
-            height=1000,
-            pages_to_render=pages
+            height=1000
         )
     except Exception as e:
         st.error(f"An error occurred while trying to display the PDF: {e}")
 
 
+def show_extracted_text(nav_index: dict | None, unit_title: str, lesson_title: str | None):
+    """Shows the extracted text of the selected lesson, or of the selected unit's parts, from the packed store."""
+    if not nav_index or not nav_index["store_path"]:
+        return
+    sections = nav_index["sections"].get((unit_title, lesson_title)) or nav_index["sections"].get((unit_title, None))
+    if not sections:
+        return
+    store = open_content_store(nav_index["store_path"], nav_index["store_mtime_ns"])
+    if store is None:
+        return
+    with st.expander("Extracted Text"):
+        for title, offset, length in sections:
+            if len(sections) > 1:
+                st.markdown(f"**{title}**")
+            st.text(store.text_at(offset, length))
+
+
 # --- 2. State Management and Callbacks (Updated for Page Ranges) ---
 
 # Initialize session state with a list for the page range
@@ -88,14 +292,11 @@ def on_unit_change():
     if selected_unit_title == "Select a Unit...":
         return
         
-    book_data = load_book_structure(BOOKS[st.session_state.selected_book]["json_path"])
-    for unit in book_data.get("units", []):
-        if unit["title"] == selected_unit_title:
-            start_page = unit.get("start_page", 1)
-            end_page = unit.get("end_page", start_page)
-            # Generate the full list of pages for the unit
-            st.session_state.pages_to_show = list(range(start_page, end_page + 1))
-            break
+    nav_index = load_navigation_index(BOOKS[st.session_state.selected_book]["json_path"])
+    if nav_index and selected_unit_title in nav_index["unit_ranges"]:
+        start_page, end_page = nav_index["unit_ranges"][selected_unit_title]
+        # Generate the full list of pages for the unit
+        st.session_state.pages_to_show = list(range(start_page, end_page + 1))
 
 def on_lesson_change():
     """Callback to set the page range for the selected lesson."""
@@ -103,15 +304,19 @@ def on_lesson_change():
     if selected_lesson_title == "Select a Lesson...":
         return
         
-    book_data = load_book_structure(BOOKS[st.session_state.selected_book]["json_path"])
-    for unit in book_data.get("units", []):
-        for lesson in unit.get("lessons", []):
-            if lesson["title"] == selected_lesson_title:
-                start_page = lesson.get("start_page", 1)
-                end_page = lesson.get("end_page", start_page)
-                # Generate the full list of pages for the lesson
-                st.session_state.pages_to_show = list(range(start_page, end_page + 1))
-                return
+    nav_index = load_navigation_index(BOOKS[st.session_state.selected_book]["json_path"])
+    lesson_ranges = nav_index["lesson_ranges"].get(st.session_state.selected_unit, {}) if nav_index else {}
+    if selected_lesson_title in lesson_ranges:
+        start_page, end_page = lesson_ranges[selected_lesson_title]
+        # Generate the full list of pages for the lesson
+        st.session_state.pages_to_show = list(range(start_page, end_page + 1))
+
+def jump_to_hit(book_name: str, unit_title: str, lesson_title: str | None, start_page: int, end_page: int):
+    """Callback to select a search hit's book, unit and lesson and show its page range."""
+    st.session_state.selected_book = st.session_state.book_selector = book_name
+    st.session_state.selected_unit = st.session_state.unit_selector = unit_title
+    st.session_state.lesson_selector = lesson_title or "Select a Lesson..."
+    st.session_state.pages_to_show = list(range(start_page, end_page + 1))
 
 # --- 3. Main App Layout ---
 
@@ -127,10 +332,10 @@ with st.sidebar:
     )
     
     selected_book_name = st.session_state.selected_book
-    book_data = load_book_structure(BOOKS[selected_book_name]["json_path"])
+    nav_index = load_navigation_index(BOOKS[selected_book_name]["json_path"])
 
-    if book_data:
-        unit_titles = ["Select a Unit..."] + [unit["title"] for unit in book_data.get("units", [])]
+    if nav_index:
+        unit_titles = ["Select a Unit..."] + nav_index["unit_titles"]
         st.selectbox(
             label="Select a Unit",
             options=unit_titles,
@@ -140,10 +345,7 @@ with st.sidebar:
         
         lesson_titles = ["Select a Lesson..."]
         if st.session_state.selected_unit != "Select a Unit...":
-            for unit in book_data.get("units", []):
-                if unit["title"] == st.session_state.selected_unit:
-                    lesson_titles.extend([lesson["title"] for lesson in unit.get("lessons", [])])
-                    break
+            lesson_titles.extend(nav_index["lesson_titles"].get(st.session_state.selected_unit, []))
         st.selectbox(
             label="Select a Lesson",
             options=lesson_titles,
@@ -160,12 +362,40 @@ with st.sidebar:
 
     st.info(f"**Current View**\n\nBook: `{selected_book_name}`\n\nDisplaying Pages: `{page_range_str}`")
 
+    st.header("Search")
+    query = st.text_input("Search all books", key="search_query")
+    search_index = load_search_index() if query else None
+    if search_index:
+        hits = search_index.search(query, SEARCH_RESULT_LIMIT)
+        if not hits:
+            st.caption("No matches found.")
+        for i, hit in enumerate(hits):
+            book_name = book_name_for_stem(hit["book"])
+            if book_name is None:
+                continue
+            section = hit["lesson"] or hit.get("part")
+            st.button(
+                f"{book_name} · {section} (pp. {hit['start_page']}-{hit['end_page']})",
+                key=f"search_hit_{i}",
+                on_click=jump_to_hit,
+                args=(book_name, hit["unit"], hit["lesson"], hit["start_page"], hit["end_page"])
+            )
+
 # --- 4. PDF Viewer in the Main Area ---
 
 st.subheader(f"Displaying: {selected_book_name}")
 
 # Call the updated function, passing the list of pages from session state
 show_pdf_with_component(
+    book_name=selected_book_name,
     pdf_path=BOOKS[selected_book_name]["pdf_path"],
-    pages=st.session_state.pages_to_show
+    pages=st.session_state.pages_to_show,
+    nav_index=nav_index
+)
+
+selected_lesson = st.session_state.get("lesson_selector", "Select a Lesson...")
+show_extracted_text(
+    nav_index=nav_index,
+    unit_title=st.session_state.selected_unit,
+    lesson_title=None if selected_lesson == "Select a Lesson..." else selected_lesson
 )
\ No newline at end of file
@@ -0,0 +1,166 @@
+# telemetry.py
+
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+from pathlib import Path
+from contextlib import contextmanager
+
+METRIC_PREFIX = "datachunk"
+
+# The innermost open span of the current thread or asyncio task, for parent links.
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Telemetry:
+    """
+    Records timed spans and counters for a pipeline run.
+
+    Spans are aggregated per name (count, total and max seconds), so memory stays constant however
+    many units or LLM calls are traced. When a log path is configured, every finished span is also
+    appended as one JSON line. `write_prometheus` snapshots the aggregates in the Prometheus
+    textfile format and `print_summary` prints them at the end of a run.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.log_path = None
+        self.reset()
+
+    def configure(self, log_path: Path | None = None):
+        """Sets (or, with None, disables) the JSON-lines log file."""
+        self.log_path = Path(log_path) if log_path else None
+        if self.log_path:
+            self.log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    def reset(self):
+        """Starts a new run: clears all counters and span aggregates."""
+        with self._lock:
+            self.run_id = uuid.uuid4().hex[:12]
+            self.started_at = time.time()
+            self.counters = {}
+            self.spans = {}
+
+    def _log(self, event: dict):
+        if self.log_path is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 6), "run_id": self.run_id, "pid": os.getpid(), **event}, ensure_ascii=False)
+        with self._lock, open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(line + "\n")
+
+    def incr(self, name: str, value: float = 1):
+        """Adds `value` to a counter."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        """
+        Times the enclosed block under `name`. The yielded dict can be updated with attributes known
+        only at the end (sizes, counts); an exception is recorded as an `error` attribute and re-raised.
+        """
+        span_id = uuid.uuid4().hex[:12]
+        parent_id = _current_span.get()
+        token = _current_span.set(span_id)
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            _current_span.reset(token)
+            with self._lock:
+                aggregate = self.spans.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0})
+                aggregate["count"] += 1
+                aggregate["total_s"] += duration
+                aggregate["max_s"] = max(aggregate["max_s"], duration)
+                aggregate["errors"] += "error" in attrs
+            self._log({"event": "span", "name": name, "span_id": span_id, "parent_id": parent_id,
+                       "duration_s": round(duration, 6), "attrs": attrs})
+
+    # --- Snapshots ---
+
+    def snapshot(self) -> dict:
+        """A JSON-serializable copy of the counters and span aggregates."""
+        with self._lock:
+            return {"counters": dict(self.counters), "spans": {name: dict(agg) for name, agg in self.spans.items()}}
+
+    def merge(self, snapshot: dict):
+        """Folds another process's snapshot (e.g. a batch worker's) into this one."""
+        with self._lock:
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in snapshot.get("spans", {}).items():
+                aggregate = self.spans.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0, "errors": 0})
+                aggregate["count"] += other["count"]
+                aggregate["total_s"] += other["total_s"]
+                aggregate["max_s"] = max(aggregate["max_s"], other["max_s"])
+                aggregate["errors"] += other.get("errors", 0)
+
+    def rate(self, counter: str, span: str) -> float | None:
+        """`counter` per second of total time spent in `span`, if both were recorded."""
+        aggregate = self.spans.get(span)
+        if not aggregate or not aggregate["total_s"] or counter not in self.counters:
+            return None
+        return self.counters[counter] / aggregate["total_s"]
+
+    def write_prometheus(self, path: Path):
+        """Writes the current aggregates atomically in the Prometheus textfile-collector format."""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot["counters"].items()):
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        if snapshot["spans"]:
+            metric = f"{METRIC_PREFIX}_span_duration_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for name, agg in sorted(snapshot["spans"].items()):
+                lines += [f'{metric}_sum{{span="{name}"}} {agg["total_s"]:.6f}', f'{metric}_count{{span="{name}"}} {agg["count"]}']
+            lines.append(f"# TYPE {metric}_max gauge")
+            lines += [f'{metric}_max{{span="{name}"}} {agg["max_s"]:.6f}' for name, agg in sorted(snapshot["spans"].items())]
+            lines.append(f"# TYPE {METRIC_PREFIX}_span_errors_total counter")
+            lines += [f'{METRIC_PREFIX}_span_errors_total{{span="{name}"}} {agg["errors"]}' for name, agg in sorted(snapshot["spans"].items())]
+        lines += [f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge", f"{METRIC_PREFIX}_last_run_timestamp_seconds {time.time():.0f}"]
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def print_summary(self, rates: dict[str, tuple[str, str]] | None = None):
+        """
+        Prints span timings and counters. `rates` maps a label to a (counter, span) pair, e.g.
+        {"Phase 2 pages/sec": ("pages_assembled", "phase2.assembly")}.
+        """
+        snapshot = self.snapshot()
+        print("\n--- RUN METRICS ---")
+        if snapshot["spans"]:
+            print("\n[Spans]")
+            print(f"  {'span':<24}{'count':>7}{'total (s)':>11}{'mean (s)':>10}{'max (s)':>10}")
+            for name, agg in sorted(snapshot["spans"].items()):
+                mean = agg["total_s"] / agg["count"] if agg["count"] else 0.0
+                errors = f"  ({agg['errors']} failed)" if agg["errors"] else ""
+                print(f"  {name:<24}{agg['count']:>7}{agg['total_s']:>11.3f}{mean:>10.3f}{agg['max_s']:>10.3f}{errors}")
+        if snapshot["counters"]:
+            print("\n[Counters]")
+            for name, value in sorted(snapshot["counters"].items()):
+                print(f"  - {name}: {value:,}")
+        for label, (counter, span) in (rates or {}).items():
+            value = self.rate(counter, span)
+            if value is not None:
+                print(f"\n  {label}: {value:,.1f}")
+        print("--- END OF METRICS ---")
+
+# The process-wide recorder used by the pipeline modules.
+telemetry = Telemetry()
+
+def record_llm_usage(usage_metadata: dict):
+    """Adds token counts reported by a langchain UsageMetadataCallbackHandler to the counters."""
+    for usage in usage_metadata.values():
+        telemetry.incr("llm_input_tokens", usage.get("input_tokens", 0))
+        telemetry.incr("llm_output_tokens", usage.get("output_tokens", 0))
@@ -0,0 +1,45 @@
+from checkpoint import IncrementalPageSource, hash_text, range_key
+from chunker import iter_chunks
+from page_store import PageTextStore
+
+PAGES = ["  الصفحة الأولى. نص قصير.", "الصفحة الثانية. نص آخر.", "الصفحة الثالثة. نهاية الدرس."]
+UNIT = {"title": "الوحدة", "start_page": 1, "end_page": 3, "parts": [],
+        "lessons": [{"title": "الدرس", "start_page": 1, "end_page": 3}]}
+
+class CountingStore(PageTextStore):
+    def page_text(self, page_number):
+        self.reads = getattr(self, "reads", 0) + 1
+        return super().page_text(page_number)
+
+def chunk_unit(page_source):
+    content = page_source.get_range_text(1, 3)
+    unit = {**UNIT, "lessons": [{**UNIT["lessons"][0], "content": content}]}
+    return list(iter_chunks("book", [unit], page_source, chunk_size=20, chunk_overlap=0))
+
+def test_reused_range_chunks_from_recorded_offsets():
+    store = PageTextStore.from_page_texts(PAGES)
+    first = IncrementalPageSource({}, {}, lambda: store, len(PAGES))
+    expected = chunk_unit(first)
+    assert first.extracted == 1
+
+    content = store.get_range_text(1, 3)
+    sources = []
+    def source_factory():
+        sources.append(CountingStore.from_page_texts(PAGES))
+        return sources[-1]
+    second = IncrementalPageSource({range_key(1, 3): content}, first.ranges, source_factory, len(PAGES), first.page_offsets)
+
+    assert chunk_unit(second) == expected
+    assert (second.reused, second.extracted) == (1, 0)
+    assert sources == []
+    assert second.page_offsets == first.page_offsets
+
+def test_reused_range_without_recorded_offsets_reads_pages():
+    store = PageTextStore.from_page_texts(PAGES)
+    content = store.get_range_text(1, 3)
+    source = CountingStore.from_page_texts(PAGES)
+    page_source = IncrementalPageSource({range_key(1, 3): content}, {range_key(1, 3): hash_text(content)},
+                                        lambda: source, len(PAGES))
+    chunk_unit(page_source)
+    assert page_source.reused == 1
+    assert source.reads == len(PAGES)
@@ -0,0 +1,40 @@
+import pytest
+from content_store import ContentStore, blob_path_for, load_packed_units, write_packed_units
+
+UNITS = [
+    {"title": "الوحدة الأولى", "start_page": 1, "end_page": 3, "parts": [{"title": "Unit Content (Pages 1-1)", "content": "تمهيد"}],
+     "lessons": [{"title": "الدرس الأول", "start_page": 2, "end_page": 3, "content": "نص الدرس الأول"}]},
+    {"title": "ملحق / خاتمة", "start_page": 4, "end_page": 4, "lessons": [], "parts": [{"title": "Afterword Content", "content": ""}]},
+]
+
+def test_packed_store_round_trips_units(tmp_path):
+    index_path = tmp_path / "book.pack"
+    assert write_packed_units(iter(UNITS), index_path) == 2
+    assert load_packed_units(index_path) == UNITS
+    with ContentStore(index_path) as store:
+        assert store.text(store.units[0]["lessons"][0]) == "نص الدرس الأول"
+
+def test_failed_write_keeps_previous_store(tmp_path):
+    index_path = tmp_path / "book.pack"
+    write_packed_units(iter(UNITS), index_path)
+
+    def failing_units():
+        yield UNITS[1]
+        raise RuntimeError("extraction failed")
+
+    with pytest.raises(RuntimeError):
+        write_packed_units(failing_units(), index_path)
+    assert load_packed_units(index_path) == UNITS
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["book.blob", "book.pack"]
+
+def test_failed_first_write_leaves_no_store(tmp_path):
+    index_path = tmp_path / "book.pack"
+
+    def failing_units():
+        raise RuntimeError("extraction failed")
+        yield
+
+    with pytest.raises(RuntimeError):
+        write_packed_units(failing_units(), index_path)
+    assert not index_path.exists() and not blob_path_for(index_path).exists()
+    assert list(tmp_path.iterdir()) == []
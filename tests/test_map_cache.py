@@ -0,0 +1,43 @@
+import os
+import json
+import time
+import map_cache
+from map_cache import ResponseCache
+
+DAY = 24 * 60 * 60
+
+def store_entry(cache: ResponseCache, key: str, stored_at: float, used_at: float):
+    path = cache.cache_dir / f"{key}.json"
+    cache.cache_dir.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"created_at": stored_at, "payload": [key]}, f)
+    os.utime(path, (used_at, stored_at))
+
+def test_recently_read_expired_entry_is_evicted(tmp_path):
+    cache = ResponseCache(tmp_path, max_age_days=1)
+    now = time.time()
+    store_entry(cache, "old", now - 2 * DAY, now)
+    cache.put("new", ["new"])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["new.json"]
+
+def test_hit_marks_entry_used_without_extending_its_age(tmp_path):
+    cache = ResponseCache(tmp_path, max_entries=2)
+    now = time.time()
+    store_entry(cache, "a", now - 30, now - 30)
+    store_entry(cache, "b", now - 20, now - 20)
+    assert cache.get("a") == ["a"]
+    stat = (tmp_path / "a.json").stat()
+    assert abs(stat.st_mtime - (now - 30)) < 0.01 and stat.st_atime >= now
+    cache.put("c", ["c"])
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.json", "c.json"]
+
+def test_hit_survives_concurrent_eviction(tmp_path, monkeypatch):
+    cache = ResponseCache(tmp_path)
+    cache.put("a", ["a"])
+
+    def evicted_meanwhile(path, *args, **kwargs):
+        os.unlink(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(map_cache.os, "utime", evicted_meanwhile)
+    assert cache.get("a") == ["a"]
@@ -0,0 +1,38 @@
+from arabic_text import normalize_arabic
+from map_validator import repair_structure_map, validate_structure_map
+
+def unit(title, start, end, *lessons):
+    return {"unit_title": title, "unit_start_page": start, "unit_end_page": end,
+            "lessons": [{"lesson_title": t, "lesson_start_page": s, "lesson_end_page": e} for t, s, e in lessons]}
+
+def page_headings(page_count: int, titles: dict[int, tuple[str, ...]]) -> list:
+    """Every page opens with body text, except the given pages, which open with their titles."""
+    return [[normalize_arabic(title) for title in titles.get(page, ("نص الصفحة",))] for page in range(1, page_count + 1)]
+
+def test_valid_map_with_gaps_comes_back_unchanged():
+    # Pages 11-12 (a separator) fall between the units and page 6 between two lessons; both are only warnings.
+    structure_map = [
+        unit("الوحدة الأولى", 1, 10, ("الدرس الأول", 2, 5), ("الدرس الثاني", 7, 10)),
+        unit("الوحدة الثانية", 13, 20, ("الدرس الثالث", 13, 20)),
+    ]
+    headings = page_headings(24, {1: ("الوحدة الأولى",), 2: ("الدرس الأول",), 7: ("الدرس الثاني",),
+                                  13: ("الوحدة الثانية", "الدرس الثالث")})
+    assert {issue["severity"] for issue in validate_structure_map(structure_map, 24)} == {"warning"}
+
+    repaired, report = repair_structure_map(structure_map, headings)
+    assert repaired == structure_map
+    assert report["snapped"] == []
+
+def test_ends_follow_snapped_starts_and_overlaps_are_removed():
+    structure_map = [
+        unit("الوحدة الأولى", 1, 11, ("الدرس الأول", 1, 5), ("الدرس الثاني", 5, 11)),
+        unit("الوحدة الثانية", 11, 20, ("الدرس الثالث", 11, 20)),
+    ]
+    headings = page_headings(20, {1: ("الوحدة الأولى", "الدرس الأول"), 6: ("الدرس الثاني",),
+                                  12: ("الوحدة الثانية", "الدرس الثالث")})
+    repaired, report = repair_structure_map(structure_map, headings)
+    assert repaired == [
+        unit("الوحدة الأولى", 1, 11, ("الدرس الأول", 1, 5), ("الدرس الثاني", 6, 11)),
+        unit("الوحدة الثانية", 12, 20, ("الدرس الثالث", 12, 20)),
+    ]
+    assert [issue for issue in report["issues_after"] if issue["severity"] == "error"] == []
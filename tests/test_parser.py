@@ -0,0 +1,33 @@
+import pytest
+from parser import GoldenMarkdownStreamParser, parse_golden_markdown_to_json
+
+DOCUMENTS = [
+    # A heading-like line inside an HTML block is not a heading.
+    "# U\n\n### intro\ntext\n\n## L\n### P\nhello\n<div>\n# notheading\n</div>\n\n## L2\n### P2\nbye\n",
+    # HTML blocks that end on a closing sequence rather than a blank line.
+    "# U\n## L\n### P\n<!--\n# comment\n-->\n# U2\n### P\n<pre>\n## code\n</pre>\n## L3\n### P3\ntext\n",
+    # An HTML block closed on its own first line, and a fence inside an HTML block.
+    "# U\n### P\n<!-- one line -->\n# U2\n### P\n<div>\n```\n</div>\n\n## L\n### P\ntext\n",
+    # The last kind of HTML block (a lone tag) cannot interrupt a paragraph, so the heading is real.
+    "# U\n### P\ntext\n<custom-tag>\n# U2\n### P\nmore\n",
+    "# U\n### P\ntext\n\n<custom-tag>\n# inside\n\n# U2\n### P\nmore\n",
+    "# U\n### P\nTitle\n=====\n<custom-tag>\n# inside\n\n## L\n### P\nmore\n",
+    # Code fences and indented code.
+    "# U\n### P\n```\n# code\n```\n## L\n### P\n~~~~\n## code\n~~~\n~~~~\n# U2\n### P\n    <div>\n# U3\n### P\nend",
+]
+
+def stream_parse(text: str, chunk_size: int) -> dict:
+    stream_parser = GoldenMarkdownStreamParser()
+    for start in range(0, len(text), chunk_size):
+        stream_parser.feed(text[start:start + chunk_size])
+    return stream_parser.close()
+
+@pytest.mark.parametrize("text", DOCUMENTS)
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_streamed_parse_matches_whole_document_parse(text, chunk_size):
+    assert stream_parse(text, chunk_size) == parse_golden_markdown_to_json(text)
+
+def test_heading_inside_html_block_stays_in_its_part():
+    result = stream_parse(DOCUMENTS[0], 5)
+    assert [unit["title"] for unit in result["units"]] == ["U"]
+    assert "# notheading" in result["units"][0]["lessons"][0]["parts"][0]["content"]
@@ -0,0 +1,40 @@
+import json
+import search_index
+from search_index import BUILD_DIR_PREFIX, BUILDS_KEPT, SearchIndex, build_search_index, current_build_dir
+
+def write_book(path, content: str):
+    unit = {"title": "الوحدة", "start_page": 1, "end_page": 2, "parts": [],
+            "lessons": [{"title": "الدرس", "start_page": 1, "end_page": 2, "content": content}]}
+    path.write_text(json.dumps({"units": [unit]}, ensure_ascii=False), encoding="utf-8")
+    return path
+
+def test_open_index_keeps_its_build_across_rebuilds(tmp_path):
+    index_dir = tmp_path / "index"
+    build_search_index([write_book(tmp_path / "old.json", "الصلاة")], index_dir)
+    old = SearchIndex(index_dir)
+    build_search_index([write_book(tmp_path / "new.json", "الزكاة والصيام")], index_dir)
+    new = SearchIndex(index_dir)
+
+    assert [hit["book"] for hit in old.search("الصلاة")] == ["old"]
+    assert old.search("الزكاة") == []
+    assert [hit["book"] for hit in new.search("الزكاة")] == ["new"]
+    old.close()
+    new.close()
+
+def test_rebuilds_keep_only_recent_builds(tmp_path):
+    index_dir = tmp_path / "index"
+    book = write_book(tmp_path / "book.json", "الصلاة")
+    for _ in range(BUILDS_KEPT + 2):
+        build_search_index([book], index_dir)
+    builds = sorted(index_dir.glob(f"{BUILD_DIR_PREFIX}*"))
+    assert len(builds) == BUILDS_KEPT
+    assert current_build_dir(index_dir) == builds[-1]
+
+def test_opening_a_removed_build_retries_the_current_one(tmp_path, monkeypatch):
+    index_dir = tmp_path / "index"
+    build_search_index([write_book(tmp_path / "book.json", "الصلاة")], index_dir)
+    answers = [tmp_path / "removed-build", current_build_dir(index_dir)]
+    monkeypatch.setattr(search_index, "current_build_dir", lambda _: answers.pop(0))
+    index = SearchIndex(index_dir)
+    assert [hit["book"] for hit in index.search("الصلاة")] == ["book"]
+    index.close()
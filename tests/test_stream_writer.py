@@ -0,0 +1,72 @@
+import json
+import pytest
+from checkpoint import load_units
+from stream_writer import JsonArrayUnitWriter, NdjsonUnitWriter, partial_path_for, write_units_streaming
+
+# Characters that str.splitlines() treats as line breaks but json.dumps(ensure_ascii=False) leaves as-is.
+UNICODE_BREAKS = "\u0085\u2028\u2029"
+
+def _units():
+    return [
+        {"title": "الوحدة الأولى", "start_page": 1, "end_page": 3, "lessons": [
+            {"title": f"درس{UNICODE_BREAKS}", "start_page": 1, "end_page": 3, "content": f"سطر{UNICODE_BREAKS}سطر\nآخر"}],
+         "parts": []},
+        {"title": "ملحق", "start_page": 4, "end_page": 4, "lessons": [], "parts": [{"title": "Afterword Content", "content": " "}]},
+    ]
+
+def test_json_stream_matches_json_dump_with_unicode_line_breaks(tmp_path):
+    path = tmp_path / "book.json"
+    writer = JsonArrayUnitWriter(path)
+    for unit in _units():
+        writer.write(unit)
+    writer.close()
+
+    text = path.read_text(encoding="utf-8")
+    assert text == json.dumps({"units": _units()}, ensure_ascii=False, indent=2)
+    assert json.loads(text) == {"units": _units()}
+
+def test_json_stream_empty_matches_json_dump(tmp_path):
+    path = tmp_path / "book.json"
+    JsonArrayUnitWriter(path).close()
+    assert path.read_text(encoding="utf-8") == json.dumps({"units": []}, ensure_ascii=False, indent=2)
+
+def test_ndjson_round_trips_unicode_line_breaks(tmp_path):
+    path = tmp_path / "book.ndjson"
+    writer = NdjsonUnitWriter(path)
+    for unit in _units():
+        writer.write(unit)
+    writer.close()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        assert [json.loads(line) for line in f if line.strip()] == _units()
+
+def _failing_units():
+    yield _units()[0]
+    raise RuntimeError("extraction failed")
+
+@pytest.mark.parametrize("output_format, suffix", [("json-stream", ".json"), ("ndjson", ".ndjson"), ("packed", ".pack")])
+def test_failed_stream_keeps_previous_output(tmp_path, output_format, suffix):
+    path = tmp_path / f"book{suffix}"
+    write_units_streaming(iter(_units()), path, output_format)
+    before = {p.name: p.read_bytes() for p in tmp_path.iterdir()}
+
+    with pytest.raises(RuntimeError):
+        write_units_streaming(_failing_units(), path, output_format)
+    assert {p.name: p.read_bytes() for p in tmp_path.iterdir()} == before
+    assert load_units(path) == _units()
+
+@pytest.mark.parametrize("output_format, suffix", [("json-stream", ".json"), ("ndjson", ".ndjson"), ("packed", ".pack")])
+def test_failed_first_stream_leaves_no_output(tmp_path, output_format, suffix):
+    with pytest.raises(RuntimeError):
+        write_units_streaming(_failing_units(), tmp_path / f"book{suffix}", output_format)
+    assert list(tmp_path.iterdir()) == []
+
+def test_units_can_be_tailed_from_the_partial_file(tmp_path):
+    path = tmp_path / "book.ndjson"
+    with NdjsonUnitWriter(path) as writer:
+        writer.write(_units()[0])
+        assert writer.partial_path == partial_path_for(path)
+        assert json.loads(partial_path_for(path).read_text(encoding="utf-8")) == _units()[0]
+        assert not path.exists()
+    assert load_units(path) == _units()[:1]
+    assert not partial_path_for(path).exists()
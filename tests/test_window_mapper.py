@@ -0,0 +1,29 @@
+from window_mapper import CONTINUATION_TITLE, merge_window_units
+
+def unit(title, start, end, *lessons):
+    return {"unit_title": title, "unit_start_page": start, "unit_end_page": end,
+            "lessons": [{"lesson_title": t, "lesson_start_page": s, "lesson_end_page": e} for t, s, e in lessons]}
+
+def test_continued_unit_folds_into_the_unit_it_continues():
+    windows = [
+        [unit("الوحدة الأولى", 1, 12, ("الدرس الأول", 2, 8), ("الدرس الثاني", 9, 12))],
+        [unit(CONTINUATION_TITLE, 10, 16, ("الدرس الثاني", 9, 14), ("الدرس الثالث", 15, 16)),
+         unit("الوحدة الثانية", 17, 20, ("الدرس الرابع", 18, 20))],
+    ]
+    merged = merge_window_units(windows, 20)
+    assert [(u["unit_title"], u["unit_start_page"], u["unit_end_page"]) for u in merged] == [
+        ("الوحدة الأولى", 1, 16), ("الوحدة الثانية", 17, 20)]
+    assert [(l["lesson_title"], l["lesson_start_page"], l["lesson_end_page"]) for l in merged[0]["lessons"]] == [
+        ("الدرس الأول", 2, 8), ("الدرس الثاني", 9, 14), ("الدرس الثالث", 15, 16)]
+
+def test_continued_unit_without_an_earlier_unit_keeps_its_lessons():
+    windows = [
+        [unit(CONTINUATION_TITLE, 1, 12, ("الدرس الأول", 3, 8), ("الدرس الثاني", 9, 12))],
+        [unit(CONTINUATION_TITLE, 10, 14, ("الدرس الثاني", 9, 14)),
+         unit("الوحدة الثانية", 15, 20, ("الدرس الثالث", 16, 20))],
+    ]
+    merged = merge_window_units(windows, 20)
+    assert [(u["unit_title"], u["unit_start_page"], u["unit_end_page"]) for u in merged] == [
+        (CONTINUATION_TITLE, 3, 14), ("الوحدة الثانية", 15, 20)]
+    assert [(l["lesson_title"], l["lesson_start_page"], l["lesson_end_page"]) for l in merged[0]["lessons"]] == [
+        ("الدرس الأول", 3, 8), ("الدرس الثاني", 9, 14)]
@@ -0,0 +1,95 @@
+# verdict_cache.py
+
+import time
+import sqlite3
+import hashlib
+from pathlib import Path
+from arabic_text import normalize_arabic
+
+def prompt_hash(prompt_text: str) -> str:
+    return hashlib.sha256(prompt_text.encode("utf-8")).hexdigest()[:16]
+
+
+class VerdictCache:
+    """
+    A SQLite-backed memo of evaluator verdicts, keyed by the normalized (ground truth, candidate)
+    title pair, the evaluator model and the prompt hash.
+
+    A positive verdict is stored for the matched pair only. A negative verdict means the model saw
+    every candidate and matched none, so it is stored for each pair. A lookup is resolved from the
+    cache when some remaining candidate is a cached match, or when every candidate is a cached non-match.
+    """
+
+    def __init__(self, db_path: Path, model_name: str, prompt_text: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.prompt_hash = prompt_hash(prompt_text)
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS verdicts (
+                gt_key TEXT NOT NULL,
+                candidate_key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                is_match INTEGER NOT NULL,
+                confidence REAL NOT NULL,
+                reasoning TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (gt_key, candidate_key, model, prompt_hash)
+            )
+        """)
+        self.conn.commit()
+
+    def lookup(self, gt_title: str, candidate_titles: list[str]) -> dict | None:
+        """
+        Returns a verdict dict (is_match, best_match, confidence, reasoning) if the cache can
+        resolve this comparison, counting a hit; otherwise counts a miss and returns None.
+        """
+        gt_key = normalize_arabic(gt_title)
+        by_key = {}
+        for title in candidate_titles:
+            by_key.setdefault(normalize_arabic(title), title)
+        if not by_key:
+            self.misses += 1
+            return None
+
+        placeholders = ",".join("?" * len(by_key))
+        rows = self.conn.execute(
+            f"SELECT candidate_key, is_match, confidence, reasoning FROM verdicts "
+            f"WHERE gt_key = ? AND model = ? AND prompt_hash = ? AND candidate_key IN ({placeholders})",
+            (gt_key, self.model_name, self.prompt_hash, *by_key),
+        ).fetchall()
+
+        positives = sorted((r for r in rows if r[1]), key=lambda r: r[2], reverse=True)
+        if positives:
+            candidate_key, _, confidence, reasoning = positives[0]
+            self.hits += 1
+            return {"is_match": True, "best_match": by_key[candidate_key], "confidence": confidence, "reasoning": reasoning}
+        if len(rows) == len(by_key):
+            self.hits += 1
+            return {"is_match": False, "best_match": None, "confidence": max(r[2] for r in rows), "reasoning": rows[0][3]}
+        self.misses += 1
+        return None
+
+    def store(self, gt_title: str, candidate_titles: list[str], is_match: bool, best_match: str | None,
+              confidence: float, reasoning: str):
+        """Records an LLM verdict for `gt_title` against the candidates it was shown."""
+        gt_key = normalize_arabic(gt_title)
+        if is_match and best_match:
+            pairs = [(normalize_arabic(best_match), 1)]
+        elif not is_match:
+            pairs = [(normalize_arabic(t), 0) for t in candidate_titles]
+        else:
+            return
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(gt_key, key, self.model_name, self.prompt_hash, flag, confidence, reasoning, now) for key, flag in pairs],
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
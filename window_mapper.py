@@ -0,0 +1,95 @@
+# window_mapper.py
+
+import json
+from arabic_text import normalize_arabic
+
+# --- Configuration ---
+# Payloads with more pages than this are mapped in overlapping windows instead of one request.
+MAX_REQUEST_PAGES = 200
+WINDOW_PAGES = 120
+WINDOW_OVERLAP = 12
+# Maximum number of window requests in flight at once.
+WINDOW_CONCURRENCY = 4
+# Entries from neighbouring windows are the same unit/lesson if their titles match and their starts are this close.
+SEAM_TOLERANCE = 2
+# The unit title a window reports for lessons of a unit whose heading lies in an earlier window.
+CONTINUATION_TITLE = "CONTINUED"
+
+def plan_windows(page_count: int, window_pages: int = WINDOW_PAGES, overlap: int = WINDOW_OVERLAP) -> list[tuple[int, int]]:
+    """Splits pages 1..page_count into (first, last) windows, each overlapping the previous by `overlap` pages."""
+    step = max(1, window_pages - overlap)
+    windows, first = [], 1
+    while True:
+        last = min(page_count, first + window_pages - 1)
+        windows.append((first, last))
+        if last >= page_count:
+            return windows
+        first += step
+
+def offset_window_units(units: list[dict], first_page: int, last_page: int) -> list[dict]:
+    """Converts a window's answer from window page numbers (starting at 1) to payload page numbers."""
+    to_payload = lambda page: min(max(page + first_page - 1, first_page), last_page)
+    shifted = []
+    for unit in units:
+        lessons = [{**l, "lesson_start_page": to_payload(l["lesson_start_page"]), "lesson_end_page": to_payload(l["lesson_end_page"])}
+                   for l in unit.get("lessons", [])]
+        shifted.append({**unit, "unit_start_page": to_payload(unit["unit_start_page"]),
+                        "unit_end_page": to_payload(unit["unit_end_page"]), "lessons": lessons})
+    return shifted
+
+def _same_entry(title_a: str, start_a: int, title_b: str, start_b: int) -> bool:
+    return abs(start_a - start_b) <= SEAM_TOLERANCE and normalize_arabic(title_a) == normalize_arabic(title_b)
+
+def _merge_lessons(unit: dict, lessons: list[dict]):
+    for lesson in lessons:
+        existing = next((l for l in unit["lessons"] if _same_entry(l["lesson_title"], l["lesson_start_page"],
+                                                                   lesson["lesson_title"], lesson["lesson_start_page"])), None)
+        if existing is None:
+            unit["lessons"].append(dict(lesson))
+        else:
+            existing["lesson_end_page"] = max(existing["lesson_end_page"], lesson["lesson_end_page"])
+
+def merge_window_units(window_units: list[list[dict]], page_count: int) -> list[dict]:
+    """
+    Merges the windows' units (already in payload page numbers, in window order) into one map.
+    Units and lessons seen in two windows are deduplicated by normalized title and start page, and
+    a window's CONTINUED unit is folded into the unit it continues. A CONTINUED unit with nothing
+    before it to continue is kept as a unit of its own, still titled CONTINUED so the gap shows in the
+    map, rather than losing its lessons. End pages are then re-derived from the starts, since a window
+    can only report ends up to its own last page.
+    """
+    merged = []
+    for units in window_units:
+        for unit in units:
+            if unit["unit_title"].strip() == CONTINUATION_TITLE:
+                # The continued unit is the last one that began before the window's first lesson.
+                anchor = min((l["lesson_start_page"] for l in unit.get("lessons", [])), default=unit["unit_start_page"])
+                earlier = [m for m in merged if m["unit_start_page"] <= anchor]
+                if earlier:
+                    target = max(earlier, key=lambda m: m["unit_start_page"])
+                else:
+                    merged.append({**json.loads(json.dumps(unit)), "unit_start_page": anchor, "lessons": []})
+                    target = merged[-1]
+                target["unit_end_page"] = max(target["unit_end_page"], unit["unit_end_page"])
+                _merge_lessons(target, unit.get("lessons", []))
+                continue
+            existing = next((m for m in merged if _same_entry(m["unit_title"], m["unit_start_page"],
+                                                              unit["unit_title"], unit["unit_start_page"])), None)
+            if existing is None:
+                merged.append({**json.loads(json.dumps(unit)), "lessons": []})
+                existing = merged[-1]
+            existing["unit_end_page"] = max(existing["unit_end_page"], unit["unit_end_page"])
+            _merge_lessons(existing, unit.get("lessons", []))
+
+    merged.sort(key=lambda u: u["unit_start_page"])
+    for idx, unit in enumerate(merged):
+        if idx + 1 < len(merged):
+            unit["unit_end_page"] = merged[idx + 1]["unit_start_page"] - 1
+        unit["unit_end_page"] = max(unit["unit_start_page"], min(unit["unit_end_page"], page_count))
+        lessons = sorted(unit["lessons"], key=lambda l: l["lesson_start_page"])
+        for l_idx, lesson in enumerate(lessons):
+            if l_idx + 1 < len(lessons):
+                lesson["lesson_end_page"] = lessons[l_idx + 1]["lesson_start_page"] - 1
+            lesson["lesson_end_page"] = max(lesson["lesson_start_page"], min(lesson["lesson_end_page"], unit["unit_end_page"]))
+        unit["lessons"] = lessons
+    return merged